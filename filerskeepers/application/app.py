@@ -2,13 +2,16 @@ from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 from typing import Any
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
 from loguru import logger
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import AsyncMongoClient
 
 from filerskeepers.application.logging import setup_logging
 from filerskeepers.application.rate_limiting import RateLimitMiddleware
 from filerskeepers.application.settings import settings
+from filerskeepers.books.archive import SegmentMissingError
+from filerskeepers.books.feed import ChangeFeedBroadcaster
 from filerskeepers.db.mongo import init_mongo
 from filerskeepers.db.redis import get_redis_connection, get_redis_pool
 from filerskeepers.web.auth import auth_router
@@ -22,7 +25,7 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None]:
     logger.info("Starting application...")
 
     # Initialize MongoDB and Beanie
-    mongo_client: AsyncIOMotorClient[Any] = await init_mongo(settings)
+    mongo_client: AsyncMongoClient[Any] = await init_mongo(settings)
     app.state.mongo_client = mongo_client
     logger.info("MongoDB and Beanie initialized")
 
@@ -36,15 +39,27 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None]:
 
     logger.info("Redis pool and client initialized")
 
+    # One change feed reader per process, shared by every stream subscriber
+    change_feed_broadcaster = ChangeFeedBroadcaster(redis_client)
+    app.state.change_feed_broadcaster = change_feed_broadcaster
+
     yield
 
     # Cleanup
     logger.info("Shutting down application...")
+    await change_feed_broadcaster.close()
     await redis_pool.aclose()
-    mongo_client.close()
+    await mongo_client.close()
     logger.info("Application shut down complete")
 
 
+async def segment_missing_handler(request: Request, exc: Exception) -> JSONResponse:
+    logger.error(str(exc))
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"detail": str(exc)}
+    )
+
+
 def get_app(use_lifespan: bool = True) -> FastAPI:
     app = FastAPI(
         title="FilersKeepers API",
@@ -56,6 +71,9 @@ def get_app(use_lifespan: bool = True) -> FastAPI:
     # Add middleware (will get Redis client from app.state during requests)
     app.add_middleware(RateLimitMiddleware)
 
+    # Archived change logs whose segment file is gone cannot be served
+    app.add_exception_handler(SegmentMissingError, segment_missing_handler)
+
     # Register routers
     app.include_router(auth_router, prefix="/auth/v1", tags=["Auth"])
     app.include_router(ping_router, prefix="/ping/v1", tags=["Ping"])
@@ -0,0 +1,41 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from filerskeepers.application.settings import settings
+from filerskeepers.auth.models import User
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt off the event loop.
+
+    bcrypt releases the GIL while hashing, so a small thread pool is enough to
+    keep the loop responsive. The pool size caps how many hashes run at once;
+    further requests wait in the executor queue instead of stealing CPU from
+    the rest of the worker.
+    """
+
+    def __init__(
+        self,
+        rounds: int = settings.PASSWORD_HASH_ROUNDS,
+        max_workers: int = settings.PASSWORD_HASH_MAX_WORKERS,
+    ) -> None:
+        self.rounds = rounds
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hasher"
+        )
+
+    async def hash_password(self, password: str) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, User.hash_password, password, self.rounds
+        )
+
+    async def verify_password(self, user: User, password: str) -> bool:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, user.verify_password, password
+        )
+
+
+password_hasher = PasswordHasher()
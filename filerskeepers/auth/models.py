@@ -18,15 +18,17 @@ class User(Document):
         use_state_management = True
 
     @staticmethod
-    def hash_password(password: str) -> str:
+    def hash_password(password: str, rounds: int = 12) -> str:
         # Convert password to bytes and hash with bcrypt
+        # NOTE: this is CPU bound, use PasswordHasher from async code
         password_bytes = password.encode("utf-8")
-        salt = bcrypt.gensalt()
+        salt = bcrypt.gensalt(rounds=rounds)
         hashed = bcrypt.hashpw(password_bytes, salt)
         return hashed.decode("utf-8")
 
     def verify_password(self, password: str) -> bool:
         # Convert password and stored hash to bytes
+        # NOTE: this is CPU bound, use PasswordHasher from async code
         password_bytes = password.encode("utf-8")
         hashed_bytes = self.hashed_password.encode("utf-8")
         return bcrypt.checkpw(password_bytes, hashed_bytes)
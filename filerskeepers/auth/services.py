@@ -7,13 +7,19 @@ from filerskeepers.auth.dtos import (
     RegisterRequest,
     UserResponse,
 )
+from filerskeepers.auth.hashing import PasswordHasher, password_hasher
 from filerskeepers.auth.models import User
 from filerskeepers.auth.repositories import UserRepository
 
 
 class AuthService:
-    def __init__(self, user_repository: UserRepository) -> None:
+    def __init__(
+        self,
+        user_repository: UserRepository,
+        hasher: PasswordHasher = password_hasher,
+    ) -> None:
         self.user_repository = user_repository
+        self.hasher = hasher
 
     async def register(self, request: RegisterRequest) -> UserResponse:
         # Check if user already exists
@@ -33,7 +39,7 @@ class AuthService:
             )
 
         # Create user
-        hashed_password = User.hash_password(request.password)
+        hashed_password = await self.hasher.hash_password(request.password)
         api_key = User.generate_api_key()
 
         user = await self.user_repository.create(
@@ -57,7 +63,7 @@ class AuthService:
             )
 
         # Verify password
-        if not user.verify_password(request.password):
+        if not await self.hasher.verify_password(user, request.password):
             logger.warning(f"Login failed: invalid password for {request.email}")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
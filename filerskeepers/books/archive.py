@@ -0,0 +1,401 @@
+import asyncio
+import os
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from beanie import PydanticObjectId
+from loguru import logger
+
+from filerskeepers.application.settings import settings
+from filerskeepers.books.models import ChangeLogEntry, ChangeLogSegment
+from filerskeepers.books.repositories import (
+    ChangeLogRepository,
+    ChangeLogSegmentRepository,
+)
+from filerskeepers.reports.models import as_utc
+
+
+DAY = timedelta(days=1)
+
+_TIMESTAMP = pa.timestamp("ms", tz="UTC")
+
+# Flattened change logs, in the shape ChangeLogRepository streams them
+SEGMENT_SCHEMA = pa.schema(
+    [
+        ("_id", pa.string()),
+        ("change_index", pa.int32()),
+        ("book_id", pa.string()),
+        ("book_name", pa.string()),
+        ("change_type", pa.string()),
+        ("field_changed", pa.string()),
+        ("old_value", pa.string()),
+        ("new_value", pa.string()),
+        ("timestamp", _TIMESTAMP),
+        ("crawl_id", pa.string()),
+    ]
+)
+SEGMENT_FIELDS = tuple(name for name in SEGMENT_SCHEMA.names if name != "_id")
+
+
+class ArchiveNotDurableError(Exception):
+    """The archive directory would not outlive the process writing to it."""
+
+    def __init__(self, directory: Path):
+        super().__init__(
+            f"Change log archive directory {directory} is not an absolute path, "
+            f"set CHANGE_LOG_ARCHIVE_DIR to a persistent volume shared by the "
+            f"app and the workers"
+        )
+        self.directory = directory
+
+
+class SegmentMissingError(Exception):
+    """A registered segment's file cannot be found."""
+
+    def __init__(self, path: Path):
+        super().__init__(
+            f"Archived change logs are unavailable, segment {path} is missing"
+        )
+        self.path = path
+
+
+class ChangeLogArchive:
+    """
+    Cold storage for change logs older than the hot retention.
+
+    Whole UTC days are moved out of Mongo into zstd compressed Parquet
+    segments, one file per day, indexed by ChangeLogSegment documents. Rows
+    are stored newest first, the order every reader wants them in, so a
+    segment is read one row group at a time and never sorted.
+
+    Everything before the boundary, the end of the newest segment, is read
+    from the archive, everything from it on from Mongo.
+
+    Archiving deletes from Mongo, so the directory must be an absolute path on
+    storage every reader shares and that outlives the container, and a
+    segment is synced to disk and read back before anything is deleted.
+    """
+
+    def __init__(
+        self,
+        change_log_repo: ChangeLogRepository,
+        segment_repo: ChangeLogSegmentRepository,
+        directory: Path = Path(settings.CHANGE_LOG_ARCHIVE_DIR),
+        hot_days: int = settings.CHANGE_LOG_HOT_DAYS,
+        batch_size: int = settings.EXPORT_CHUNK_SIZE,
+    ) -> None:
+        self.change_log_repo = change_log_repo
+        self.segment_repo = segment_repo
+        self.directory = directory
+        self.hot_days = hot_days
+        self.batch_size = batch_size
+
+    async def boundary(self) -> datetime | None:
+        segment = await self.segment_repo.latest()
+        return as_utc(segment.end_date) if segment else None
+
+    async def archive_expired(self) -> list[ChangeLogSegment]:
+        """Archive every whole day of change logs older than the hot retention."""
+        today = datetime.now(UTC).replace(hour=0, minute=0, second=0, microsecond=0)
+        cutoff = today - DAY * self.hot_days
+
+        oldest = await self.change_log_repo.oldest_timestamp()
+        if oldest is None:
+            return []
+
+        segments = []
+        day = as_utc(oldest).replace(hour=0, minute=0, second=0, microsecond=0)
+        while day < cutoff:
+            segment = await self.archive_day(day)
+            if segment:
+                segments.append(segment)
+            day += DAY
+        return segments
+
+    async def archive_day(self, day: datetime) -> ChangeLogSegment | None:
+        """Move one UTC day of change logs from Mongo into a segment."""
+        if not self.directory.is_absolute():
+            raise ArchiveNotDurableError(self.directory)
+        start_date, end_date = day, day + DAY
+
+        existing = await self.segment_repo.find_by_start(start_date)
+        if existing:
+            if not Path(existing.path).exists():
+                raise SegmentMissingError(Path(existing.path))
+            # A previous run stopped between registering the segment and
+            # deleting what it archived, finish the job
+            deleted = await self.change_log_repo.delete_range(start_date, end_date)
+            logger.warning(
+                f"Deleted {deleted} change logs left behind from archived day "
+                f"{start_date.date()}"
+            )
+            return existing
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"change_logs-{start_date.date().isoformat()}.parquet"
+        tmp_path = path.with_suffix(".tmp")
+
+        rows = await self._write_segment(
+            tmp_path,
+            self.change_log_repo.stream_range(
+                start_date,
+                end_date,
+                end_inclusive=False,
+                batch_size=self.batch_size,
+                fields=SEGMENT_FIELDS,
+            ),
+        )
+        if not rows:
+            tmp_path.unlink()
+            return None
+
+        # Only a complete file is ever registered, and only a registered
+        # segment lets its change logs be deleted
+        await asyncio.to_thread(self._sync, tmp_path)
+        tmp_path.replace(path)
+        await asyncio.to_thread(self._sync, self.directory)
+        metadata = await asyncio.to_thread(pq.read_metadata, path)
+        if metadata.num_rows != rows:
+            raise OSError(
+                f"Segment {path} holds {metadata.num_rows} rows, {rows} were written"
+            )
+        segment = await self.segment_repo.save(
+            ChangeLogSegment(
+                start_date=start_date,
+                end_date=end_date,
+                path=str(path),
+                rows=rows,
+                size_bytes=path.stat().st_size,
+            )
+        )
+        deleted = await self.change_log_repo.delete_range(start_date, end_date)
+        logger.info(
+            f"Archived {rows} changes of {start_date.date()} to {path}, "
+            f"deleted {deleted} change logs"
+        )
+        return segment
+
+    async def check_available(self, start_date: datetime, end_date: datetime) -> None:
+        """Raise SegmentMissingError if a segment of the range is missing."""
+        for segment in await self.segment_repo.find_overlapping(start_date, end_date):
+            path = Path(segment.path)
+            if not await asyncio.to_thread(path.exists):
+                raise SegmentMissingError(path)
+
+    async def stream_range(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        end_inclusive: bool = True,
+        book_id: str | None = None,
+        change_type: str | None = None,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Yield archived changes in the range newest first, like the hot tier."""
+        for segment in await self.segment_repo.find_overlapping(start_date, end_date):
+            async for batch in self._read_segment(
+                Path(segment.path),
+                start_date,
+                end_date,
+                end_inclusive,
+                book_id=book_id,
+                change_type=change_type,
+            ):
+                for row in batch.to_pylist():
+                    row["_id"] = PydanticObjectId(row["_id"])
+                    yield row
+
+    async def stream_created(
+        self, since: datetime | None, until: datetime
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Yield archived changes in (since, until], oldest first, as
+        ChangeLogRepository.stream_created does for the hot tier.
+        """
+        start_date = as_utc(since) if since else datetime.fromtimestamp(0, UTC)
+        segments = await self.segment_repo.find_overlapping(start_date, until)
+        for segment in reversed(segments):
+            async for batch in self._read_segment(
+                Path(segment.path), start_date, until, True, oldest_first=True
+            ):
+                for row in batch.to_pylist():
+                    if since and as_utc(row["timestamp"]) == start_date:
+                        continue
+                    row["_id"] = PydanticObjectId(row["_id"])
+                    yield row
+
+    async def list_changes(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        book_id: str | None = None,
+        change_type: str | None = None,
+        skip: int = 0,
+        limit: int = 10,
+        after: tuple[Any, PydanticObjectId, int | None] | None = None,
+    ) -> list[ChangeLogEntry]:
+        """One page of archived changes in [start_date, end_date], newest first."""
+        if after:
+            end_date = min(end_date, as_utc(after[0]))
+
+        entries: list[ChangeLogEntry] = []
+        async for row in self.stream_range(
+            start_date, end_date, book_id=book_id, change_type=change_type
+        ):
+            if after and not self._is_after(row, *after):
+                continue
+            if skip:
+                skip -= 1
+                continue
+            entries.append(ChangeLogEntry.model_validate(row))
+            if len(entries) >= limit:
+                break
+        return entries
+
+    async def count(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        book_id: str | None = None,
+        change_type: str | None = None,
+    ) -> int:
+        total = 0
+        for segment in await self.segment_repo.find_overlapping(start_date, end_date):
+            async for batch in self._read_segment(
+                Path(segment.path),
+                start_date,
+                end_date,
+                True,
+                book_id=book_id,
+                change_type=change_type,
+                columns=["timestamp", "book_id", "change_type"],
+            ):
+                total += batch.num_rows
+        return total
+
+    async def _write_segment(
+        self, path: Path, changes: AsyncIterator[dict[str, Any]]
+    ) -> int:
+        rows = 0
+        chunk: list[dict[str, Any]] = []
+        writer = pq.ParquetWriter(path, SEGMENT_SCHEMA, compression="zstd")
+        try:
+            async for change in changes:
+                change["_id"] = str(change["_id"])
+                chunk.append(change)
+                if len(chunk) >= self.batch_size:
+                    rows += await self._write_chunk(writer, chunk)
+                    chunk = []
+
+            if chunk:
+                rows += await self._write_chunk(writer, chunk)
+        finally:
+            await asyncio.to_thread(writer.close)
+
+        return rows
+
+    @staticmethod
+    async def _write_chunk(
+        writer: pq.ParquetWriter, chunk: list[dict[str, Any]]
+    ) -> int:
+        table = pa.Table.from_pylist(chunk, schema=SEGMENT_SCHEMA)
+        await asyncio.to_thread(writer.write_table, table)
+        return table.num_rows
+
+    async def _read_segment(
+        self,
+        path: Path,
+        start_date: datetime,
+        end_date: datetime,
+        end_inclusive: bool,
+        book_id: str | None = None,
+        change_type: str | None = None,
+        columns: list[str] | None = None,
+        oldest_first: bool = False,
+    ) -> AsyncIterator[pa.RecordBatch]:
+        # Segments hold whole days, so only the edges of a range filter
+        # anything out on time
+        start = pa.scalar(as_utc(start_date), type=_TIMESTAMP)
+        end = pa.scalar(as_utc(end_date), type=_TIMESTAMP)
+
+        try:
+            parquet_file = await asyncio.to_thread(pq.ParquetFile, path)
+        except FileNotFoundError as e:
+            raise SegmentMissingError(path) from e
+        try:
+            batches = (
+                self._reversed_batches(parquet_file, columns)
+                if oldest_first
+                else self._batches(parquet_file, columns)
+            )
+            async for batch in batches:
+                timestamps = batch.column("timestamp")
+                mask = pc.and_(
+                    pc.greater_equal(timestamps, start),
+                    pc.less_equal(timestamps, end)
+                    if end_inclusive
+                    else pc.less(timestamps, end),
+                )
+                if book_id:
+                    mask = pc.and_(mask, pc.equal(batch.column("book_id"), book_id))
+                if change_type:
+                    mask = pc.and_(
+                        mask, pc.equal(batch.column("change_type"), change_type)
+                    )
+                yield batch.filter(mask)
+        finally:
+            parquet_file.close()
+
+    async def _batches(
+        self, parquet_file: pq.ParquetFile, columns: list[str] | None
+    ) -> AsyncIterator[pa.RecordBatch]:
+        batches = parquet_file.iter_batches(batch_size=self.batch_size, columns=columns)
+        while batch := await asyncio.to_thread(next, batches, None):
+            yield batch
+
+    @staticmethod
+    async def _reversed_batches(
+        parquet_file: pq.ParquetFile, columns: list[str] | None
+    ) -> AsyncIterator[pa.RecordBatch]:
+        # Rows are stored newest first, read back to front one row group at a
+        # time, each reversed
+        for index in reversed(range(parquet_file.num_row_groups)):
+            table = await asyncio.to_thread(
+                parquet_file.read_row_group, index, columns=columns
+            )
+            table = table.take(pa.array(range(table.num_rows - 1, -1, -1)))
+            for batch in table.to_batches():
+                yield batch
+
+    @staticmethod
+    def _sync(path: Path) -> None:
+        # A directory is synced for the rename into it to be durable
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _is_after(
+        row: dict[str, Any],
+        value: datetime,
+        last_id: PydanticObjectId,
+        change_index: int | None,
+    ) -> bool:
+        # Mirrors the hot tier's order: timestamp and _id descending, then the
+        # changes of a compact document in their stored order
+        timestamp, value = as_utc(row["timestamp"]), as_utc(value)
+        if timestamp != value:
+            return timestamp < value
+        if row["_id"] != last_id:
+            return row["_id"] < last_id
+        return (
+            change_index is not None
+            and row["change_index"] is not None
+            and row["change_index"] > change_index
+        )
@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+import json
+from typing import Any
+
+import redis.asyncio as redis
+from loguru import logger
+
+from filerskeepers.application.settings import settings
+
+
+# Reads the current generation and the entry stored under it in one round trip
+_GET_VERSIONED = """
+local generation = redis.call('GET', KEYS[1]) or '0'
+local payload = redis.call('GET', ARGV[1] .. generation .. ARGV[2])
+return {generation, payload}
+"""
+
+
+class BookCache:
+    """
+    Redis cache for serialised book API responses.
+
+    Every key embeds the catalog generation, a counter that is bumped whenever a
+    crawl creates or updates a book. Bumping it makes all older entries
+    unreachable at once, they are never deleted explicitly and just expire.
+    Redis failures on reads are logged and treated as cache misses, a bump
+    that keeps failing raises, the write it follows must not look done with
+    the cache left stale.
+    """
+
+    GENERATION_KEY = "books:catalog_generation"
+    KEY_PREFIX = "books:cache"
+    # Returned by get when the generation could not be read
+    UNCONFIRMED = -1
+    BUMP_ATTEMPTS = 3
+
+    def __init__(
+        self, redis_client: redis.Redis, ttl: int = settings.BOOKS_CACHE_TTL
+    ) -> None:
+        self.redis_client = redis_client
+        self.ttl = ttl
+
+    async def get(
+        self, namespace: str, params: dict[str, Any]
+    ) -> tuple[int, bytes | None]:
+        try:
+            generation, payload = await self.redis_client.eval(  # type: ignore[misc]
+                _GET_VERSIONED,
+                1,
+                self.GENERATION_KEY,
+                f"{self.KEY_PREFIX}:{namespace}:",
+                f":{self._digest(params)}",
+            )
+            return int(generation), payload
+        except redis.RedisError as e:
+            logger.warning(f"Book cache read failed: {e}")
+            return self.UNCONFIRMED, None
+
+    async def set(
+        self, namespace: str, generation: int, params: dict[str, Any], payload: bytes
+    ) -> None:
+        # Stored under the generation read *before* querying Mongo, so a crawl
+        # that lands mid-request leaves the entry under an already stale key
+        if generation == self.UNCONFIRMED:
+            # Nothing tells whether it is already stale, not cached at all
+            return
+        key = f"{self.KEY_PREFIX}:{namespace}:{generation}:{self._digest(params)}"
+        try:
+            await self.redis_client.set(key, payload, ex=self.ttl)
+        except redis.RedisError as e:
+            logger.warning(f"Book cache write failed: {e}")
+
+    async def bump_generation(self) -> None:
+        """Invalidate every entry, retried before the RedisError is raised."""
+        for attempt in range(self.BUMP_ATTEMPTS):
+            try:
+                await self.redis_client.incr(self.GENERATION_KEY)
+                return
+            except redis.RedisError as e:
+                if attempt + 1 == self.BUMP_ATTEMPTS:
+                    logger.error(f"Failed to bump catalog generation: {e}")
+                    raise
+                logger.warning(f"Failed to bump catalog generation, retrying: {e}")
+                await asyncio.sleep(0.1 * 2**attempt)
+
+    @staticmethod
+    def _digest(params: dict[str, Any]) -> str:
+        # Unset parameters are dropped so that adding a new optional query
+        # parameter does not change the keys of existing requests
+        normalised = {key: value for key, value in params.items() if value is not None}
+        encoded = json.dumps(normalised, sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode()).hexdigest()[:32]
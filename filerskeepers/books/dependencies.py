@@ -1,8 +1,17 @@
 from typing import Annotated
 
-from fastapi import Depends
+from fastapi import Depends, Request
 
-from filerskeepers.books.repositories import BookRepository, ChangeLogRepository
+from filerskeepers.books.archive import ChangeLogArchive
+from filerskeepers.books.cache import BookCache
+from filerskeepers.books.exports import ExportService
+from filerskeepers.books.feed import ChangeFeed, ChangeFeedBroadcaster
+from filerskeepers.books.repositories import (
+    BookRepository,
+    ChangeLogRepository,
+    ChangeLogSegmentRepository,
+    PriceObservationRepository,
+)
 from filerskeepers.books.services import BookService
 
 
@@ -14,11 +23,62 @@ def get_change_log_repository() -> ChangeLogRepository:
     return ChangeLogRepository()
 
 
+def get_price_observation_repository() -> PriceObservationRepository:
+    return PriceObservationRepository()
+
+
+def get_change_log_segment_repository() -> ChangeLogSegmentRepository:
+    return ChangeLogSegmentRepository()
+
+
+def get_change_log_archive(
+    change_log_repo: Annotated[ChangeLogRepository, Depends(get_change_log_repository)],
+    segment_repo: Annotated[
+        ChangeLogSegmentRepository, Depends(get_change_log_segment_repository)
+    ],
+) -> ChangeLogArchive:
+    return ChangeLogArchive(change_log_repo=change_log_repo, segment_repo=segment_repo)
+
+
+def get_book_cache(request: Request) -> BookCache:
+    return BookCache(redis_client=request.app.state.redis_client)
+
+
+def get_change_feed(request: Request) -> ChangeFeed:
+    return ChangeFeed(redis_client=request.app.state.redis_client)
+
+
+def get_change_feed_broadcaster(request: Request) -> ChangeFeedBroadcaster:
+    # One per process, created by the application lifespan
+    broadcaster: ChangeFeedBroadcaster = request.app.state.change_feed_broadcaster
+    return broadcaster
+
+
 def get_book_service(
     book_repo: Annotated[BookRepository, Depends(get_book_repository)],
     change_log_repo: Annotated[ChangeLogRepository, Depends(get_change_log_repository)],
+    price_history_repo: Annotated[
+        PriceObservationRepository, Depends(get_price_observation_repository)
+    ],
+    cache: Annotated[BookCache, Depends(get_book_cache)],
+    archive: Annotated[ChangeLogArchive, Depends(get_change_log_archive)],
+    feed: Annotated[ChangeFeed, Depends(get_change_feed)],
 ) -> BookService:
     return BookService(
         book_repo=book_repo,
         change_log_repo=change_log_repo,
+        price_history_repo=price_history_repo,
+        cache=cache,
+        archive=archive,
+        feed=feed,
+    )
+
+
+def get_export_service(
+    book_repo: Annotated[BookRepository, Depends(get_book_repository)],
+    change_log_repo: Annotated[ChangeLogRepository, Depends(get_change_log_repository)],
+    archive: Annotated[ChangeLogArchive, Depends(get_change_log_archive)],
+) -> ExportService:
+    return ExportService(
+        book_repo=book_repo, change_log_repo=change_log_repo, archive=archive
     )
@@ -1,9 +1,10 @@
+import base64
 from datetime import datetime
 from typing import Self
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
-from filerskeepers.books.models import Book, ChangeLog
+from filerskeepers.books.models import Book, ChangeLogEntry
 
 
 class BookResponse(BaseModel):
@@ -42,12 +43,33 @@ class BookResponse(BaseModel):
         )
 
 
+class PageCursor(BaseModel):
+    """Position after the last item of a page, handed to clients as a token."""
+
+    sort_by: str
+    value: int | float | datetime
+    id: str
+    # Position inside a compact change log document
+    index: int | None = None
+
+    def encode(self) -> str:
+        return base64.urlsafe_b64encode(self.model_dump_json().encode()).decode()
+
+    @classmethod
+    def decode(cls, token: str) -> Self:
+        try:
+            return cls.model_validate_json(base64.urlsafe_b64decode(token))
+        except (ValueError, ValidationError) as e:
+            raise ValueError(f"Invalid cursor: {e}")
+
+
 class BookListResponse(BaseModel):
     books: list[BookResponse]
-    total: int
+    total: int | None  # None when requested with include_total=false
     page: int
     page_size: int
-    total_pages: int
+    total_pages: int | None
+    next_cursor: str | None = None
 
 
 class ChangeLogResponse(BaseModel):
@@ -61,9 +83,9 @@ class ChangeLogResponse(BaseModel):
     timestamp: datetime
 
     @classmethod
-    def from_object(cls, change: ChangeLog) -> Self:
+    def from_object(cls, change: ChangeLogEntry) -> Self:
         return cls(
-            id=str(change.id),
+            id=change.entry_id,
             book_id=change.book_id,
             book_name=change.book_name,
             change_type=change.change_type,
@@ -76,7 +98,33 @@ class ChangeLogResponse(BaseModel):
 
 class ChangeLogListResponse(BaseModel):
     changes: list[ChangeLogResponse]
-    total: int
+    total: int | None  # None when requested with include_total=false
     page: int
     page_size: int
-    total_pages: int
+    total_pages: int | None
+    next_cursor: str | None = None
+
+
+class PricePoint(BaseModel):
+    timestamp: datetime  # start of the interval
+    min_price: float
+    max_price: float
+    last_price: float
+    in_stock: bool  # as of the last observation
+    observations: int
+
+
+class PriceHistoryResponse(BaseModel):
+    book_id: str
+    interval: str
+    start_date: datetime
+    end_date: datetime
+    points: list[PricePoint]
+
+
+class ExportResult(BaseModel):
+    dataset: str
+    path: str
+    rows: int
+    since: datetime | None
+    until: datetime  # pass as `since` to continue from here
@@ -0,0 +1,172 @@
+import asyncio
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Any, Literal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from loguru import logger
+
+from filerskeepers.application.settings import settings
+from filerskeepers.books.archive import ChangeLogArchive
+from filerskeepers.books.dtos import ExportResult
+from filerskeepers.books.models import change_entry_id
+from filerskeepers.books.repositories import BookRepository, ChangeLogRepository
+from filerskeepers.reports.models import as_utc
+
+
+ExportDataset = Literal["books", "change_logs"]
+
+# Records are timestamped just before they are written, anything newer than
+# this is left for the next export so an in-flight write is never skipped
+EXPORT_LAG = timedelta(minutes=1)
+
+_TIMESTAMP = pa.timestamp("ms", tz="UTC")
+
+BOOK_SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("name", pa.string()),
+        ("description", pa.string()),
+        ("category", pa.string()),
+        ("price_excl_tax", pa.float64()),
+        ("price_incl_tax", pa.float64()),
+        ("availability", pa.string()),
+        ("num_reviews", pa.int32()),
+        ("image_url", pa.string()),
+        ("rating", pa.int8()),
+        ("source_url", pa.string()),
+        ("crawl_timestamp", _TIMESTAMP),
+        ("crawl_status", pa.string()),
+        ("content_hash", pa.string()),
+        ("created_at", _TIMESTAMP),
+        ("updated_at", _TIMESTAMP),
+    ]
+)
+
+CHANGE_LOG_SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("book_id", pa.string()),
+        ("book_name", pa.string()),
+        ("change_type", pa.string()),
+        ("field_changed", pa.string()),
+        ("old_value", pa.string()),
+        ("new_value", pa.string()),
+        ("timestamp", _TIMESTAMP),
+        ("crawl_id", pa.string()),
+    ]
+)
+
+
+class ExportService:
+    """
+    Export books and change logs to zstd compressed Parquet files.
+
+    Documents are streamed from Mongo and written one row group of
+    `chunk_size` rows at a time, so memory use does not depend on the size of
+    the collection. Exports are incremental: each one covers the records
+    changed in (since, until] and reports `until` as the watermark to pass as
+    `since` next time. Change logs older than the archive boundary are read
+    from the archive, as reports do.
+    """
+
+    def __init__(
+        self,
+        book_repo: BookRepository,
+        change_log_repo: ChangeLogRepository,
+        archive: ChangeLogArchive | None = None,
+        chunk_size: int = settings.EXPORT_CHUNK_SIZE,
+    ) -> None:
+        self.book_repo = book_repo
+        self.change_log_repo = change_log_repo
+        self.archive = archive
+        self.chunk_size = chunk_size
+
+    async def export(
+        self,
+        dataset: ExportDataset,
+        path: Path,
+        since: datetime | None = None,
+    ) -> ExportResult:
+        until = datetime.now(UTC) - EXPORT_LAG
+        if dataset == "books":
+            schema = BOOK_SCHEMA
+            documents = self.book_repo.stream_updated(
+                since, until, batch_size=self.chunk_size
+            )
+        else:
+            schema = CHANGE_LOG_SCHEMA
+            documents = self._stream_change_logs(since, until)
+
+        rows = await self._write_parquet(path, schema, documents)
+        logger.info(
+            f"Exported {rows} {dataset} changed since {since} up to {until} to {path}"
+        )
+        return ExportResult(
+            dataset=dataset, path=str(path), rows=rows, since=since, until=until
+        )
+
+    async def _stream_change_logs(
+        self, since: datetime | None, until: datetime
+    ) -> AsyncIterator[dict[str, Any]]:
+        boundary = await self.archive.boundary() if self.archive else None
+        if (
+            self.archive is None
+            or boundary is None
+            or (since is not None and as_utc(since) >= boundary)
+        ):
+            async for change in self.change_log_repo.stream_created(
+                since, until, batch_size=self.chunk_size
+            ):
+                yield change
+            return
+
+        # Oldest first: the archive up to the boundary, then Mongo from it on.
+        # Mongo is never read below the boundary, so a day being archived is
+        # not exported twice
+        async for change in self.archive.stream_created(since, min(until, boundary)):
+            yield change
+        async for change in self.change_log_repo.stream_created(
+            boundary, until, batch_size=self.chunk_size, since_inclusive=True
+        ):
+            yield change
+
+    async def _write_parquet(
+        self,
+        path: Path,
+        schema: pa.Schema,
+        documents: AsyncIterator[dict[str, Any]],
+    ) -> int:
+        rows = 0
+        chunk: list[dict[str, Any]] = []
+        # An empty export still gets a valid file with the schema
+        writer = pq.ParquetWriter(path, schema, compression="zstd")
+        try:
+            async for document in documents:
+                document["id"] = change_entry_id(
+                    document.pop("_id"), document.pop("change_index", None)
+                )
+                chunk.append(document)
+                if len(chunk) >= self.chunk_size:
+                    rows += await self._write_chunk(writer, schema, chunk)
+                    chunk = []
+
+            if chunk:
+                rows += await self._write_chunk(writer, schema, chunk)
+        finally:
+            await asyncio.to_thread(writer.close)
+
+        return rows
+
+    @staticmethod
+    async def _write_chunk(
+        writer: pq.ParquetWriter, schema: pa.Schema, chunk: list[dict[str, Any]]
+    ) -> int:
+        # Fields missing from older documents become nulls, unknown ones are
+        # dropped by the schema
+        table = pa.Table.from_pylist(chunk, schema=schema)
+        # Encoding and compression are CPU bound, keep them off the event loop
+        await asyncio.to_thread(writer.write_table, table)
+        return table.num_rows
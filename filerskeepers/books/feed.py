@@ -0,0 +1,192 @@
+import asyncio
+import contextlib
+import json
+from collections.abc import AsyncGenerator, AsyncIterator
+from typing import Any
+
+import redis.asyncio as redis
+from loguru import logger
+
+from filerskeepers.application.settings import settings
+from filerskeepers.books.dtos import ChangeLogResponse
+
+
+STREAM_KEY = "books:changes"
+
+# (stream entry ID, change)
+FeedEvent = tuple[str, dict[str, Any]]
+
+
+def _entry_id(event_id: bytes | str) -> tuple[int, int]:
+    milliseconds, sequence = (
+        event_id.decode() if isinstance(event_id, bytes) else event_id
+    ).split("-")
+    return int(milliseconds), int(sequence)
+
+
+def _decode(event_id: bytes, fields: dict[bytes, bytes]) -> FeedEvent:
+    return event_id.decode(), json.loads(fields[b"data"])
+
+
+class ChangeFeed:
+    """
+    Redis stream of logged changes, the source of GET /books/v1/changes/stream.
+
+    The stream is capped at roughly `maxlen` entries, which bounds how far
+    back a subscriber can resume. Publishing failures are logged and never
+    fail the crawl that logged the changes.
+    """
+
+    def __init__(
+        self, redis_client: redis.Redis, maxlen: int = settings.CHANGE_FEED_MAXLEN
+    ) -> None:
+        self.redis_client = redis_client
+        self.maxlen = maxlen
+
+    async def publish(self, changes: list[ChangeLogResponse]) -> None:
+        if not changes:
+            return
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for change in changes:
+                    await pipe.xadd(
+                        STREAM_KEY,
+                        {"data": change.model_dump_json()},
+                        maxlen=self.maxlen,
+                        approximate=True,
+                    )
+                await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Could not publish {len(changes)} changes: {e}")
+
+    async def replay(
+        self, after_id: str, batch_size: int = 500
+    ) -> AsyncIterator[FeedEvent]:
+        """Yield the events published after `after_id`, oldest first."""
+        start = f"({after_id}"
+        while True:
+            entries = await self.redis_client.xrange(
+                STREAM_KEY, min=start, max="+", count=batch_size
+            )
+            for event_id, fields in entries:
+                yield _decode(event_id, fields)
+            if len(entries) < batch_size:
+                return
+            start = f"({entries[-1][0].decode()}"
+
+
+class ChangeFeedBroadcaster:
+    """
+    Fans the change feed out to the subscribers of one process.
+
+    A single reader blocks on XREAD for new events and puts them on the
+    in-memory queue of every subscriber, so Redis connections and round trips
+    do not grow with the number of subscribers. A subscriber that falls
+    `queue_size` events behind is disconnected rather than buffered without
+    bound, it can resume from its last event ID.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        queue_size: int = settings.CHANGE_FEED_QUEUE_SIZE,
+        heartbeat: float = settings.CHANGE_FEED_HEARTBEAT,
+        block_ms: int = 5000,
+    ) -> None:
+        self.redis_client = redis_client
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.block_ms = block_ms
+        self._subscribers: set[asyncio.Queue[FeedEvent | None]] = set()
+        self._reader: asyncio.Task[None] | None = None
+
+    async def subscribe(
+        self,
+        last_event_id: str | None = None,
+        change_type: str | None = None,
+        book_id: str | None = None,
+    ) -> AsyncGenerator[FeedEvent | None]:
+        """
+        Yield matching events as they are published, None every `heartbeat`
+        seconds without one.
+
+        With `last_event_id` the events published after it are replayed first.
+        """
+        queue: asyncio.Queue[FeedEvent | None] = asyncio.Queue(self.queue_size)
+        # Listen before replaying, so nothing published in between is missed,
+        # anything seen twice is dropped by its ID
+        self._subscribers.add(queue)
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read())
+
+        def matches(change: dict[str, Any]) -> bool:
+            return (change_type is None or change["change_type"] == change_type) and (
+                book_id is None or change["book_id"] == book_id
+            )
+
+        try:
+            last_id = _entry_id(last_event_id) if last_event_id else None
+            if last_event_id:
+                async for event_id, change in ChangeFeed(self.redis_client).replay(
+                    last_event_id
+                ):
+                    last_id = _entry_id(event_id)
+                    if matches(change):
+                        yield event_id, change
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except TimeoutError:
+                    yield None
+                    continue
+
+                if event is None:
+                    logger.info(
+                        "Disconnecting a change feed subscriber that fell behind"
+                    )
+                    return
+                event_id, change = event
+                if last_id is not None and _entry_id(event_id) <= last_id:
+                    continue
+                last_id = _entry_id(event_id)
+                if matches(change):
+                    yield event
+        finally:
+            self._subscribers.discard(queue)
+
+    async def close(self) -> None:
+        if self._reader:
+            self._reader.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._reader
+
+    async def _read(self) -> None:
+        last_id = "$"
+        while True:
+            try:
+                response = await self.redis_client.xread(
+                    {STREAM_KEY: last_id}, count=500, block=self.block_ms
+                )
+            except redis.RedisError as e:
+                logger.warning(f"Change feed read failed, retrying: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            for _, entries in response:
+                for event_id, fields in entries:
+                    event = _decode(event_id, fields)
+                    last_id = event[0]
+                    self._broadcast(event)
+
+    def _broadcast(self, event: FeedEvent) -> None:
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Make room for the signal to disconnect, the subscriber
+                # resumes from the last event it actually sent
+                self._subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
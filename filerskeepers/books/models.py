@@ -1,20 +1,21 @@
 from datetime import UTC, datetime
-from typing import Literal
+from typing import Any, Literal
 
-from beanie import Document, Indexed
-from pydantic import Field
+from beanie import Document, Granularity, Indexed, PydanticObjectId, TimeSeriesConfig
+from pydantic import BaseModel, Field
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 
 class Book(Document):
     name: Indexed(str)  # type: ignore
     description: str = ""
-    category: Indexed(str)  # type: ignore
+    category: str
     price_excl_tax: float
     price_incl_tax: float
     availability: Indexed(str)  # type: ignore
     num_reviews: int = 0
     image_url: str
-    rating: Indexed(int)  # type: ignore
+    rating: int
 
     source_url: str
     crawl_timestamp: datetime = Field(default_factory=lambda: datetime.now(UTC))
@@ -30,33 +31,233 @@ class Book(Document):
     class Settings:
         name = "books"
         use_state_management = True
+        # Compound indexes follow equality -> sort -> range for the list_books
+        # query shapes; every sort ends on _id for stable keyset pagination.
+        # category and rating filters are served by the prefixes below.
         indexes = [
             "name",
-            "category",
-            "rating",
             "availability",
             "content_hash",
+            "source_url",
+            # Unfiltered sorts, price also serves min/max price ranges
+            IndexModel([("rating", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("price_incl_tax", ASCENDING), ("_id", ASCENDING)]),
+            IndexModel([("num_reviews", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+            # Incremental exports
+            IndexModel([("updated_at", ASCENDING), ("_id", ASCENDING)]),
+            # Category filter with each sort
+            IndexModel(
+                [("category", ASCENDING), ("rating", DESCENDING), ("_id", DESCENDING)]
+            ),
+            IndexModel(
+                [
+                    ("category", ASCENDING),
+                    ("price_incl_tax", ASCENDING),
+                    ("_id", ASCENDING),
+                ]
+            ),
+            IndexModel(
+                [
+                    ("category", ASCENDING),
+                    ("num_reviews", DESCENDING),
+                    ("_id", DESCENDING),
+                ]
+            ),
+            IndexModel(
+                [
+                    ("category", ASCENDING),
+                    ("created_at", DESCENDING),
+                    ("_id", DESCENDING),
+                ]
+            ),
+            # Rating filter with the remaining sorts
+            IndexModel(
+                [
+                    ("rating", ASCENDING),
+                    ("price_incl_tax", ASCENDING),
+                    ("_id", ASCENDING),
+                ]
+            ),
+            IndexModel(
+                [
+                    ("rating", ASCENDING),
+                    ("num_reviews", DESCENDING),
+                    ("_id", DESCENDING),
+                ]
+            ),
+            IndexModel(
+                [("rating", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]
+            ),
         ]
 
     def update_timestamp(self) -> None:
         self.updated_at = datetime.now(UTC)
 
 
+class PriceObservation(Document):
+    """A book's price and availability as seen by one crawl."""
+
+    book_id: str
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    price_incl_tax: float
+    price_excl_tax: float
+    availability: str
+    in_stock: bool
+    crawl_id: str | None = None
+
+    class Settings:
+        name = "price_observations"
+        # Bucketed by book, Mongo also indexes (book_id, timestamp) itself,
+        # so a book's history over any range is one index range scan
+        timeseries = TimeSeriesConfig(
+            time_field="timestamp",
+            meta_field="book_id",
+            granularity=Granularity.hours,
+        )
+
+
+class BookCategory(BaseModel):
+    """A Book reduced to its category, for joining onto changes."""
+
+    id: PydanticObjectId = Field(alias="_id")
+    category: str
+
+
+ChangeType = Literal["new_book", "price_change", "availability_change", "other"]
+
+
+class FieldChange(BaseModel):
+    field: str
+    change_type: ChangeType
+    old_value: str | None = None
+    new_value: str | None = None
+
+
 class ChangeLog(Document):
-    book_id: Indexed(str)  # type: ignore
+    """
+    A change detected in a crawl, in one of two formats.
+
+    Per field documents hold a single change in field_changed, old_value and
+    new_value. Compact documents hold every change of one book in one crawl
+    in `changes`, with change_type set to the type of the first one. Reads go
+    through the repository, which flattens both into ChangeLogEntry rows.
+    """
+
+    book_id: str
     book_name: str
-    change_type: Literal["new_book", "price_change", "availability_change", "other"]
+    change_type: ChangeType
     old_value: str | None = None
     new_value: str | None = None
     field_changed: str | None = None
+    changes: list[FieldChange] = Field(default_factory=list)
     timestamp: datetime = Field(default_factory=lambda: datetime.now(UTC))
     crawl_id: str | None = None
 
     class Settings:
         name = "change_logs"
         use_state_management = True
+        # list_changes filters on book_id or change_type and sorts on
+        # (timestamp, _id); reports scan timestamp ranges
+        indexes = [
+            IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel(
+                [("book_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)]
+            ),
+            IndexModel(
+                [
+                    ("change_type", ASCENDING),
+                    ("timestamp", DESCENDING),
+                    ("_id", DESCENDING),
+                ]
+            ),
+            # Multikey, change types inside compact documents
+            IndexModel(
+                [
+                    ("changes.change_type", ASCENDING),
+                    ("timestamp", DESCENDING),
+                    ("_id", DESCENDING),
+                ]
+            ),
+        ]
+
+    def entries(self) -> list["ChangeLogEntry"]:
+        """This document flattened, the way the repository reads it back."""
+        common = {
+            "_id": self.id,
+            "book_id": self.book_id,
+            "book_name": self.book_name,
+            "timestamp": self.timestamp,
+            "crawl_id": self.crawl_id,
+        }
+        if not self.changes:
+            return [
+                ChangeLogEntry.model_validate(
+                    common
+                    | {
+                        "change_type": self.change_type,
+                        "old_value": self.old_value,
+                        "new_value": self.new_value,
+                        "field_changed": self.field_changed,
+                    }
+                )
+            ]
+        return [
+            ChangeLogEntry.model_validate(
+                common
+                | {
+                    "change_index": index,
+                    "change_type": change.change_type,
+                    "old_value": change.old_value,
+                    "new_value": change.new_value,
+                    "field_changed": change.field,
+                }
+            )
+            for index, change in enumerate(self.changes)
+        ]
+
+
+def change_entry_id(document_id: Any, change_index: int | None) -> str:
+    """Public id of one change, compact documents hold several."""
+    if change_index is None:
+        return str(document_id)
+    return f"{document_id}-{change_index}"
+
+
+class ChangeLogEntry(BaseModel):
+    """One change, flattened out of either ChangeLog format."""
+
+    id: PydanticObjectId = Field(alias="_id")
+    # Position in a compact document's changes, None for per field documents
+    change_index: int | None = None
+    book_id: str
+    book_name: str
+    change_type: ChangeType
+    old_value: str | None = None
+    new_value: str | None = None
+    field_changed: str | None = None
+    timestamp: datetime
+    crawl_id: str | None = None
+
+    @property
+    def entry_id(self) -> str:
+        return change_entry_id(self.id, self.change_index)
+
+
+class ChangeLogSegment(Document):
+    """One UTC day of change logs, archived to a Parquet file."""
+
+    start_date: datetime  # inclusive
+    end_date: datetime  # exclusive
+    path: str
+    rows: int
+    size_bytes: int
+    archived_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+
+    class Settings:
+        name = "change_log_segments"
+        use_state_management = True
         indexes = [
-            "book_id",
-            "change_type",
-            "timestamp",
+            IndexModel([("start_date", ASCENDING)], unique=True),
+            IndexModel([("end_date", DESCENDING)]),
         ]
@@ -1,6 +1,236 @@
-from typing import Literal
+import asyncio
+from collections.abc import AsyncIterator
+from datetime import datetime
+from typing import Any, Literal
 
-from filerskeepers.books.models import Book, ChangeLog
+from beanie import Document, PydanticObjectId, SortDirection
+from beanie.operators import In
+from pymongo.errors import BulkWriteError
+
+from filerskeepers.application.settings import settings
+from filerskeepers.books.models import (
+    Book,
+    BookCategory,
+    ChangeLog,
+    ChangeLogEntry,
+    ChangeLogSegment,
+    ChangeType,
+    FieldChange,
+    PriceObservation,
+)
+
+
+TotalStrategy = Literal["concurrent", "facet"]
+HistoryInterval = Literal["raw", "day", "week", "month"]
+
+
+# sort_by -> (field, direction); ties are always broken on _id, same direction
+BOOK_SORT_FIELDS: dict[str | None, tuple[str, SortDirection]] = {
+    "rating": ("rating", SortDirection.DESCENDING),
+    "price": ("price_incl_tax", SortDirection.ASCENDING),
+    "reviews": ("num_reviews", SortDirection.DESCENDING),
+    None: ("created_at", SortDirection.DESCENDING),
+}
+CHANGE_LOG_SORT_FIELD = ("timestamp", SortDirection.DESCENDING)
+
+# Fields included in change reports, everything else is left in Mongo
+CHANGE_LOG_REPORT_FIELDS = (
+    "book_id",
+    "book_name",
+    "change_type",
+    "field_changed",
+    "old_value",
+    "new_value",
+    "timestamp",
+)
+
+# Turns both ChangeLog formats into one row per change: compact documents are
+# unwound into their changes, per field documents pass through with a null
+# change_index. Match and sort documents before this, so indexes still apply.
+FLATTEN_CHANGES: list[dict[str, Any]] = [
+    {
+        "$unwind": {
+            "path": "$changes",
+            "includeArrayIndex": "change_index",
+            "preserveNullAndEmptyArrays": True,
+        }
+    },
+    {
+        "$set": {
+            "change_type": {"$ifNull": ["$changes.change_type", "$change_type"]},
+            "field_changed": {"$ifNull": ["$changes.field", "$field_changed"]},
+            "old_value": {"$ifNull": ["$changes.old_value", "$old_value"]},
+            "new_value": {"$ifNull": ["$changes.new_value", "$new_value"]},
+        }
+    },
+    {"$unset": "changes"},
+]
+
+
+def _parse_price(field: str) -> dict[str, Any]:
+    # Change logs store prices as display strings, e.g. "£51.77"
+    return {
+        "$convert": {
+            "input": {"$ltrim": {"input": field, "chars": "£"}},
+            "to": "double",
+            "onError": None,
+            "onNull": None,
+        }
+    }
+
+
+def _count_if_set(field: str) -> dict[str, Any]:
+    return {"$sum": {"$cond": [{"$ne": [field, None]}, 1, 0]}}
+
+
+def _count_if_positive(expression: Any) -> dict[str, Any]:
+    return {"$sum": {"$cond": [{"$gt": [expression, 0]}, 1, 0]}}
+
+
+def _join_category(book_id: str) -> list[dict[str, Any]]:
+    # book_id is the string form of the book's ObjectId, anything that is not
+    # one (or points at a deleted book) is reported as "Unknown"
+    return [
+        {
+            "$lookup": {
+                "from": Book.get_collection_name(),
+                "let": {
+                    "book_id": {
+                        "$convert": {
+                            "input": book_id,
+                            "to": "objectId",
+                            "onError": None,
+                            "onNull": None,
+                        }
+                    }
+                },
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$_id", "$$book_id"]}}},
+                    {"$project": {"category": 1}},
+                ],
+                "as": "book",
+            }
+        },
+        {"$set": {"category": {"$ifNull": [{"$first": "$book.category"}, "Unknown"]}}},
+        {"$unset": "book"},
+    ]
+
+
+def keyset_filter(
+    field: str,
+    direction: SortDirection,
+    value: Any,
+    last_id: PydanticObjectId,
+    inclusive: bool = False,
+) -> dict[str, Any]:
+    """
+    Match everything sorted after (value, last_id) in a (field, _id) sort.
+
+    With `inclusive` the document at (value, last_id) itself is matched too.
+    """
+    op = "$lt" if direction == SortDirection.DESCENDING else "$gt"
+    id_op = f"{op}e" if inclusive else op
+    return {
+        "$or": [
+            {field: {op: value}},
+            {field: value, "_id": {id_op: last_id}},
+        ]
+    }
+
+
+async def fetch_page[DocumentT: Document](
+    model: type[DocumentT],
+    filters: list[Any],
+    sort: tuple[str, SortDirection],
+    skip: int,
+    limit: int,
+    after: tuple[Any, PydanticObjectId] | None,
+    include_total: bool,
+    total_strategy: TotalStrategy,
+) -> tuple[list[DocumentT], int | None]:
+    """
+    Fetch one page of `model` and, optionally, the total matching `filters`.
+
+    The total never depends on the cursor. With the "facet" strategy page and
+    total come back from a single aggregation, with "concurrent" the page query
+    and the count run side by side, either way it is one round trip of latency.
+    """
+    field, direction = sort
+    seek = [keyset_filter(field, direction, *after)] if after else []
+
+    if include_total and total_strategy == "facet":
+        items_pipeline: list[dict[str, Any]] = [{"$match": f} for f in seek]
+        items_pipeline.append({"$sort": {field: int(direction), "_id": int(direction)}})
+        if skip:
+            items_pipeline.append({"$skip": skip})
+        items_pipeline.append({"$limit": limit})
+
+        results = await (
+            model.find(*filters)
+            .aggregate(
+                [{"$facet": {"items": items_pipeline, "total": [{"$count": "count"}]}}]
+            )
+            .to_list()
+        )
+        facet = results[0]
+        total = facet["total"][0]["count"] if facet["total"] else 0
+        return [model.model_validate(doc) for doc in facet["items"]], total
+
+    page_query = (
+        model.find(*filters, *seek)
+        .sort([(field, direction), ("_id", direction)])
+        .skip(skip)
+        .limit(limit)
+    )
+    if not include_total:
+        return await page_query.to_list(), None
+
+    items, total = await asyncio.gather(
+        page_query.to_list(), model.find(*filters).count()
+    )
+    return items, total
+
+
+async def stream_raw(
+    model: type[Document],
+    filters: list[Any],
+    sort: tuple[str, SortDirection],
+    batch_size: int,
+    projection: dict[str, int] | None = None,
+) -> AsyncIterator[dict[str, Any]]:
+    """
+    Yield raw documents of `model` in (sort field, _id) order.
+
+    Documents are read straight from the driver cursor without model
+    validation, so only one batch is ever held in memory.
+    """
+    field, direction = sort
+    cursor = (
+        model.get_pymongo_collection()
+        .find(model.find(*filters).get_filter_query(), projection=projection)
+        .sort([(field, int(direction)), ("_id", int(direction))])
+        .batch_size(batch_size)
+    )
+    # Closing matters when a consumer stops early, e.g. a client disconnects
+    async with cursor:
+        async for document in cursor:
+            yield document
+
+
+async def stream_aggregate(
+    model: type[Document],
+    filters: list[Any],
+    pipeline: list[dict[str, Any]],
+    batch_size: int,
+) -> AsyncIterator[dict[str, Any]]:
+    """Same as stream_raw, for documents reshaped by an aggregation pipeline."""
+    cursor = await model.get_pymongo_collection().aggregate(
+        [{"$match": model.find(*filters).get_filter_query()}, *pipeline],
+        batchSize=batch_size,
+    )
+    async with cursor:
+        async for document in cursor:
+            yield document
 
 
 class BookRepository:
@@ -17,6 +247,17 @@ class BookRepository:
     async def find_by_url(self, url: str) -> Book | None:
         return await Book.find_one(Book.source_url == url)
 
+    async def find_by_urls(self, urls: list[str]) -> dict[str, Book]:
+        books = await Book.find(In(Book.source_url, urls)).to_list()
+        return {book.source_url: book for book in books}
+
+    async def find_existing_ids(
+        self, ids: list[PydanticObjectId | None]
+    ) -> set[PydanticObjectId | None]:
+        """The ids among `ids` that are stored."""
+        books = await Book.find(In(Book.id, ids)).to_list()
+        return {book.id for book in books}
+
     async def list_books(
         self,
         category: str | None = None,
@@ -26,35 +267,71 @@ class BookRepository:
         sort_by: Literal["rating", "price", "reviews"] | None = None,
         skip: int = 0,
         limit: int = 10,
-    ) -> tuple[list[Book], int]:
-        query = Book.find()
+        after: tuple[Any, PydanticObjectId] | None = None,
+        include_total: bool = True,
+        total_strategy: TotalStrategy = settings.LIST_TOTAL_STRATEGY,
+    ) -> tuple[list[Book], int | None]:
+        filters = self.build_filters(
+            category=category,
+            min_price=min_price,
+            max_price=max_price,
+            rating=rating,
+        )
+
+        return await fetch_page(
+            Book,
+            filters,
+            BOOK_SORT_FIELDS[sort_by],
+            skip=skip,
+            limit=limit,
+            after=after,
+            include_total=include_total,
+            total_strategy=total_strategy,
+        )
+
+    def build_filters(
+        self,
+        category: str | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        rating: int | None = None,
+    ) -> list[Any]:
+        filters: list[Any] = []
 
         if category:
-            query = query.find(Book.category == category)
+            filters.append(Book.category == category)
 
         if min_price is not None:
-            query = query.find(Book.price_incl_tax >= min_price)
+            filters.append(Book.price_incl_tax >= min_price)
 
         if max_price is not None:
-            query = query.find(Book.price_incl_tax <= max_price)
+            filters.append(Book.price_incl_tax <= max_price)
 
         if rating is not None:
-            query = query.find(Book.rating == rating)
-
-        total = await query.count()
+            filters.append(Book.rating == rating)
 
-        if sort_by == "rating":
-            query = query.sort("-rating")
-        elif sort_by == "price":
-            query = query.sort("price_incl_tax")
-        elif sort_by == "reviews":
-            query = query.sort("-num_reviews")
-        else:
-            query = query.sort("-created_at")
+        return filters
 
-        books = await query.skip(skip).limit(limit).to_list()
+    async def stream_updated(
+        self,
+        since: datetime | None,
+        until: datetime,
+        batch_size: int = settings.EXPORT_CHUNK_SIZE,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Yield raw books updated in (since, until], oldest first."""
+        filters: list[Any] = [Book.updated_at <= until]
+        if since is not None:
+            filters.append(Book.updated_at > since)
 
-        return books, total
+        async for document in stream_raw(
+            Book,
+            filters,
+            ("updated_at", SortDirection.ASCENDING),
+            # Snapshots are by far the largest field and of no use in bulk
+            projection={"html_snapshot": 0},
+            batch_size=batch_size,
+        ):
+            yield document
 
     async def update(self, book: Book) -> Book:
         book.update_timestamp()
@@ -62,7 +339,20 @@ class BookRepository:
         return book
 
     async def bulk_create(self, books: list[Book]) -> list[Book]:
-        await Book.insert_many(books)
+        """
+        Insert the books unordered, so one failing insert does not stop the
+        others. Returns the books that were inserted.
+        """
+        # insert_many does not set the ids on the documents
+        for book in books:
+            book.id = book.id or PydanticObjectId()
+        try:
+            await Book.insert_many(books, ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            if not failed:
+                raise
+            return [book for index, book in enumerate(books) if index not in failed]
         return books
 
 
@@ -71,9 +361,7 @@ class ChangeLogRepository:
         self,
         book_id: str,
         book_name: str,
-        change_type: Literal[
-            "new_book", "price_change", "availability_change", "other"
-        ],
+        change_type: ChangeType,
         old_value: str | None = None,
         new_value: str | None = None,
         field_changed: str | None = None,
@@ -91,25 +379,534 @@ class ChangeLogRepository:
         await change_log.insert()
         return change_log
 
+    async def bulk_create(self, change_logs: list[ChangeLog]) -> list[ChangeLog]:
+        for change_log in change_logs:
+            change_log.id = change_log.id or PydanticObjectId()
+        await ChangeLog.insert_many(change_logs)
+        return change_logs
+
+    async def create_compact(
+        self,
+        book_id: str,
+        book_name: str,
+        changes: list[FieldChange],
+        crawl_id: str | None = None,
+    ) -> ChangeLog:
+        """Store every change of one book in one crawl as a single document."""
+        change_log = ChangeLog(
+            book_id=book_id,
+            book_name=book_name,
+            change_type=changes[0].change_type,
+            changes=changes,
+            crawl_id=crawl_id,
+        )
+        await change_log.insert()
+        return change_log
+
     async def list_changes(
         self,
         book_id: str | None = None,
         change_type: str | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+        skip: int = 0,
+        limit: int = 10,
+        after: tuple[Any, PydanticObjectId, int | None] | None = None,
+        include_total: bool = True,
+        total_strategy: TotalStrategy = settings.LIST_TOTAL_STRATEGY,
+    ) -> tuple[list[ChangeLogEntry], int | None]:
+        """
+        Fetch one page of flattened changes and, optionally, their total.
+
+        Documents are matched, sorted and seeked on the (timestamp, _id)
+        indexes before they are flattened. `after` is (timestamp, _id,
+        change_index) of the last row seen, a page may end part way through a
+        compact document.
+        """
+        filters = self.build_filters(
+            book_id=book_id,
+            change_type=change_type,
+            start_date=start_date,
+            end_date=end_date,
+        )
+        items_pipeline = self.build_page_pipeline(
+            change_type=change_type, skip=skip, limit=limit, after=after
+        )
+
+        # The total never depends on the cursor
+        total_pipeline: list[dict[str, Any]] = [
+            *FLATTEN_CHANGES,
+            *({"$match": f} for f in self.build_row_filters(change_type=change_type)),
+            {"$count": "count"},
+        ]
+
+        query = ChangeLog.find(*filters)
+        if include_total and total_strategy == "facet":
+            results = await query.aggregate(
+                [{"$facet": {"items": items_pipeline, "total": total_pipeline}}]
+            ).to_list()
+            items, counts = results[0]["items"], results[0]["total"]
+        elif include_total:
+            items, counts = await asyncio.gather(
+                query.aggregate(items_pipeline).to_list(),
+                ChangeLog.find(*filters).aggregate(total_pipeline).to_list(),
+            )
+        else:
+            items, counts = await query.aggregate(items_pipeline).to_list(), None
+
+        total = None
+        if counts is not None:
+            total = counts[0]["count"] if counts else 0
+        return [ChangeLogEntry.model_validate(item) for item in items], total
+
+    def build_page_pipeline(
+        self,
+        change_type: str | None = None,
         skip: int = 0,
         limit: int = 10,
-    ) -> tuple[list[ChangeLog], int]:
-        query = ChangeLog.find()
+        after: tuple[Any, PydanticObjectId, int | None] | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        The stages list_changes runs after matching build_filters: sort, seek
+        and flatten, then filter, skip and limit the rows.
+        """
+        row_filters = self.build_row_filters(change_type=change_type)
+        field, direction = CHANGE_LOG_SORT_FIELD
+
+        seek: list[dict[str, Any]] = []
+        if after:
+            value, last_id, change_index = after
+            # A page that ended inside a compact document continues from it
+            seek.append(
+                keyset_filter(
+                    field,
+                    direction,
+                    value,
+                    last_id,
+                    inclusive=change_index is not None,
+                )
+            )
+            if change_index is not None:
+                row_filters.append(
+                    {"$nor": [{"_id": last_id, "change_index": {"$lte": change_index}}]}
+                )
+
+        items_pipeline: list[dict[str, Any]] = [{"$match": f} for f in seek]
+        items_pipeline += [
+            {"$sort": {field: int(direction), "_id": int(direction)}},
+            # Every matched document flattens to at least one row, bar the one
+            # a cursor continues from
+            {"$limit": skip + limit + 1},
+            *FLATTEN_CHANGES,
+            *({"$match": f} for f in row_filters),
+        ]
+        if skip:
+            items_pipeline.append({"$skip": skip})
+        items_pipeline.append({"$limit": limit})
+        return items_pipeline
+
+    def build_filters(
+        self,
+        book_id: str | None = None,
+        change_type: str | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> list[Any]:
+        """Filters on documents, before they are flattened."""
+        filters: list[Any] = []
 
         if book_id:
-            query = query.find(ChangeLog.book_id == book_id)
+            filters.append(ChangeLog.book_id == book_id)
+
+        if start_date is not None:
+            filters.append(ChangeLog.timestamp >= start_date)
+
+        if end_date is not None:
+            filters.append(ChangeLog.timestamp <= end_date)
 
         if change_type:
-            query = query.find(ChangeLog.change_type == change_type)
+            # Compact documents are found through the multikey index
+            filters.append(
+                {
+                    "$or": [
+                        {"change_type": change_type},
+                        {"changes.change_type": change_type},
+                    ]
+                }
+            )
+
+        return filters
+
+    @staticmethod
+    def build_row_filters(change_type: str | None = None) -> list[dict[str, Any]]:
+        """Filters on flattened rows, dropping the other changes of a match."""
+        if change_type:
+            return [{"change_type": change_type}]
+        return []
+
+    async def stream_range(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        end_inclusive: bool = True,
+        batch_size: int = settings.REPORT_BATCH_SIZE,
+        fields: tuple[str, ...] = CHANGE_LOG_REPORT_FIELDS,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Yield `fields` of every change in the range, flattened, newest first.
+
+        Documents are read straight from the driver cursor without model
+        validation, so only one batch is ever held in memory.
+        """
+        field, direction = CHANGE_LOG_SORT_FIELD
+        async for document in stream_aggregate(
+            ChangeLog,
+            self._range_filters(start_date, end_date, end_inclusive),
+            [
+                {"$sort": {field: int(direction), "_id": int(direction)}},
+                {"$project": dict.fromkeys((*fields, "changes"), 1)},
+                *FLATTEN_CHANGES,
+            ],
+            batch_size=batch_size,
+        ):
+            yield document
+
+    async def stream_created(
+        self,
+        since: datetime | None,
+        until: datetime,
+        batch_size: int = settings.EXPORT_CHUNK_SIZE,
+        since_inclusive: bool = False,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Yield flattened change logs written in (since, until], oldest first."""
+        filters: list[Any] = [ChangeLog.timestamp <= until]
+        if since is not None:
+            filters.append(
+                ChangeLog.timestamp >= since
+                if since_inclusive
+                else ChangeLog.timestamp > since
+            )
+
+        async for document in stream_aggregate(
+            ChangeLog,
+            filters,
+            [{"$sort": {"timestamp": 1, "_id": 1}}, *FLATTEN_CHANGES],
+            batch_size=batch_size,
+        ):
+            yield document
+
+    async def summarise_range(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        end_inclusive: bool = True,
+        top_books: int = 10,
+    ) -> dict[str, Any]:
+        """
+        Summarise the changes in the range, aggregated entirely inside Mongo.
+
+        Returns counts per change type, per day and per category (joined from
+        books), statistics on price_incl_tax deltas and the books that changed
+        most often.
+        """
+        results = await (
+            ChangeLog.find(*self._range_filters(start_date, end_date, end_inclusive))
+            .aggregate(
+                [
+                    *FLATTEN_CHANGES,
+                    {
+                        "$project": {
+                            "book_id": 1,
+                            "book_name": 1,
+                            "change_type": 1,
+                            "timestamp": 1,
+                            # Only the tax inclusive price, excl. tax would
+                            # double count every price change
+                            "price_delta": {
+                                "$cond": [
+                                    {"$eq": ["$field_changed", "price_incl_tax"]},
+                                    {
+                                        "$subtract": [
+                                            _parse_price("$new_value"),
+                                            _parse_price("$old_value"),
+                                        ]
+                                    },
+                                    None,
+                                ]
+                            },
+                        }
+                    },
+                    {
+                        "$facet": {
+                            "by_change_type": [
+                                {
+                                    "$group": {
+                                        "_id": "$change_type",
+                                        "count": {"$sum": 1},
+                                    }
+                                }
+                            ],
+                            "by_day": [
+                                {
+                                    "$group": {
+                                        "_id": {
+                                            "$dateToString": {
+                                                "format": "%Y-%m-%d",
+                                                "date": "$timestamp",
+                                            }
+                                        },
+                                        "count": {"$sum": 1},
+                                    }
+                                },
+                                {"$sort": {"_id": 1}},
+                            ],
+                            # Collapse to one row per book before joining, so
+                            # the lookup runs per book rather than per change
+                            "by_category": [
+                                {
+                                    "$group": {
+                                        "_id": {
+                                            "book_id": "$book_id",
+                                            "change_type": "$change_type",
+                                        },
+                                        "count": {"$sum": 1},
+                                        "price_delta_sum": {"$sum": "$price_delta"},
+                                        "price_delta_count": _count_if_set(
+                                            "$price_delta"
+                                        ),
+                                    }
+                                },
+                                *_join_category("$_id.book_id"),
+                                {
+                                    "$group": {
+                                        "_id": {
+                                            "category": "$category",
+                                            "change_type": "$_id.change_type",
+                                        },
+                                        "count": {"$sum": "$count"},
+                                        "price_delta_sum": {"$sum": "$price_delta_sum"},
+                                        "price_delta_count": {
+                                            "$sum": "$price_delta_count"
+                                        },
+                                    }
+                                },
+                            ],
+                            "price_deltas": [
+                                {"$match": {"price_delta": {"$ne": None}}},
+                                {
+                                    "$group": {
+                                        "_id": None,
+                                        "count": {"$sum": 1},
+                                        "average": {"$avg": "$price_delta"},
+                                        "average_absolute": {
+                                            "$avg": {"$abs": "$price_delta"}
+                                        },
+                                        "std_dev": {"$stdDevPop": "$price_delta"},
+                                        "min": {"$min": "$price_delta"},
+                                        "max": {"$max": "$price_delta"},
+                                        "increases": _count_if_positive("$price_delta"),
+                                        "decreases": _count_if_positive(
+                                            {"$multiply": ["$price_delta", -1]}
+                                        ),
+                                    }
+                                },
+                                {
+                                    "$project": {
+                                        "_id": 0,
+                                        "count": 1,
+                                        "increases": 1,
+                                        "decreases": 1,
+                                        **{
+                                            stat: {"$round": [f"${stat}", 2]}
+                                            for stat in (
+                                                "average",
+                                                "average_absolute",
+                                                "std_dev",
+                                                "min",
+                                                "max",
+                                            )
+                                        },
+                                    }
+                                },
+                            ],
+                            "most_volatile_books": [
+                                {
+                                    "$group": {
+                                        "_id": "$book_id",
+                                        "book_name": {"$first": "$book_name"},
+                                        "changes": {"$sum": 1},
+                                        "price_changes": _count_if_set("$price_delta"),
+                                    }
+                                },
+                                {"$sort": {"changes": -1, "_id": 1}},
+                                {"$limit": top_books},
+                                *_join_category("$_id"),
+                                {"$sort": {"changes": -1, "_id": 1}},
+                            ],
+                        }
+                    },
+                ]
+            )
+            .to_list()
+        )
+        facets = results[0]
+
+        by_category: dict[str, dict[str, Any]] = {}
+        for row in facets["by_category"]:
+            category = by_category.setdefault(
+                row["_id"]["category"],
+                {"total": 0, "by_change_type": {}, "average_price_delta": None},
+            )
+            category["total"] += row["count"]
+            category["by_change_type"][row["_id"]["change_type"]] = row["count"]
+            if row["price_delta_count"]:
+                category["average_price_delta"] = round(
+                    row["price_delta_sum"] / row["price_delta_count"], 2
+                )
+
+        by_change_type = {row["_id"]: row["count"] for row in facets["by_change_type"]}
+        return {
+            "total_changes": sum(by_change_type.values()),
+            "by_change_type": by_change_type,
+            "by_day": {row["_id"]: row["count"] for row in facets["by_day"]},
+            "by_category": by_category,
+            "price_deltas": facets["price_deltas"][0]
+            if facets["price_deltas"]
+            else {"count": 0},
+            "most_volatile_books": [
+                {
+                    "book_id": row["_id"],
+                    "book_name": row["book_name"],
+                    "category": row["category"],
+                    "changes": row["changes"],
+                    "price_changes": row["price_changes"],
+                }
+                for row in facets["most_volatile_books"]
+            ],
+        }
+
+    async def oldest_timestamp(self) -> datetime | None:
+        change = await ChangeLog.find().sort("timestamp").first_or_none()
+        return change.timestamp if change else None
+
+    async def delete_range(self, start_date: datetime, end_date: datetime) -> int:
+        """Delete the change logs in [start_date, end_date)."""
+        result = await ChangeLog.find(
+            *self._range_filters(start_date, end_date, end_inclusive=False)
+        ).delete()
+        return result.deleted_count if result else 0
+
+    async def book_categories(self, book_ids: list[str]) -> dict[str, str]:
+        """Categories of the books changes refer to, by book_id."""
+        object_ids = [
+            PydanticObjectId(book_id)
+            for book_id in book_ids
+            if PydanticObjectId.is_valid(book_id)
+        ]
+        books = await Book.find(
+            In(Book.id, object_ids), projection_model=BookCategory
+        ).to_list()
+        return {str(book.id): book.category for book in books}
 
-        total = await query.count()
+    @staticmethod
+    def _range_filters(
+        start_date: datetime, end_date: datetime, end_inclusive: bool
+    ) -> list[Any]:
+        if end_inclusive:
+            return [ChangeLog.timestamp >= start_date, ChangeLog.timestamp <= end_date]
+        return [ChangeLog.timestamp >= start_date, ChangeLog.timestamp < end_date]
 
-        query = query.sort("-timestamp")
 
-        changes = await query.skip(skip).limit(limit).to_list()
+class ChangeLogSegmentRepository:
+    async def save(self, segment: ChangeLogSegment) -> ChangeLogSegment:
+        # Archiving a day again replaces its segment
+        existing = await self.find_by_start(segment.start_date)
+        if existing:
+            segment.id = existing.id
+        await segment.save()
+        return segment
 
-        return changes, total
+    async def find_by_start(self, start_date: datetime) -> ChangeLogSegment | None:
+        return await ChangeLogSegment.find_one(
+            ChangeLogSegment.start_date == start_date
+        )
+
+    async def find_overlapping(
+        self, start_date: datetime, end_date: datetime
+    ) -> list[ChangeLogSegment]:
+        """Segments overlapping [start_date, end_date], newest first."""
+        return (
+            await ChangeLogSegment.find(
+                ChangeLogSegment.start_date <= end_date,
+                ChangeLogSegment.end_date > start_date,
+            )
+            .sort("-start_date")
+            .to_list()
+        )
+
+    async def latest(self) -> ChangeLogSegment | None:
+        return await ChangeLogSegment.find().sort("-end_date").first_or_none()
+
+
+class PriceObservationRepository:
+    async def record(self, observation: PriceObservation) -> PriceObservation:
+        await observation.insert()
+        return observation
+
+    async def record_many(self, observations: list[PriceObservation]) -> None:
+        await PriceObservation.insert_many(observations)
+
+    async def history(
+        self,
+        book_id: str,
+        start_date: datetime,
+        end_date: datetime,
+        interval: HistoryInterval = "day",
+    ) -> list[dict[str, Any]]:
+        """
+        A book's prices in [start_date, end_date], oldest first.
+
+        Observations are downsampled in Mongo into one point per interval,
+        holding the min, max and last price and the last availability. With
+        "raw" every observation is its own point.
+        """
+        if interval == "raw":
+            point: dict[str, Any] = {
+                "_id": "$timestamp",
+                "min_price": "$price_incl_tax",
+                "max_price": "$price_incl_tax",
+                "last_price": "$price_incl_tax",
+                "in_stock": "$in_stock",
+                "observations": {"$literal": 1},
+            }
+            stages: list[dict[str, Any]] = [{"$project": point}]
+        else:
+            stages = [
+                {
+                    "$group": {
+                        "_id": {
+                            "$dateTrunc": {
+                                "date": "$timestamp",
+                                "unit": interval,
+                                "startOfWeek": "monday",
+                            }
+                        },
+                        "min_price": {"$min": "$price_incl_tax"},
+                        "max_price": {"$max": "$price_incl_tax"},
+                        "last_price": {"$last": "$price_incl_tax"},
+                        "in_stock": {"$last": "$in_stock"},
+                        "observations": {"$sum": 1},
+                    }
+                },
+                {"$sort": {"_id": 1}},
+            ]
+
+        return (
+            await PriceObservation.find(
+                PriceObservation.book_id == book_id,
+                PriceObservation.timestamp >= start_date,
+                PriceObservation.timestamp <= end_date,
+            )
+            .aggregate([{"$sort": {"timestamp": 1}}, *stages])
+            .to_list()
+        )
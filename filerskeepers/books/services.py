@@ -1,20 +1,44 @@
-import csv
-import json
 from datetime import UTC, datetime, timedelta
-from io import StringIO
-from typing import Literal
+from typing import Any, Literal
 
+from beanie import PydanticObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, status
 from loguru import logger
 
+from filerskeepers.application.settings import settings
+from filerskeepers.books.archive import ChangeLogArchive
+from filerskeepers.books.cache import BookCache
 from filerskeepers.books.dtos import (
     BookListResponse,
     BookResponse,
     ChangeLogListResponse,
     ChangeLogResponse,
+    PageCursor,
+    PriceHistoryResponse,
+    PricePoint,
 )
-from filerskeepers.books.models import Book, ChangeLog
-from filerskeepers.books.repositories import BookRepository, ChangeLogRepository
-from filerskeepers.crawler.dtos import CrawledBookDto
+from filerskeepers.books.feed import ChangeFeed
+from filerskeepers.books.models import (
+    Book,
+    ChangeLog,
+    ChangeLogEntry,
+    FieldChange,
+    PriceObservation,
+)
+from filerskeepers.books.repositories import (
+    BOOK_SORT_FIELDS,
+    CHANGE_LOG_SORT_FIELD,
+    BookRepository,
+    ChangeLogRepository,
+    HistoryInterval,
+    PriceObservationRepository,
+)
+from filerskeepers.crawler.dtos import CrawledBookDto, UnchangedBook
+from filerskeepers.reports.models import as_utc
+
+
+ChangeLogFormat = Literal["per_field", "compact"]
 
 
 class BookService:
@@ -22,9 +46,19 @@ class BookService:
         self,
         book_repo: BookRepository,
         change_log_repo: ChangeLogRepository,
+        price_history_repo: PriceObservationRepository,
+        cache: BookCache | None = None,
+        change_log_format: ChangeLogFormat = settings.CHANGE_LOG_FORMAT,
+        archive: ChangeLogArchive | None = None,
+        feed: ChangeFeed | None = None,
     ) -> None:
         self.book_repo = book_repo
         self.change_log_repo = change_log_repo
+        self.price_history_repo = price_history_repo
+        self.cache = cache
+        self.change_log_format = change_log_format
+        self.archive = archive
+        self.feed = feed
 
     async def process_crawled_book(
         self, book_dto: CrawledBookDto
@@ -35,24 +69,11 @@ class BookService:
 
             if existing_book:
                 # Book exists - check for changes
-                if existing_book.content_hash != book_dto.content_hash:
-                    # Content has changed
-                    await self._detect_and_log_changes(
-                        existing_book, book_dto, book_dto.crawl_id
-                    )
-
-                    # Update the book
-                    book_dict = book_dto.model_dump(exclude={"crawl_id"})
-                    for key, value in book_dict.items():
-                        if key not in ["html_snapshot"]:  # Keep old snapshot
-                            setattr(existing_book, key, value)
-
-                    await self.book_repo.update(existing_book)
-                    logger.info(f"Updated book: {book_dto.name}")
-                    return {"status": "updated", "book_id": str(existing_book.id)}
-                else:
-                    # No changes
-                    return {"status": "unchanged", "book_id": str(existing_book.id)}
+                status = await self._update_book(existing_book, book_dto)
+                await self._record_observation(str(existing_book.id), book_dto)
+                if status == "updated":
+                    await self._invalidate_cache()
+                return {"status": status, "book_id": str(existing_book.id)}
 
             else:
                 # New book - create it
@@ -60,13 +81,16 @@ class BookService:
                 await self.book_repo.create(book)
 
                 # Log as new book
-                await self.change_log_repo.create(
+                change_log = await self.change_log_repo.create(
                     book_id=str(book.id),
                     book_name=book.name,
                     change_type="new_book",
                     new_value=book.name,
                     crawl_id=book_dto.crawl_id,
                 )
+                await self._publish([change_log])
+                await self._record_observation(str(book.id), book_dto)
+                await self._invalidate_cache()
                 logger.info(f"Created new book: {book_dto.name}")
                 return {"status": "created", "book_id": str(book.id)}
 
@@ -74,22 +98,185 @@ class BookService:
             logger.error(f"Error processing book {book_dto.name}: {e}")
             return {"status": "error", "error": str(e)}
 
+    async def process_crawled_books(
+        self, book_dtos: list[CrawledBookDto]
+    ) -> dict[str, int]:
+        """
+        Process a batch of crawled books as process_crawled_book does, with
+        one query for the existing books, bulk inserts for the new books, their
+        change logs and the price observations, and one cache invalidation.
+
+        Returns how many books were created, updated, unchanged or failed.
+        """
+        counts = {"created": 0, "updated": 0, "unchanged": 0, "error": 0}
+        # The last copy of a book crawled twice in the batch wins
+        latest = {book_dto.source_url: book_dto for book_dto in book_dtos}
+        existing_books = await self.book_repo.find_by_urls(list(latest))
+
+        observations: list[PriceObservation] = []
+        new_books: list[tuple[Book, CrawledBookDto]] = []
+        for url, book_dto in latest.items():
+            existing_book = existing_books.get(url)
+            if existing_book is None:
+                book = Book(**book_dto.model_dump(exclude={"crawl_id"}))
+                new_books.append((book, book_dto))
+                continue
+            try:
+                status = await self._update_book(existing_book, book_dto)
+                observations.append(
+                    self._observation(
+                        str(existing_book.id), book_dto, book_dto.crawl_id
+                    )
+                )
+                counts[status] += 1
+            except Exception as e:
+                logger.error(f"Error processing book {book_dto.name}: {e}")
+                counts["error"] += 1
+
+        if new_books:
+            try:
+                inserted = await self.book_repo.bulk_create(
+                    [book for book, _ in new_books]
+                )
+                inserted_ids = {book.id for book in inserted}
+            except Exception as e:
+                logger.error(f"Failed to insert {len(new_books)} new books: {e}")
+                inserted_ids = await self._find_inserted(new_books)
+            created = [
+                (book, dto) for book, dto in new_books if book.id in inserted_ids
+            ]
+            if created:
+                change_logs = await self.change_log_repo.bulk_create(
+                    [
+                        ChangeLog(
+                            book_id=str(book.id),
+                            book_name=book.name,
+                            change_type="new_book",
+                            new_value=book.name,
+                            crawl_id=book_dto.crawl_id,
+                        )
+                        for book, book_dto in created
+                    ]
+                )
+                await self._publish(change_logs)
+                observations.extend(
+                    self._observation(str(book.id), book_dto, book_dto.crawl_id)
+                    for book, book_dto in created
+                )
+                counts["created"] += len(created)
+                logger.info(f"Created {len(created)} new books")
+
+            # The books that did not go in are created one by one
+            for book, book_dto in new_books:
+                if book.id not in inserted_ids:
+                    result = await self.process_crawled_book(book_dto)
+                    counts[str(result["status"])] += 1
+
+        if observations:
+            await self.price_history_repo.record_many(observations)
+        if counts["created"] or counts["updated"]:
+            await self._invalidate_cache()
+        return counts
+
+    async def _find_inserted(
+        self, new_books: list[tuple[Book, CrawledBookDto]]
+    ) -> set[PydanticObjectId | None]:
+        # A failure part way through may have inserted some of the books, they
+        # are found by the ids bulk_create assigned before inserting
+        try:
+            return await self.book_repo.find_existing_ids(
+                [book.id for book, _ in new_books]
+            )
+        except Exception as e:
+            logger.error(f"Failed to look up the inserted books: {e}")
+            return set()
+
+    async def _update_book(
+        self, existing_book: Book, book_dto: CrawledBookDto
+    ) -> Literal["updated", "unchanged"]:
+        if existing_book.content_hash == book_dto.content_hash:
+            return "unchanged"
+
+        # Content has changed
+        await self._detect_and_log_changes(existing_book, book_dto, book_dto.crawl_id)
+
+        # Update the book
+        book_dict = book_dto.model_dump(exclude={"crawl_id"})
+        for key, value in book_dict.items():
+            if key not in ["html_snapshot"]:  # Keep old snapshot
+                setattr(existing_book, key, value)
+
+        await self.book_repo.update(existing_book)
+        logger.info(f"Updated book: {book_dto.name}")
+        return "updated"
+
+    async def record_unchanged_books(self, books: list[UnchangedBook]) -> int:
+        """
+        Record the price observations of books a crawl skipped as unchanged.
+
+        Their catalog card or page is the same as when the book was last
+        stored, so the stored price and availability are what the crawl saw.
+        Returns how many were recorded, books never stored have none.
+        """
+        stored = await self.book_repo.find_by_urls([book.url for book in books])
+        observations = [
+            self._observation(str(stored_book.id), stored_book, book.crawl_id)
+            for book in books
+            if (stored_book := stored.get(book.url))
+        ]
+        if observations:
+            await self.price_history_repo.record_many(observations)
+        return len(observations)
+
+    async def _record_observation(self, book_id: str, book_dto: CrawledBookDto) -> None:
+        await self.price_history_repo.record(
+            self._observation(book_id, book_dto, book_dto.crawl_id)
+        )
+
+    def _observation(
+        self, book_id: str, book: Book | CrawledBookDto, crawl_id: str | None
+    ) -> PriceObservation:
+        # Every crawl is recorded, unchanged and skipped books included, so
+        # gaps in the history mean the book was not crawled
+        return PriceObservation(
+            book_id=book_id,
+            price_incl_tax=book.price_incl_tax,
+            price_excl_tax=book.price_excl_tax,
+            availability=book.availability,
+            in_stock=book.availability.lower().startswith("in stock"),
+            crawl_id=crawl_id,
+        )
+
+    async def _invalidate_cache(self) -> None:
+        if self.cache:
+            await self.cache.bump_generation()
+
+    async def _publish(self, change_logs: list[ChangeLog]) -> None:
+        if self.feed:
+            await self.feed.publish(
+                [
+                    ChangeLogResponse.from_object(entry)
+                    for change_log in change_logs
+                    for entry in change_log.entries()
+                ]
+            )
+
     async def _detect_and_log_changes(
         self, existing_book: Book, new_data: CrawledBookDto, crawl_id: str | None
     ) -> None:
         book_id = str(existing_book.id)
         book_name = existing_book.name
+        changes: list[FieldChange] = []
 
         # Check price changes
         if existing_book.price_incl_tax != new_data.price_incl_tax:
-            await self.change_log_repo.create(
-                book_id=book_id,
-                book_name=book_name,
-                change_type="price_change",
-                old_value=f"£{existing_book.price_incl_tax:.2f}",
-                new_value=f"£{new_data.price_incl_tax:.2f}",
-                field_changed="price_incl_tax",
-                crawl_id=crawl_id,
+            changes.append(
+                FieldChange(
+                    field="price_incl_tax",
+                    change_type="price_change",
+                    old_value=f"£{existing_book.price_incl_tax:.2f}",
+                    new_value=f"£{new_data.price_incl_tax:.2f}",
+                )
             )
             logger.info(
                 f"Price changed for {book_name}: "
@@ -98,26 +285,24 @@ class BookService:
             )
 
         if existing_book.price_excl_tax != new_data.price_excl_tax:
-            await self.change_log_repo.create(
-                book_id=book_id,
-                book_name=book_name,
-                change_type="price_change",
-                old_value=f"£{existing_book.price_excl_tax:.2f}",
-                new_value=f"£{new_data.price_excl_tax:.2f}",
-                field_changed="price_excl_tax",
-                crawl_id=crawl_id,
+            changes.append(
+                FieldChange(
+                    field="price_excl_tax",
+                    change_type="price_change",
+                    old_value=f"£{existing_book.price_excl_tax:.2f}",
+                    new_value=f"£{new_data.price_excl_tax:.2f}",
+                )
             )
 
         # Check availability changes
         if existing_book.availability != new_data.availability:
-            await self.change_log_repo.create(
-                book_id=book_id,
-                book_name=book_name,
-                change_type="availability_change",
-                old_value=existing_book.availability,
-                new_value=new_data.availability,
-                field_changed="availability",
-                crawl_id=crawl_id,
+            changes.append(
+                FieldChange(
+                    field="availability",
+                    change_type="availability_change",
+                    old_value=existing_book.availability,
+                    new_value=new_data.availability,
+                )
             )
             logger.info(
                 f"Availability changed for {book_name}: "
@@ -126,27 +311,52 @@ class BookService:
 
         # Check for other changes (rating, reviews, etc.)
         if existing_book.rating != new_data.rating:
-            await self.change_log_repo.create(
-                book_id=book_id,
-                book_name=book_name,
-                change_type="other",
-                old_value=str(existing_book.rating),
-                new_value=str(new_data.rating),
-                field_changed="rating",
-                crawl_id=crawl_id,
+            changes.append(
+                FieldChange(
+                    field="rating",
+                    change_type="other",
+                    old_value=str(existing_book.rating),
+                    new_value=str(new_data.rating),
+                )
             )
 
         if existing_book.num_reviews != new_data.num_reviews:
-            await self.change_log_repo.create(
-                book_id=book_id,
-                book_name=book_name,
-                change_type="other",
-                old_value=str(existing_book.num_reviews),
-                new_value=str(new_data.num_reviews),
-                field_changed="num_reviews",
-                crawl_id=crawl_id,
+            changes.append(
+                FieldChange(
+                    field="num_reviews",
+                    change_type="other",
+                    old_value=str(existing_book.num_reviews),
+                    new_value=str(new_data.num_reviews),
+                )
             )
 
+        if not changes:
+            return
+
+        if self.change_log_format == "compact":
+            change_logs = [
+                await self.change_log_repo.create_compact(
+                    book_id=book_id,
+                    book_name=book_name,
+                    changes=changes,
+                    crawl_id=crawl_id,
+                )
+            ]
+        else:
+            change_logs = [
+                await self.change_log_repo.create(
+                    book_id=book_id,
+                    book_name=book_name,
+                    change_type=change.change_type,
+                    old_value=change.old_value,
+                    new_value=change.new_value,
+                    field_changed=change.field,
+                    crawl_id=crawl_id,
+                )
+                for change in changes
+            ]
+        await self._publish(change_logs)
+
     async def get_book(self, book_id: str) -> BookResponse | None:
         book = await self.book_repo.find_by_id(book_id)
         if not book:
@@ -154,6 +364,44 @@ class BookService:
 
         return BookResponse.from_object(book)
 
+    async def get_price_history(
+        self,
+        book_id: str,
+        interval: HistoryInterval = "day",
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> PriceHistoryResponse | None:
+        book = await self.book_repo.find_by_id(book_id)
+        if not book:
+            return None
+
+        # Default to the last year
+        if end_date is None:
+            end_date = datetime.now(UTC)
+        if start_date is None:
+            start_date = end_date - timedelta(days=365)
+
+        points = await self.price_history_repo.history(
+            book_id, start_date, end_date, interval
+        )
+        return PriceHistoryResponse(
+            book_id=book_id,
+            interval=interval,
+            start_date=start_date,
+            end_date=end_date,
+            points=[
+                PricePoint(
+                    timestamp=point["_id"],
+                    min_price=point["min_price"],
+                    max_price=point["max_price"],
+                    last_price=point["last_price"],
+                    in_stock=point["in_stock"],
+                    observations=point["observations"],
+                )
+                for point in points
+            ],
+        )
+
     async def list_books(
         self,
         category: str | None = None,
@@ -163,161 +411,235 @@ class BookService:
         sort_by: Literal["rating", "price", "reviews"] | None = None,
         page: int = 1,
         page_size: int = 10,
+        cursor: str | None = None,
+        include_total: bool = True,
     ) -> BookListResponse:
-        skip = (page - 1) * page_size
+        field, _ = BOOK_SORT_FIELDS[sort_by]
+        after = self._decode_cursor(cursor, field)[:2] if cursor else None
+        skip = 0 if after else (page - 1) * page_size
+
+        filters: dict[str, Any] = {
+            "category": category,
+            "min_price": min_price,
+            "max_price": max_price,
+            "rating": rating,
+        }
+        generation, total = (
+            await self._get_cached_total("books_total", filters)
+            if include_total
+            else (0, None)
+        )
 
-        books, total = await self.book_repo.list_books(
-            category=category,
-            min_price=min_price,
-            max_price=max_price,
-            rating=rating,
+        # One extra row tells us whether there is a next page
+        books, counted = await self.book_repo.list_books(
+            **filters,
             sort_by=sort_by,
             skip=skip,
-            limit=page_size,
+            limit=page_size + 1,
+            after=after,
+            include_total=include_total and total is None,
         )
+        next_cursor = self._next_cursor(books, field, page_size)
+        books = books[:page_size]
 
-        total_pages = (total + page_size - 1) // page_size
+        if counted is not None:
+            total = counted
+            await self._set_cached_total("books_total", generation, filters, total)
 
         return BookListResponse(
             books=[BookResponse.from_object(book) for book in books],
             total=total,
             page=page,
             page_size=page_size,
-            total_pages=total_pages,
+            total_pages=self._total_pages(total, page_size),
+            next_cursor=next_cursor,
         )
 
+    async def list_books_payload(
+        self,
+        category: str | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        rating: int | None = None,
+        sort_by: Literal["rating", "price", "reviews"] | None = None,
+        page: int = 1,
+        page_size: int = 10,
+        cursor: str | None = None,
+        include_total: bool = True,
+    ) -> bytes:
+        """
+        Same as list_books, but returns the serialised JSON response.
+
+        Responses are served from the cache while the catalog generation is
+        unchanged, so repeated queries between crawls never reach Mongo.
+        """
+        params: dict[str, Any] = {
+            "category": category,
+            "min_price": min_price,
+            "max_price": max_price,
+            "rating": rating,
+            "sort_by": sort_by,
+            "page": page,
+            "page_size": page_size,
+            "cursor": cursor,
+            "include_total": include_total,
+        }
+
+        if not self.cache:
+            response = await self.list_books(**params)
+            return response.model_dump_json().encode()
+
+        generation, payload = await self.cache.get("list_books", params)
+        if payload is not None:
+            return payload
+
+        response = await self.list_books(**params)
+        payload = response.model_dump_json().encode()
+        await self.cache.set("list_books", generation, params, payload)
+        return payload
+
     async def list_changes(
         self,
         book_id: str | None = None,
         change_type: str | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
         page: int = 1,
         page_size: int = 10,
+        cursor: str | None = None,
+        include_total: bool = True,
     ) -> ChangeLogListResponse:
-        skip = (page - 1) * page_size
+        field, _ = CHANGE_LOG_SORT_FIELD
+        after = self._decode_cursor(cursor, field) if cursor else None
+        skip = 0 if after else (page - 1) * page_size
+
+        # Changes before the boundary have been archived, they are only read
+        # when the requested range reaches back to them. Mongo is never read
+        # below it, so a day being archived is not listed twice.
+        boundary = await self.archive.boundary() if self.archive else None
+        hot_start_date = start_date
+        reaches_archive = False
+        if boundary is not None:
+            reaches_archive = start_date is not None and as_utc(start_date) < boundary
+            if start_date is None or reaches_archive:
+                hot_start_date = boundary
+
+        # Change logs are only written alongside a catalog generation bump, so
+        # the generation versions their totals just as well
+        filters: dict[str, Any] = {
+            "book_id": book_id,
+            "change_type": change_type,
+            "start_date": start_date,
+            "end_date": end_date,
+        }
+        generation, total = (
+            await self._get_cached_total("changes_total", filters)
+            if include_total
+            else (0, None)
+        )
 
-        changes, total = await self.change_log_repo.list_changes(
+        # Newest first, so the hot tier always comes before the archive
+        changes, hot_total = await self.change_log_repo.list_changes(
             book_id=book_id,
             change_type=change_type,
+            start_date=hot_start_date,
+            end_date=end_date,
             skip=skip,
-            limit=page_size,
+            limit=page_size + 1,
+            after=after,
+            # How much of skip is left for the archive depends on the hot total
+            include_total=(include_total and total is None)
+            or (reaches_archive and skip > 0),
         )
 
-        total_pages = (total + page_size - 1) // page_size
+        archive_end_date = None
+        if self.archive and start_date and boundary and reaches_archive:
+            archive_end_date = min(as_utc(end_date), boundary) if end_date else boundary
+            if len(changes) <= page_size:
+                changes += await self.archive.list_changes(
+                    start_date,
+                    archive_end_date,
+                    book_id=book_id,
+                    change_type=change_type,
+                    skip=max(0, skip - (hot_total or 0)),
+                    limit=page_size + 1 - len(changes),
+                    after=after,
+                )
+
+        next_cursor = self._next_cursor(changes, field, page_size)
+        changes = changes[:page_size]
+
+        if include_total and total is None and hot_total is not None:
+            total = hot_total
+            if self.archive and start_date and archive_end_date:
+                total += await self.archive.count(
+                    start_date,
+                    archive_end_date,
+                    book_id=book_id,
+                    change_type=change_type,
+                )
+            await self._set_cached_total("changes_total", generation, filters, total)
 
         return ChangeLogListResponse(
             changes=[ChangeLogResponse.from_object(change) for change in changes],
             total=total,
             page=page,
             page_size=page_size,
-            total_pages=total_pages,
+            total_pages=self._total_pages(total, page_size),
+            next_cursor=next_cursor,
         )
 
-    async def generate_change_report(
-        self,
-        start_date: datetime | None = None,
-        end_date: datetime | None = None,
-        format_type: Literal["json", "csv"] = "json",
-    ) -> str:
-        """
-        Generate a change report for a specific date range.
-
-        Args:
-            start_date: Start of the date range (default: 24 hours ago)
-            end_date: End of the date range (default: now)
-            format_type: Output format - 'json' or 'csv'
+    async def _get_cached_total(
+        self, namespace: str, filters: dict[str, Any]
+    ) -> tuple[int, int | None]:
+        if not self.cache:
+            return 0, None
 
-        Returns:
-            String content of the report in the specified format
-        """
-        # Set default date range if not provided
-        if end_date is None:
-            end_date = datetime.now(UTC)
-        if start_date is None:
-            start_date = end_date - timedelta(days=1)
-
-        # Fetch all changes in the date range
-        changes = await self._get_changes_in_range(start_date, end_date)
-
-        logger.info(
-            f"Generating {format_type.upper()} report with {len(changes)} changes "
-            f"from {start_date} to {end_date}"
-        )
+        generation, payload = await self.cache.get(namespace, filters)
+        return generation, int(payload) if payload is not None else None
 
-        if format_type == "json":
-            return self._generate_json_report(changes, start_date, end_date)
-        else:
-            return self._generate_csv_report(changes)
-
-    async def _get_changes_in_range(
-        self, start_date: datetime, end_date: datetime
-    ) -> list[ChangeLog]:
-        """Fetch all changes within the specified date range."""
-        query = ChangeLog.find(
-            ChangeLog.timestamp >= start_date, ChangeLog.timestamp <= end_date
-        )
-        query = query.sort("-timestamp")
-        return await query.to_list()
-
-    def _generate_json_report(
-        self, changes: list[ChangeLog], start_date: datetime, end_date: datetime
-    ) -> str:
-        """Generate a JSON report from change logs."""
-        report_data = {
-            "report_metadata": {
-                "generated_at": datetime.now(UTC).isoformat(),
-                "start_date": start_date.isoformat(),
-                "end_date": end_date.isoformat(),
-                "total_changes": len(changes),
-            },
-            "changes": [
-                {
-                    "id": str(change.id),
-                    "book_id": change.book_id,
-                    "book_name": change.book_name,
-                    "change_type": change.change_type,
-                    "field_changed": change.field_changed,
-                    "old_value": change.old_value,
-                    "new_value": change.new_value,
-                    "timestamp": change.timestamp.isoformat(),
-                }
-                for change in changes
-            ],
-        }
+    async def _set_cached_total(
+        self, namespace: str, generation: int, filters: dict[str, Any], total: int
+    ) -> None:
+        if self.cache:
+            await self.cache.set(namespace, generation, filters, str(total).encode())
 
-        return json.dumps(report_data, indent=2)
-
-    def _generate_csv_report(self, changes: list[ChangeLog]) -> str:
-        """Generate a CSV report from change logs."""
-        output = StringIO()
-        writer = csv.writer(output)
-
-        # Write header
-        writer.writerow(
-            [
-                "ID",
-                "Book ID",
-                "Book Name",
-                "Change Type",
-                "Field Changed",
-                "Old Value",
-                "New Value",
-                "Timestamp",
-            ]
-        )
+    @staticmethod
+    def _total_pages(total: int | None, page_size: int) -> int | None:
+        if total is None:
+            return None
+        return (total + page_size - 1) // page_size
 
-        # Write data rows
-        for change in changes:
-            writer.writerow(
-                [
-                    str(change.id),
-                    change.book_id,
-                    change.book_name,
-                    change.change_type,
-                    change.field_changed or "",
-                    change.old_value or "",
-                    change.new_value or "",
-                    change.timestamp.isoformat(),
-                ]
+    @staticmethod
+    def _decode_cursor(
+        cursor: str, field: str
+    ) -> tuple[Any, PydanticObjectId, int | None]:
+        try:
+            page_cursor = PageCursor.decode(cursor)
+            if page_cursor.sort_by != field:
+                raise ValueError("Cursor was issued for a different sort order")
+            return (
+                page_cursor.value,
+                PydanticObjectId(page_cursor.id),
+                page_cursor.index,
             )
+        except (ValueError, InvalidId) as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e),
+            )
+
+    @staticmethod
+    def _next_cursor(
+        items: list[Book] | list[ChangeLogEntry], field: str, page_size: int
+    ) -> str | None:
+        if len(items) <= page_size:
+            return None
 
-        return output.getvalue()
+        last = items[page_size - 1]
+        return PageCursor(
+            sort_by=field,
+            value=getattr(last, field),
+            id=str(last.id),
+            index=getattr(last, "change_index", None),
+        ).encode()
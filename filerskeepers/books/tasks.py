@@ -23,3 +23,23 @@ async def process_crawled_book(
         except Exception as e:
             logger.error(f"Error in process_crawled_book task: {e}")
             return {"status": "error", "error": str(e)}
+
+
+async def archive_change_logs_task(ctx: WorkerContext) -> dict[str, Any]:
+    async with TaskContext(ctx) as task_ctx:
+        try:
+            segments = await task_ctx.change_log_archive.archive_expired()
+            if segments:
+                # Cached totals of the hot tier shrink with it
+                await task_ctx.book_cache.bump_generation()
+            logger.info(f"Archived {len(segments)} days of change logs")
+
+            return {
+                "status": "completed",
+                "days_archived": [
+                    segment.start_date.date().isoformat() for segment in segments
+                ],
+            }
+        except Exception as e:
+            logger.error(f"Error in archive_change_logs_task: {e}")
+            return {"status": "failed", "error": str(e)}
@@ -0,0 +1,171 @@
+import time
+
+import redis.asyncio as redis
+from loguru import logger
+
+from filerskeepers.application.settings import settings
+
+
+# Lets a request through unless the circuit is open. Once the open period has
+# passed the circuit goes half-open and one caller gets to send a probe, the
+# others are held back until it reports or its probe times out.
+# Returns whether the request may go and, when not, the milliseconds to wait
+_ALLOW = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'state', 'until')
+local until_ = tonumber(state[2]) or 0
+if state[1] == 'open' or state[1] == 'half_open' then
+    if now < until_ then
+        return {0, math.ceil((until_ - now) * 1000)}
+    end
+    redis.call('HSET', KEYS[1], 'state', 'half_open', 'until', now + tonumber(ARGV[1]))
+end
+return {1, 0}
+"""
+
+# Counts the outcome in per-bucket counters over the rolling window, then
+# opens the circuit when the failure rate is too high, or closes or reopens a
+# half-open circuit on the probe's outcome. Returns the state after the outcome,
+# 'opened' when it just opened
+_RECORD = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local failed = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local buckets = 6
+local bucket_seconds = window / buckets
+local bucket = math.floor(now / bucket_seconds)
+redis.call('HINCRBY', KEYS[2], bucket .. ':n', 1)
+redis.call('HINCRBY', KEYS[2], bucket .. ':f', failed)
+redis.call('PEXPIRE', KEYS[2], math.ceil(window * 2000))
+
+local requests, failures = 0, 0
+local counters = redis.call('HGETALL', KEYS[2])
+for i = 1, #counters, 2 do
+    local b, kind = string.match(counters[i], '^(%d+):(%a)$')
+    if tonumber(b) <= bucket - buckets then
+        redis.call('HDEL', KEYS[2], counters[i])
+    elseif kind == 'n' then
+        requests = requests + tonumber(counters[i + 1])
+    else
+        failures = failures + tonumber(counters[i + 1])
+    end
+end
+
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+local open = false
+if state == 'half_open' then
+    if failed == 1 then
+        open = true
+    else
+        redis.call('DEL', KEYS[1], KEYS[2])
+        return 'closed'
+    end
+elseif state == 'closed' then
+    open = requests >= tonumber(ARGV[3]) and failures / requests >= tonumber(ARGV[4])
+end
+if open then
+    redis.call('HSET', KEYS[1], 'state', 'open', 'until', now + tonumber(ARGV[5]))
+    redis.call('PEXPIRE', KEYS[1], math.ceil((tonumber(ARGV[5]) + window) * 1000))
+    return 'opened'
+end
+return state
+"""
+
+
+class CircuitOpenError(Exception):
+    """The circuit of a host is open, requests to it are not being sent."""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"Circuit open for {host}, retry in {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Per host circuit breaker, shared by every crawler process through Redis.
+
+    Closed, every request goes through and its outcome is counted over a
+    rolling `window` of seconds. A request fails when it errors (5xx, 429,
+    network, timeout) or takes longer than `slow_call` seconds. Once at least
+    `min_requests` were counted and `error_rate` of them failed, the circuit
+    opens and requests fail fast with CircuitOpenError for `open_seconds`.
+    Then it goes half-open: one probe request is let through, its success
+    closes the circuit and its failure opens it again.
+
+    When Redis is unavailable the breaker lets every request through.
+    """
+
+    KEY_PREFIX = "crawler:breaker"
+    REDIS_RETRY_INTERVAL = 30.0
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        window: float = settings.CRAWLER_BREAKER_WINDOW,
+        min_requests: int = settings.CRAWLER_BREAKER_MIN_REQUESTS,
+        error_rate: float = settings.CRAWLER_BREAKER_ERROR_RATE,
+        slow_call: float = settings.CRAWLER_BREAKER_SLOW_CALL,
+        open_seconds: float = settings.CRAWLER_BREAKER_OPEN_SECONDS,
+        probe_timeout: float = settings.CRAWLER_TIMEOUT,
+    ) -> None:
+        self.redis_client = redis_client
+        self.window = window
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.probe_timeout = probe_timeout
+        self._redis_retry_at = 0.0
+
+    async def allow(self, host: str) -> None:
+        """Raise CircuitOpenError unless a request to `host` may be sent."""
+        if time.monotonic() < self._redis_retry_at:
+            return
+        try:
+            allowed, wait_ms = await self.redis_client.eval(  # type: ignore[misc]
+                _ALLOW, 1, self._key(host), str(self.probe_timeout)
+            )
+        except redis.RedisError as e:
+            self._unavailable(e)
+            return
+        if not int(allowed):
+            raise CircuitOpenError(host, int(wait_ms) / 1000)
+
+    async def record(self, host: str, started: float, failed: bool) -> None:
+        """Count the outcome of a request to `host` started at `started`."""
+        if time.monotonic() < self._redis_retry_at:
+            return
+        failed = failed or time.monotonic() - started > self.slow_call
+        try:
+            state = await self.redis_client.eval(  # type: ignore[misc]
+                _RECORD,
+                2,
+                self._key(host),
+                f"{self._key(host)}:stats",
+                str(int(failed)),
+                str(self.window),
+                str(self.min_requests),
+                str(self.error_rate),
+                str(self.open_seconds),
+            )
+        except redis.RedisError as e:
+            self._unavailable(e)
+            return
+        if state in ("opened", b"opened"):
+            logger.warning(
+                f"Circuit opened for {host}, pausing it for {self.open_seconds:.0f}s"
+            )
+
+    def _unavailable(self, error: redis.RedisError) -> None:
+        logger.warning(
+            f"Circuit breaker unavailable, letting requests through for "
+            f"{self.REDIS_RETRY_INTERVAL:.0f}s: {error}"
+        )
+        # Do not pay for a failing round trip on every request
+        self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_INTERVAL
+
+    def _key(self, host: str) -> str:
+        return f"{self.KEY_PREFIX}:{host}"
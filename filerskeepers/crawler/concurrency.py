@@ -0,0 +1,92 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+
+from loguru import logger
+
+from filerskeepers.application.settings import settings
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header, in seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=UTC)
+    return max((retry_at - datetime.now(UTC)).total_seconds(), 0.0)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on the crawler's requests in flight.
+
+    Every healthy response, one within the latency target, grows the window
+    by 1/window, about one more request in flight per window of responses.
+    A 429, 5xx or timeout cuts it by `decrease_factor`, at most once per
+    round trip: only requests sent after the last cut can cut it again, so one
+    burst of failures counts as one signal. A Retry-After pauses every request
+    until it has passed.
+    """
+
+    def __init__(
+        self,
+        initial: int = settings.CRAWLER_INITIAL_CONCURRENCY,
+        minimum: int = settings.CRAWLER_MIN_CONCURRENCY,
+        maximum: int = settings.CRAWLER_MAX_CONCURRENCY,
+        latency_target: float = settings.CRAWLER_LATENCY_TARGET,
+        decrease_factor: float = 0.5,
+    ) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self.window = float(min(max(initial, minimum), maximum))
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+        self._last_decrease = 0.0
+        self._paused_until = 0.0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[float]:
+        """Hold one of the window's slots, yields when the request starts."""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.window))
+            self.in_flight += 1
+        try:
+            if (delay := self._paused_until - time.monotonic()) > 0:
+                await asyncio.sleep(delay)
+            yield time.monotonic()
+        finally:
+            async with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    async def record(self, started: float, congested: bool) -> None:
+        """Adjust the window to the outcome of a request started at `started`."""
+        now = time.monotonic()
+        async with self._condition:
+            if congested:
+                if started >= self._last_decrease:
+                    self.window = max(
+                        float(self.minimum), self.window * self.decrease_factor
+                    )
+                    self._last_decrease = now
+                    logger.info(f"Crawler concurrency cut to {self.window:.1f}")
+            elif now - started <= self.latency_target:
+                self.window = min(float(self.maximum), self.window + 1 / self.window)
+                self._condition.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every request for `seconds`, as asked by a Retry-After."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
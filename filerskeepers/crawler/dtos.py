@@ -1,5 +1,53 @@
 from pydantic import BaseModel, ConfigDict, Field
 
+from filerskeepers.crawler.models import CrawledPage
+
+
+class FetchResult(BaseModel):
+    """A fetched page, `unchanged` when it is the same as in the last crawl."""
+
+    url: str
+    body: bytes | None = None  # None when the server answered 304
+    unchanged: bool = False
+    etag: str | None = None
+    last_modified: str | None = None
+    body_hash: str | None = None
+
+
+class FetchedBook(BaseModel):
+    """A book page fetched and waiting to be parsed."""
+
+    url: str
+    crawl_id: str | None = None
+    card_fingerprint: str | None = None
+    result: FetchResult
+    previous: CrawledPage | None = None  # As of the last crawl, to update
+
+
+class UnchangedBook(BaseModel):
+    """A book skipped by a crawl, its card or page unchanged since the last."""
+
+    url: str
+    crawl_id: str | None = None
+
+
+class RetryItem(BaseModel):
+    """A book page to crawl, queued for a retry after a transient failure."""
+
+    url: str
+    crawl_id: str | None = None
+    page: int  # Catalog page the book was found on
+    attempt: int  # Attempts made so far
+    card_fingerprint: str | None = None
+
+
+class LeaseHolder(BaseModel):
+    """Who holds a lease, with the fencing token it was granted."""
+
+    token: int
+    owner: str
+    expires_in: float  # Seconds left unless it is renewed
+
 
 class CrawledBookDto(BaseModel):
     model_config = ConfigDict(frozen=True)  # Make it immutable
@@ -0,0 +1,152 @@
+import asyncio
+import time
+
+import redis.asyncio as redis
+from loguru import logger
+
+from filerskeepers.application.settings import settings
+from filerskeepers.crawler.dtos import LeaseHolder
+
+
+# Grants the lease unless someone holds it, with a fencing token one higher
+# than any granted before. Returns whether it was granted, and the holder
+_ACQUIRE = """
+local granted = 0
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    local token = redis.call('INCR', KEYS[2])
+    redis.call('HSET', KEYS[1], 'token', token, 'owner', ARGV[1])
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    granted = 1
+end
+local holder = redis.call('HMGET', KEYS[1], 'token', 'owner')
+return {granted, holder[1], holder[2]}
+"""
+
+# Extends the lease, or releases it when ARGV[2] is 0, as long as it is still
+# held with the token ARGV[1]
+_RENEW = """
+if redis.call('HGET', KEYS[1], 'token') ~= ARGV[1] then
+    return 0
+end
+if ARGV[2] == '0' then
+    redis.call('DEL', KEYS[1])
+else
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 1
+"""
+
+
+class LeaseLostError(Exception):
+    """The lease expired or was taken over, its work must stop."""
+
+    def __init__(self, name: str, token: int | None):
+        super().__init__(f"Lease {name} with token {token} was lost")
+        self.name = name
+        self.token = token
+
+
+class Lease:
+    """
+    Only one holder at a time for some work, across every process.
+
+    A hash in Redis expiring after `ttl` seconds, renewed by a heartbeat every
+    third of it for as long as the holder runs. If the holder dies its lease
+    expires and the next acquire takes over. Every grant comes with a fencing
+    token higher than all the ones before, so a holder that stalled past its
+    lease and carries on can be told apart from the new one by the token it
+    writes with.
+    """
+
+    KEY_PREFIX = "crawler:lease"
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        name: str,
+        owner: str,
+        ttl: float = settings.CRAWLER_LEASE_TTL,
+    ) -> None:
+        self.redis_client = redis_client
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+        self.token: int | None = None
+        self.lost = False
+        self._renewed_at = 0.0
+        self._heartbeat: asyncio.Task[None] | None = None
+
+    async def acquire(self) -> bool:
+        """Take the lease and keep it renewed, False when someone else holds it."""
+        granted, token, _ = await self.redis_client.eval(  # type: ignore[misc]
+            _ACQUIRE, 2, self._key, f"{self._key}:token", self.owner, self._ttl_ms
+        )
+        if not int(granted):
+            return False
+
+        self.token = int(token)
+        self.lost = False
+        self._renewed_at = time.monotonic()
+        self._heartbeat = asyncio.create_task(self._keep_alive())
+        logger.info(f"Acquired lease {self.name} with token {self.token}")
+        return True
+
+    async def holder(self) -> LeaseHolder | None:
+        """Who holds the lease now, None when nobody does."""
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            await pipe.hmget(self._key, ["token", "owner"])  # type: ignore[misc]
+            await pipe.pttl(self._key)
+            (token, owner), ttl_ms = await pipe.execute()
+        if token is None:
+            return None
+        return LeaseHolder(
+            token=int(token),
+            owner=owner.decode() if isinstance(owner, bytes) else owner,
+            expires_in=max(int(ttl_ms), 0) / 1000,
+        )
+
+    def check(self) -> None:
+        """Raise LeaseLostError if the lease is no longer held."""
+        if self.lost or time.monotonic() - self._renewed_at > self.ttl:
+            self.lost = True
+            raise LeaseLostError(self.name, self.token)
+
+    async def release(self) -> None:
+        if self._heartbeat:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        if self.token is None or self.lost:
+            return
+        try:
+            await self.redis_client.eval(  # type: ignore[misc]
+                _RENEW, 1, self._key, str(self.token), "0"
+            )
+            logger.info(f"Released lease {self.name} with token {self.token}")
+        except redis.RedisError as e:
+            # It expires on its own
+            logger.warning(f"Failed to release lease {self.name}: {e}")
+
+    async def _keep_alive(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                renewed = await self.redis_client.eval(  # type: ignore[misc]
+                    _RENEW, 1, self._key, str(self.token), self._ttl_ms
+                )
+            except redis.RedisError as e:
+                # Tried again on the next beat, check() gives up once it expired
+                logger.warning(f"Failed to renew lease {self.name}: {e}")
+                continue
+            if not int(renewed):
+                logger.error(f"Lease {self.name} with token {self.token} was lost")
+                self.lost = True
+                return
+            self._renewed_at = time.monotonic()
+
+    @property
+    def _key(self) -> str:
+        return f"{self.KEY_PREFIX}:{self.name}"
+
+    @property
+    def _ttl_ms(self) -> str:
+        return str(int(self.ttl * 1000))
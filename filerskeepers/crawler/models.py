@@ -1,8 +1,9 @@
 from datetime import UTC, datetime
 from enum import StrEnum
 
-from beanie import Document
+from beanie import Document, Indexed
 from pydantic import Field
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 
 class CrawlStatus(StrEnum):
@@ -17,15 +18,56 @@ class CrawlMetadata(Document):
     timestamp: datetime = Field(default_factory=lambda: datetime.now(UTC))
     status: CrawlStatus = CrawlStatus.IN_PROGRESS
     books_crawled: int = 0
+    books_unchanged: int = 0  # Book pages skipped as unchanged since last crawl
     errors_count: int = 0
+    concurrency: float | None = None  # Crawler concurrency window, last seen
+    backpressure_pauses: int = 0  # Times the crawl waited for the processors
+    backpressure_seconds: float = 0.0  # Time spent waiting for them
     error_messages: list[str] = Field(default_factory=list)
     last_page_crawled: int = 0  # Last successfully crawled catalog page
     total_pages: int | None = None  # Total pages if known
     is_complete: bool = False  # Whether the crawl finished completely
+    lease_token: int | None = None  # Fencing token of the crawl writing it
 
     class Settings:
         name = "crawl_metadata"
         use_state_management = True
+        indexes = [
+            # get_latest
+            IndexModel([("timestamp", DESCENDING)]),
+            # get_latest_incomplete_today
+            IndexModel(
+                [
+                    ("is_complete", ASCENDING),
+                    ("status", ASCENDING),
+                    ("timestamp", DESCENDING),
+                ]
+            ),
+        ]
+
+
+class CrawledPage(Document):
+    """
+    Validators of a page as of its last successful crawl.
+
+    Catalog pages also keep the book links, the fingerprints of their book
+    cards and the next page flag parsed out of them, so an unchanged catalog
+    page never has to be downloaded or parsed. Book pages keep the
+    fingerprint of their card as of their last fetch.
+    """
+
+    url: Indexed(str, unique=True)  # type: ignore
+    etag: str | None = None
+    last_modified: str | None = None
+    body_hash: str
+    links: list[str] = Field(default_factory=list)
+    fingerprints: list[str] = Field(default_factory=list)  # One per link
+    has_next: bool = False
+    card_fingerprint: str | None = None
+    fetched_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+
+    class Settings:
+        name = "crawled_pages"
 
 
 class FailedParse(Document):
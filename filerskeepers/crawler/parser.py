@@ -15,9 +15,9 @@ class BookParser:
         "Five": 5,
     }
 
-    def parse_book_page(self, html: str, url: str) -> dict[str, Any] | None:
+    def parse_book_page(self, html: str | bytes, url: str) -> dict[str, Any] | None:
         try:
-            soup = BeautifulSoup(html, "html.parser")
+            soup = BeautifulSoup(html, "lxml")
 
             name = self._extract_name(soup)
             if not name:
@@ -35,7 +35,7 @@ class BookParser:
                 "image_url": self._extract_image_url(soup, url),
                 "rating": self._extract_rating(soup),
                 "source_url": url,
-                "html_snapshot": html,
+                "html_snapshot": self._decode(html, soup),
             }
 
             data["content_hash"] = self._generate_content_hash(data)
@@ -46,10 +46,19 @@ class BookParser:
             logger.error(f"Error parsing book page {url}: {e}")
             return None
 
-    def parse_catalog_page(self, html: str, base_url: str) -> list[str]:
+    def parse_catalog_page(self, html: str | bytes, base_url: str) -> list[str]:
+        return [card["url"] for card in self.parse_catalog_cards(html, base_url)]
+
+    def parse_catalog_cards(
+        self, html: str | bytes, base_url: str
+    ) -> list[dict[str, Any]]:
+        """
+        The book cards of a catalog page: the book's URL, the price,
+        availability and rating it shows, and a fingerprint of those.
+        """
         try:
-            soup = BeautifulSoup(html, "html.parser")
-            book_urls = []
+            soup = BeautifulSoup(html, "lxml")
+            cards = []
 
             articles = soup.find_all("article", class_="product_pod")
 
@@ -67,17 +76,31 @@ class BookParser:
                                 "./", ""
                             )
                             absolute_url = f"{base_url}/catalogue/{relative_url}"
-                            book_urls.append(absolute_url)
+                            cards.append(self._parse_card(article, absolute_url))
 
-            return book_urls
+            return cards
 
         except Exception as e:
             logger.error(f"Error parsing catalog page: {e}")
             return []
 
-    def has_next_page(self, html: str) -> str | None:
+    def _parse_card(self, article: Any, url: str) -> dict[str, Any]:
+        price = article.find("p", class_="price_color")
+        availability = article.find("p", class_="instock availability")
+        card = {
+            "url": url,
+            "price": price.text.strip() if price else "",
+            "availability": " ".join(availability.text.split()) if availability else "",
+            "rating": self._extract_rating(article),
+        }
+        card["fingerprint"] = hashlib.sha256(
+            f"{card['price']}|{card['availability']}|{card['rating']}".encode()
+        ).hexdigest()
+        return card
+
+    def has_next_page(self, html: str | bytes) -> str | None:
         try:
-            soup = BeautifulSoup(html, "html.parser")
+            soup = BeautifulSoup(html, "lxml")
             next_link = soup.find("li", class_="next")
 
             if next_link:
@@ -93,6 +116,12 @@ class BookParser:
             logger.error(f"Error checking for next page: {e}")
             return None
 
+    def _decode(self, html: str | bytes, soup: BeautifulSoup) -> str:
+        # Bytes are decoded once, with the encoding lxml detected
+        if isinstance(html, str):
+            return html
+        return html.decode(soup.original_encoding or "utf-8", errors="replace")
+
     def _extract_name(self, soup: BeautifulSoup) -> str:
         h1 = soup.find("h1")
         return h1.text.strip() if h1 else ""
@@ -0,0 +1,282 @@
+import asyncio
+import multiprocessing
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ProcessPoolExecutor
+
+from loguru import logger
+
+from filerskeepers.application.settings import settings
+from filerskeepers.books.services import BookService
+from filerskeepers.crawler.dtos import CrawledBookDto, FetchedBook, UnchangedBook
+from filerskeepers.crawler.services import CrawlerService
+
+
+# A book and its catalog page, between the fetch and parse stages, and between
+# the parse and persist stages (None when the page did not parse)
+FetchedItem = tuple[FetchedBook | UnchangedBook, int]
+ParsedItem = tuple[CrawledBookDto | UnchangedBook | None, int]
+
+
+def _first_error(error: BaseException) -> BaseException:
+    while isinstance(error, BaseExceptionGroup):
+        error = error.exceptions[0]
+    return error
+
+
+class StageStats:
+    """Throughput of one pipeline stage, and how long it waited on the others."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.items = 0
+        self.starved = 0.0  # Waiting for input from the stage before
+        self.blocked = 0.0  # Waiting for room in the queue to the stage after
+        self.started_at = time.monotonic()
+        self.finished_at: float | None = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def summary(self) -> str:
+        rate = self.items / self.elapsed if self.elapsed else 0.0
+        return (
+            f"{self.name:<8} {self.items:>6} items in {self.elapsed:7.1f}s "
+            f"({rate:7.1f}/s), starved {self.starved:6.1f}s, "
+            f"blocked {self.blocked:6.1f}s"
+        )
+
+
+class CrawlPipeline:
+    """
+    Crawl, parse and store the books as three stages joined by bounded queues.
+
+    - fetch: crawler_service.fetch_all_books, with its own adaptive
+      concurrency, puts the fetched book pages on the first queue
+    - parse: `parse_workers` processes parse the pages off the event loop and
+      put the books on the second queue
+    - persist: `persist_workers` store up to `batch_size` books at a time with
+      book_service.process_crawled_books
+
+    A full queue holds the stage before it back, so a slow database slows the
+    crawl down rather than piling pages up in memory. The stages stop in order
+    once the crawl is done, every book already fetched is stored, also when
+    the fetch fails. When the parse or persist stage fails, the other stages
+    are cancelled and run() raises its error.
+    """
+
+    def __init__(
+        self,
+        crawler_service: CrawlerService,
+        book_service: BookService,
+        parse_workers: int = settings.PIPELINE_PARSE_WORKERS,
+        persist_workers: int = settings.PIPELINE_PERSIST_WORKERS,
+        batch_size: int = settings.PIPELINE_BATCH_SIZE,
+        queue_size: int = settings.PIPELINE_QUEUE_SIZE,
+    ) -> None:
+        self.crawler_service = crawler_service
+        self.book_service = book_service
+        self.parse_workers = parse_workers
+        self.persist_workers = persist_workers
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+
+        self.stats = {name: StageStats(name) for name in ("fetch", "parse", "persist")}
+        self.counts: Counter[str] = Counter()
+        # Books of each catalog page still in the pipeline, for checkpoints
+        self._pending: Counter[int] = Counter()
+        self._fetching_page = 0
+        self._fetch_error: Exception | None = None
+
+    async def run(
+        self,
+        start_page: int = 1,
+        crawl_id: str | None = None,
+        checkpoint: Callable[[int], Awaitable[None]] | None = None,
+    ) -> dict[str, int]:
+        """
+        Crawl from `start_page`, returns how many books were created, updated,
+        unchanged or failed, and how many pages were skipped as not modified.
+
+        `checkpoint` is called with the last catalog page whose books are all
+        stored, every time it moves on.
+        """
+        fetched: asyncio.Queue[FetchedItem | None] = asyncio.Queue(self.queue_size)
+        parsed: asyncio.Queue[ParsedItem | None] = asyncio.Queue(self.queue_size)
+        self._checkpoint = checkpoint
+        self._last_checkpoint = start_page - 1
+        self._fetching_page = start_page
+
+        for stats in self.stats.values():
+            stats.started_at = time.monotonic()
+        self._fetch_error = None
+
+        # Spawned, forking would copy the Mongo client's threads
+        with ProcessPoolExecutor(
+            self.parse_workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            try:
+                # A stage that fails cancels the others, nothing is left
+                # waiting on a queue whose consumers are gone
+                async with asyncio.TaskGroup() as stages:
+                    stages.create_task(self._fetch_stage(start_page, crawl_id, fetched))
+                    stages.create_task(self._parse_stage(fetched, parsed, executor))
+                    stages.create_task(self._persist_stage(parsed))
+            except BaseExceptionGroup as errors:
+                raise _first_error(errors) from None
+            finally:
+                for stats in self.stats.values():
+                    logger.info(stats.summary())
+
+        if self._fetch_error:
+            raise self._fetch_error
+        # The last page was fetched in full
+        self._fetching_page += 1
+        await self._advance_checkpoint()
+        return dict(self.counts)
+
+    async def _fetch_stage(
+        self,
+        start_page: int,
+        crawl_id: str | None,
+        fetched: asyncio.Queue[FetchedItem | None],
+    ) -> None:
+        try:
+            await self._fetch(start_page, crawl_id, fetched)
+        except Exception as e:
+            # Raised once the books already fetched are stored
+            self._fetch_error = e
+        for _ in range(self.parse_workers):
+            await fetched.put(None)
+
+    async def _parse_stage(
+        self,
+        fetched: asyncio.Queue[FetchedItem | None],
+        parsed: asyncio.Queue[ParsedItem | None],
+        executor: ProcessPoolExecutor,
+    ) -> None:
+        async with asyncio.TaskGroup() as parsers:
+            for _ in range(self.parse_workers):
+                parsers.create_task(self._parse(fetched, parsed, executor))
+        self.stats["parse"].finished_at = time.monotonic()
+        for _ in range(self.persist_workers):
+            await parsed.put(None)
+
+    async def _persist_stage(
+        self,
+        parsed: asyncio.Queue[ParsedItem | None],
+    ) -> None:
+        async with asyncio.TaskGroup() as persisters:
+            for _ in range(self.persist_workers):
+                persisters.create_task(self._persist(parsed))
+        self.stats["persist"].finished_at = time.monotonic()
+
+    async def _fetch(
+        self,
+        start_page: int,
+        crawl_id: str | None,
+        fetched: asyncio.Queue[FetchedItem | None],
+    ) -> None:
+        stats = self.stats["fetch"]
+        try:
+            async for book, page in self.crawler_service.fetch_all_books(
+                start_page, crawl_id
+            ):
+                # Retries of earlier pages come back with their own page
+                self._fetching_page = max(self._fetching_page, page)
+                stats.items += 1
+                if isinstance(book, UnchangedBook):
+                    # Not modified since the last crawl, only its price
+                    # observation is stored
+                    self.counts["skipped"] += 1
+
+                self._pending[page] += 1
+                started = time.monotonic()
+                await fetched.put((book, page))
+                stats.blocked += time.monotonic() - started
+        finally:
+            stats.finished_at = time.monotonic()
+
+    async def _parse(
+        self,
+        fetched: asyncio.Queue[FetchedItem | None],
+        parsed: asyncio.Queue[ParsedItem | None],
+        executor: ProcessPoolExecutor,
+    ) -> None:
+        stats = self.stats["parse"]
+        while True:
+            started = time.monotonic()
+            item = await fetched.get()
+            stats.starved += time.monotonic() - started
+            if item is None:
+                return
+
+            book, page = item
+            book_dto = (
+                book
+                if isinstance(book, UnchangedBook)
+                else await self.crawler_service.parse_book(book, executor)
+            )
+            stats.items += 1
+            # Failures go through too, so the page's books are accounted for
+            started = time.monotonic()
+            await parsed.put((book_dto, page))
+            stats.blocked += time.monotonic() - started
+
+    async def _persist(
+        self,
+        parsed: asyncio.Queue[ParsedItem | None],
+    ) -> None:
+        stats = self.stats["persist"]
+        done = False
+        while not done:
+            started = time.monotonic()
+            item = await parsed.get()
+            stats.starved += time.monotonic() - started
+
+            # Whatever else is ready, up to a batch, and at most one sentinel
+            batch = []
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.batch_size or parsed.empty():
+                    break
+                item = parsed.get_nowait()
+            done = item is None
+
+            book_dtos = [book for book, _ in batch if isinstance(book, CrawledBookDto)]
+            unchanged = [book for book, _ in batch if isinstance(book, UnchangedBook)]
+            if book_dtos:
+                try:
+                    counts = await self.book_service.process_crawled_books(book_dtos)
+                    self.counts.update(counts)
+                except Exception as e:
+                    logger.error(f"Failed to store {len(book_dtos)} books: {e}")
+                    self.counts["error"] += len(book_dtos)
+            if unchanged:
+                try:
+                    await self.book_service.record_unchanged_books(unchanged)
+                except Exception as e:
+                    logger.error(
+                        f"Failed to record {len(unchanged)} unchanged books: {e}"
+                    )
+            # Pages that did not parse
+            self.counts["error"] += len(batch) - len(book_dtos) - len(unchanged)
+            stats.items += len(book_dtos) + len(unchanged)
+
+            for _, page in batch:
+                self._pending[page] -= 1
+            await self._advance_checkpoint()
+
+    async def _advance_checkpoint(self) -> None:
+        # Every page before the one being fetched is done once none of its
+        # books are left in the pipeline
+        done = self._fetching_page - 1
+        pending = [page for page, count in self._pending.items() if count > 0]
+        if pending:
+            done = min(done, min(pending) - 1)
+        if done > self._last_checkpoint:
+            self._last_checkpoint = done
+            if self._checkpoint:
+                await self._checkpoint(done)
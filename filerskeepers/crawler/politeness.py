@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+import redis.asyncio as redis
+from loguru import logger
+
+from filerskeepers.application.settings import settings
+
+
+# Refills the bucket for the time since it was last touched (on the Redis
+# clock, shared by every worker) and grants up to ARGV[3] whole tokens.
+# Returns the tokens granted and, when none were, the milliseconds until one is
+_TAKE_TOKENS = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local granted = math.min(requested, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+local wait_ms = 0
+if granted == 0 then
+    wait_ms = math.ceil((1 - tokens) / rate * 1000)
+end
+return {granted, wait_ms}
+"""
+
+
+class _LocalBucket:
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def take(self, requested: int) -> tuple[int, float]:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        granted = min(requested, int(self.tokens))
+        self.tokens -= granted
+        wait = 0.0 if granted else (1 - self.tokens) / self.rate
+        return granted, wait
+
+
+class HostTokenBucket:
+    """
+    Requests per second per host, shared by every crawler process.
+
+    Each host has one token bucket in Redis (`rate` tokens a second, at most
+    `burst` saved up). A process takes up to `batch_size` tokens per round
+    trip and spends them locally, so Redis sees one call per batch rather
+    than per request. When Redis is unavailable the process falls back to a
+    local bucket with the same rate, which only bounds its own requests.
+    """
+
+    KEY_PREFIX = "crawler:bucket"
+    REDIS_RETRY_INTERVAL = 30.0
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        rate: float = settings.CRAWLER_HOST_RATE,
+        burst: int = settings.CRAWLER_HOST_BURST,
+        batch_size: int = settings.CRAWLER_TOKEN_BATCH,
+    ) -> None:
+        self.redis_client = redis_client
+        self.rate = rate
+        self.burst = burst
+        self.batch_size = max(1, min(batch_size, burst))
+        self._tokens: dict[str, int] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._fallback: dict[str, _LocalBucket] = {}
+        self._redis_retry_at = 0.0
+
+    async def acquire(self, host: str) -> None:
+        """Wait for a token to send one request to `host`."""
+        async with self._locks.setdefault(host, asyncio.Lock()):
+            while not self._tokens.get(host):
+                granted, wait = await self._take(host)
+                if granted:
+                    self._tokens[host] = granted
+                else:
+                    await asyncio.sleep(wait)
+            self._tokens[host] -= 1
+
+    async def _take(self, host: str) -> tuple[int, float]:
+        if time.monotonic() < self._redis_retry_at:
+            return self._local_bucket(host).take(1)
+        try:
+            granted, wait_ms = await self.redis_client.eval(  # type: ignore[misc]
+                _TAKE_TOKENS,
+                1,
+                f"{self.KEY_PREFIX}:{host}",
+                str(self.rate),
+                str(self.burst),
+                str(self.batch_size),
+            )
+            return int(granted), int(wait_ms) / 1000
+        except redis.RedisError as e:
+            logger.warning(
+                f"Politeness budget unavailable, using a local one for "
+                f"{self.REDIS_RETRY_INTERVAL:.0f}s: {e}"
+            )
+            # Do not pay for a failing round trip on every request
+            self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_INTERVAL
+            return self._local_bucket(host).take(1)
+
+    def _local_bucket(self, host: str) -> _LocalBucket:
+        if host not in self._fallback:
+            self._fallback[host] = _LocalBucket(self.rate, self.burst)
+        return self._fallback[host]
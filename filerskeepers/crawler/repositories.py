@@ -1,6 +1,13 @@
 from datetime import UTC, datetime, timedelta
 
-from filerskeepers.crawler.models import CrawlMetadata, CrawlStatus, FailedParse
+from pymongo.results import UpdateResult
+
+from filerskeepers.crawler.models import (
+    CrawledPage,
+    CrawlMetadata,
+    CrawlStatus,
+    FailedParse,
+)
 
 
 class CrawlMetadataRepository:
@@ -12,6 +19,18 @@ class CrawlMetadataRepository:
         await metadata.save()
         return metadata
 
+    async def update_fenced(self, metadata: CrawlMetadata, lease_token: int) -> bool:
+        """
+        Save `metadata` as written by the crawl holding `lease_token`, False
+        when a crawl with a newer token has taken it over since.
+        """
+        metadata.lease_token = lease_token
+        result = await CrawlMetadata.find_one(
+            {"_id": metadata.id, "lease_token": {"$not": {"$gt": lease_token}}}
+        ).update({"$set": metadata.model_dump(exclude={"id", "revision_id"})})
+        assert isinstance(result, UpdateResult)
+        return result.matched_count == 1
+
     async def get_latest(self) -> CrawlMetadata | None:
         return await CrawlMetadata.find().sort("-timestamp").first_or_none()
 
@@ -34,3 +53,12 @@ class FailedParseRepository:
     async def create(self, failed_parse: FailedParse) -> FailedParse:
         await failed_parse.insert()
         return failed_parse
+
+
+class CrawledPageRepository:
+    async def find_by_url(self, url: str) -> CrawledPage | None:
+        return await CrawledPage.find_one(CrawledPage.url == url)
+
+    async def save(self, page: CrawledPage) -> CrawledPage:
+        await page.save()
+        return page
@@ -0,0 +1,84 @@
+import random
+import time
+
+import redis.asyncio as redis
+
+from filerskeepers.application.settings import settings
+from filerskeepers.crawler.dtos import RetryItem
+
+
+# Claims the due retries, so two processes draining one crawl never both
+# get the same URL
+_POP_DUE = """
+local items = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #items > 0 then
+    redis.call('ZREM', KEYS[1], unpack(items))
+end
+return items
+"""
+
+
+class TransientFetchError(Exception):
+    """A fetch failed in a way worth retrying later: 5xx, 429 or network."""
+
+    def __init__(self, url: str, reason: str, retry_after: float | None = None):
+        super().__init__(f"{reason} for {url}")
+        self.url = url
+        self.retry_after = retry_after
+
+
+class RetryQueue:
+    """
+    Failed fetches waiting for another attempt, per crawl.
+
+    A sorted set in Redis scored by the time each retry is due. Retries back
+    off exponentially with jitter, half the delay fixed and half random, so
+    the URLs of one failing batch do not all come back at the same moment.
+    """
+
+    KEY_PREFIX = "crawler:retries"
+    TTL = 86400
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        base_delay: float = settings.CRAWLER_RETRY_DELAY,
+        max_delay: float = settings.CRAWLER_RETRY_MAX_DELAY,
+    ) -> None:
+        self.redis_client = redis_client
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    async def schedule(
+        self, item: RetryItem, retry_after: float | None = None
+    ) -> float:
+        """Queue `item` for its next attempt, returns the delay in seconds."""
+        cap = min(self.max_delay, self.base_delay * 2 ** (item.attempt - 1))
+        delay = cap / 2 + random.uniform(0, cap / 2)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        key = self._key(item.crawl_id)
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            await pipe.zadd(key, {item.model_dump_json(): time.time() + delay})
+            await pipe.expire(key, self.TTL)
+            await pipe.execute()
+        return delay
+
+    async def pop_due(self, crawl_id: str | None, limit: int = 100) -> list[RetryItem]:
+        items = await self.redis_client.eval(  # type: ignore[misc]
+            _POP_DUE, 1, self._key(crawl_id), str(time.time()), str(limit)
+        )
+        return [RetryItem.model_validate_json(item) for item in items]
+
+    async def next_due(self, crawl_id: str | None) -> float | None:
+        """Seconds until the next retry of the crawl is due, None if none is left."""
+        first = await self.redis_client.zrange(
+            self._key(crawl_id), 0, 0, withscores=True
+        )
+        if not first:
+            return None
+        return max(first[0][1] - time.time(), 0.0)
+
+    def _key(self, crawl_id: str | None) -> str:
+        return f"{self.KEY_PREFIX}:{crawl_id or 'none'}"
@@ -1,14 +1,32 @@
 import asyncio
+import hashlib
 from collections.abc import AsyncGenerator
+from concurrent.futures import Executor
+from datetime import UTC, datetime, timedelta
 
 import httpx
+import redis.asyncio as redis
 from loguru import logger
 
 from filerskeepers.application.settings import settings
-from filerskeepers.crawler.dtos import CrawledBookDto
-from filerskeepers.crawler.models import FailedParse
+from filerskeepers.crawler.breaker import CircuitBreaker, CircuitOpenError
+from filerskeepers.crawler.concurrency import AdaptiveConcurrency, parse_retry_after
+from filerskeepers.crawler.dtos import (
+    CrawledBookDto,
+    FetchedBook,
+    FetchResult,
+    RetryItem,
+    UnchangedBook,
+)
+from filerskeepers.crawler.models import CrawledPage, FailedParse
 from filerskeepers.crawler.parser import BookParser
-from filerskeepers.crawler.repositories import FailedParseRepository
+from filerskeepers.crawler.politeness import HostTokenBucket
+from filerskeepers.crawler.repositories import (
+    CrawledPageRepository,
+    FailedParseRepository,
+)
+from filerskeepers.crawler.retries import RetryQueue, TransientFetchError
+from filerskeepers.reports.models import as_utc
 
 
 class CrawlerService:
@@ -16,17 +34,63 @@ class CrawlerService:
     CATALOG_URL = f"{BASE_URL}/catalogue/page-{{page}}.html"
 
     def __init__(
-        self, failed_parse_repo: FailedParseRepository = FailedParseRepository()
+        self,
+        failed_parse_repo: FailedParseRepository = FailedParseRepository(),
+        crawled_page_repo: CrawledPageRepository = CrawledPageRepository(),
+        conditional_requests: bool = settings.CRAWLER_CONDITIONAL_REQUESTS,
+        incremental: bool = settings.CRAWLER_INCREMENTAL,
+        refresh_days: int = settings.CRAWLER_REFRESH_DAYS,
+        concurrency: AdaptiveConcurrency | None = None,
+        politeness: HostTokenBucket | None = None,
+        retry_queue: RetryQueue | None = None,
+        breaker: CircuitBreaker | None = None,
     ) -> None:
         self.parser = BookParser()
         self.timeout = settings.CRAWLER_TIMEOUT
         self.max_retries = settings.CRAWLER_MAX_RETRIES
         self.retry_delay = settings.CRAWLER_RETRY_DELAY
+        self.max_body_size = settings.CRAWLER_MAX_BODY_SIZE
         self.failed_parse_repo = failed_parse_repo
+        self.crawled_page_repo = crawled_page_repo
+        self.conditional_requests = conditional_requests
+        self.incremental = incremental
+        self.refresh_days = refresh_days
+        # Shared by every request of this crawler, catalog pages included
+        self.concurrency = concurrency or AdaptiveConcurrency()
+        # Cluster-wide requests per second per host, on top of the window
+        self.politeness = politeness
+        # Book pages that fail transiently are retried from this queue, at the
+        # end of the crawl or as they come due, instead of inline
+        self.retry_queue = retry_queue
+        # Fails requests fast with CircuitOpenError while the site is down
+        self.breaker = breaker
 
     async def crawl_all_books(
         self, start_page: int = 1, crawl_id: str | None = None
-    ) -> AsyncGenerator[tuple[CrawledBookDto, int]]:
+    ) -> AsyncGenerator[tuple[CrawledBookDto | UnchangedBook, int]]:
+        """
+        Yield the books of every catalog page from `start_page` on, with their
+        page number.
+
+        A book is an UnchangedBook when its page did not change since the last
+        crawl, or was not fetched because its catalog card did not, only its
+        price observation is left to record. Raises CircuitOpenError when the
+        site's circuit opens, the book pages not fetched are left in the retry
+        queue for the crawl to pick up when resumed.
+        """
+        async for fetched, page in self.fetch_all_books(start_page, crawl_id):
+            if isinstance(fetched, UnchangedBook):
+                yield fetched, page
+            elif book_dto := await self.parse_book(fetched):
+                yield book_dto, page
+
+    async def fetch_all_books(
+        self, start_page: int = 1, crawl_id: str | None = None
+    ) -> AsyncGenerator[tuple[FetchedBook | UnchangedBook, int]]:
+        """
+        As crawl_all_books, but yield the book pages as fetched, for the caller
+        to parse with parse_book.
+        """
         logger.info(f"Starting crawl from page {start_page}")
         page = start_page
 
@@ -39,108 +103,452 @@ class CrawlerService:
                 )
                 logger.info(f"Crawling catalog page {page}: {catalog_url}")
 
-                html = await self._fetch_with_retry(catalog_url)
-                if not html:
+                previous = await self._previous_crawl(catalog_url)
+                # Pages remembered without their card fingerprints are
+                # fetched in full once
+                catalog = await self._fetch_page(
+                    catalog_url,
+                    previous
+                    if previous and len(previous.fingerprints) == len(previous.links)
+                    else None,
+                )
+                if not catalog:
                     logger.warning(f"Failed to fetch catalog page {page}")
                     break
 
-                # Extract book URLs from this page
-                book_urls = self.parser.parse_catalog_page(html, self.BASE_URL)
+                if catalog.unchanged and previous:
+                    # Same page as last time, reuse what was parsed out of it
+                    book_urls, fingerprints = previous.links, previous.fingerprints
+                    next_page = previous.has_next
+                else:
+                    html = catalog.body or b""
+                    cards = self.parser.parse_catalog_cards(html, self.BASE_URL)
+                    book_urls = [card["url"] for card in cards]
+                    fingerprints = [card["fingerprint"] for card in cards]
+                    next_page = self.parser.has_next_page(html) is not None
+                await self._remember(
+                    catalog,
+                    previous,
+                    links=book_urls,
+                    fingerprints=fingerprints,
+                    has_next=next_page,
+                )
                 logger.info(f"Found {len(book_urls)} books on page {page}")
 
-                # Crawl books from this page and yield them with page number
-                async for book_dto in self._crawl_books_batch(book_urls, crawl_id):
-                    yield book_dto, page
+                # Crawl books from this page and yield them with page number,
+                # then any retries that came due meanwhile
+                logger.info(
+                    f"Crawling {len(book_urls)} books, "
+                    f"concurrency {self.concurrency.window:.1f}"
+                )
+                card_fingerprints = dict(zip(book_urls, fingerprints))
+                items = [
+                    RetryItem(
+                        url=url,
+                        crawl_id=crawl_id,
+                        page=page,
+                        attempt=0,
+                        card_fingerprint=card_fingerprints.get(url),
+                    )
+                    for url in book_urls
+                ]
+                async for fetched, book_page in self._crawl_attempts(items):
+                    yield fetched, book_page
+                try:
+                    async for fetched, book_page in self._drain_retries(crawl_id):
+                        yield fetched, book_page
+                except redis.RedisError as e:
+                    # The retries stay queued, drained after the next page
+                    logger.warning(f"Failed to drain the retry queue: {e}")
 
                 # Check if there's a next page
-                next_page = self.parser.has_next_page(html)
                 if not next_page:
                     logger.info(f"No more pages after page {page}")
                     break
 
                 page += 1
+            except CircuitOpenError:
+                raise
             except Exception as e:
                 logger.error(f"Error crawling catalog page {page}: {e}")
                 break
 
+        # Wait for whatever is still queued for a retry
+        try:
+            async for fetched, book_page in self._drain_retries(crawl_id, wait=True):
+                yield fetched, book_page
+        except redis.RedisError as e:
+            logger.error(f"Failed to drain the retry queue: {e}")
+
         logger.info(f"Crawl completed at page {page}")
 
     async def crawl_book(
         self, url: str, crawl_id: str | None = None
     ) -> CrawledBookDto | None:
+        fetched, _ = await self._fetch_book_if_changed(url, crawl_id, conditional=False)
+        return await self.parse_book(fetched) if fetched else None
+
+    async def parse_book(
+        self, fetched: FetchedBook, executor: Executor | None = None
+    ) -> CrawledBookDto | None:
+        """Parse a fetched book page, in `executor` when given."""
+        url = fetched.url
         try:
-            html = await self._fetch_with_retry(url)
-            if not html:
-                logger.warning(f"Failed to fetch book page: {url}")
-                # Store failed fetch attempt
+            html = fetched.result.body or b""
+            if executor:
+                book_data = await asyncio.get_running_loop().run_in_executor(
+                    executor, self.parser.parse_book_page, html, url
+                )
+            else:
+                book_data = self.parser.parse_book_page(html, url)
+            if not book_data:
+                logger.warning(f"Failed to parse book page: {url}")
+                # Store failed parse attempt with HTML
                 failed_parse = FailedParse(
-                    crawl_id=crawl_id,
+                    crawl_id=fetched.crawl_id,
                     url=url,
-                    html=None,
-                    failure_reason="Failed to fetch HTML from server",
+                    html=html.decode(errors="replace"),
+                    failure_reason="Failed to parse book data from HTML",
                 )
                 await self.failed_parse_repo.create(failed_parse)
                 return None
 
-            book_data = self.parser.parse_book_page(html, url)
-            if not book_data:
-                logger.warning(f"Failed to parse book page: {url}")
-                # Store failed parse attempt with HTML
+            # Only pages that parsed are remembered, a failure is retried in
+            # full by the next crawl
+            await self._remember(
+                fetched.result,
+                fetched.previous,
+                card_fingerprint=fetched.card_fingerprint,
+            )
+            return CrawledBookDto(**book_data, crawl_id=fetched.crawl_id)
+        except Exception as e:
+            logger.error(f"Error parsing book {url}: {e}")
+            return None
+
+    async def _fetch_book_if_changed(
+        self,
+        url: str,
+        crawl_id: str | None = None,
+        conditional: bool = True,
+        card_fingerprint: str | None = None,
+        attempt: int | None = None,
+    ) -> tuple[FetchedBook | None, bool]:
+        """
+        The fetched book page, None on failure, and whether it was unchanged.
+
+        With `attempt`, the attempts made so far, the page is fetched once and
+        a transient failure raises TransientFetchError while attempts are left.
+        """
+        try:
+            previous = await self._previous_crawl(url) if conditional else None
+            if self._card_unchanged(url, previous, card_fingerprint):
+                return None, True
+
+            result = await self._fetch_page(url, previous, attempt)
+            if not result:
+                logger.warning(f"Failed to fetch book page: {url}")
+                # Store failed fetch attempt
                 failed_parse = FailedParse(
                     crawl_id=crawl_id,
                     url=url,
-                    html=html,
-                    failure_reason="Failed to parse book data from HTML",
+                    html=None,
+                    failure_reason="Failed to fetch HTML from server",
                 )
                 await self.failed_parse_repo.create(failed_parse)
-                return None
+                return None, False
+
+            if result.unchanged:
+                await self._remember(
+                    result, previous, card_fingerprint=card_fingerprint
+                )
+                return None, True
 
-            return CrawledBookDto(**book_data, crawl_id=crawl_id)
+            return FetchedBook(
+                url=url,
+                crawl_id=crawl_id,
+                card_fingerprint=card_fingerprint,
+                result=result,
+                previous=previous,
+            ), False
+        except (TransientFetchError, CircuitOpenError):
+            raise
         except Exception as e:
             logger.error(f"Error crawling book {url}: {e}")
+            return None, False
+
+    async def _crawl_attempts(
+        self, items: list[RetryItem]
+    ) -> AsyncGenerator[tuple[FetchedBook | UnchangedBook, int]]:
+        # Fetch the books concurrently, how many are in flight at once is up
+        # to the adaptive concurrency window
+        tasks = [
+            self._fetch_book_if_changed(
+                item.url,
+                item.crawl_id,
+                card_fingerprint=item.card_fingerprint,
+                attempt=item.attempt if self.retry_queue else None,
+            )
+            for item in items
+        ]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Process results and yield fetched and unchanged ones
+        circuit_open: CircuitOpenError | None = None
+        for item, result in zip(items, results):
+            if isinstance(result, CircuitOpenError):
+                circuit_open = result
+                await self._defer(item, result)
+            elif isinstance(result, TransientFetchError):
+                await self._defer(item, result)
+            elif isinstance(result, BaseException):
+                error_msg = f"Exception crawling {item.url}: {result}"
+                logger.error(error_msg)
+            elif result[1]:
+                yield UnchangedBook(url=item.url, crawl_id=item.crawl_id), item.page
+            elif result[0] is not None:
+                yield result[0], item.page
+            else:
+                logger.warning(f"Failed to crawl {item.url}")
+
+        # The rest of the crawl would fail the same way, stop it here
+        if circuit_open:
+            raise circuit_open
+
+    async def _defer(
+        self, item: RetryItem, error: TransientFetchError | CircuitOpenError
+    ) -> None:
+        retry_after: float | None
+        if isinstance(error, CircuitOpenError):
+            # The page was not even requested, it keeps its attempts. It waits
+            # a whole open window, not what is left of it, so it comes back
+            # after the half-open probe has settled
+            retry = item
+            open_seconds = self.breaker.open_seconds if self.breaker else 0.0
+            retry_after = max(error.retry_in, open_seconds)
+            failure_reason = "Not fetched, circuit open"
+        else:
+            retry = item.model_copy(update={"attempt": item.attempt + 1})
+            retry_after = error.retry_after
+            failure_reason = "Failed to fetch HTML from server"
+
+        if self.retry_queue:
+            try:
+                delay = await self.retry_queue.schedule(retry, retry_after)
+                logger.warning(
+                    f"Retrying {item.url} in {delay:.1f}s "
+                    f"(attempt {retry.attempt + 1}/{self.max_retries}): {error}"
+                )
+                return
+            except redis.RedisError as e:
+                logger.error(f"Failed to queue a retry of {item.url}: {e}")
+
+        await self.failed_parse_repo.create(
+            FailedParse(
+                crawl_id=item.crawl_id,
+                url=item.url,
+                html=None,
+                failure_reason=failure_reason,
+            )
+        )
+
+    async def _drain_retries(
+        self, crawl_id: str | None, wait: bool = False
+    ) -> AsyncGenerator[tuple[FetchedBook | UnchangedBook, int]]:
+        """Crawl the retries that are due, with `wait` until none is left."""
+        if not self.retry_queue:
+            return
+
+        while True:
+            items = await self.retry_queue.pop_due(crawl_id)
+            if not items:
+                next_due = await self.retry_queue.next_due(crawl_id) if wait else None
+                if next_due is None:
+                    return
+                await asyncio.sleep(next_due)
+                continue
+
+            logger.info(f"Retrying {len(items)} book pages")
+            async for fetched, page in self._crawl_attempts(items):
+                yield fetched, page
+
+    async def _previous_crawl(self, url: str) -> CrawledPage | None:
+        if not (self.conditional_requests or self.incremental):
+            return None
+        return await self.crawled_page_repo.find_by_url(url)
+
+    def _card_unchanged(
+        self, url: str, previous: CrawledPage | None, card_fingerprint: str | None
+    ) -> bool:
+        """Whether a book page can be skipped on the strength of its card."""
+        if not self.incremental or not previous or card_fingerprint is None:
+            return False
+        if previous.card_fingerprint != card_fingerprint:
+            return False
+
+        # Description and reviews are not on the card. Each book gets its turn
+        # on one day in every refresh_days, which spreads the refreshes
+        # evenly over the days, and a book that missed its turn is overdue
+        now = datetime.now(UTC)
+        age = now - as_utc(previous.fetched_at)
+        if age > timedelta(days=self.refresh_days):
+            return False
+        turn = int(hashlib.sha256(url.encode()).hexdigest()[:8], 16)
+        is_turn = turn % self.refresh_days == now.toordinal() % self.refresh_days
+        return not (is_turn and age > timedelta(hours=12))
+
+    async def _fetch_page(
+        self, url: str, previous: CrawledPage | None, attempt: int | None = None
+    ) -> FetchResult | None:
+        """Fetch a page, conditionally on the validators of its last crawl."""
+        headers = {}
+        if previous and self.conditional_requests:
+            if previous.etag:
+                headers["If-None-Match"] = previous.etag
+            if previous.last_modified:
+                headers["If-Modified-Since"] = previous.last_modified
+
+        result = await self._fetch_with_retry(url, headers, attempt)
+        if result is None:
             return None
+        if result.body is None:
+            # 304, the page is as of the last crawl
+            if not previous:
+                return None
+            return result.model_copy(
+                update={
+                    "unchanged": True,
+                    "etag": previous.etag,
+                    "last_modified": previous.last_modified,
+                    "body_hash": previous.body_hash,
+                }
+            )
+
+        # Servers without validators still send byte-identical pages
+        unchanged = (
+            self.conditional_requests
+            and previous is not None
+            and previous.body_hash == result.body_hash
+        )
+        return result.model_copy(update={"unchanged": unchanged})
+
+    async def _remember(
+        self,
+        result: FetchResult,
+        previous: CrawledPage | None,
+        links: list[str] | None = None,
+        fingerprints: list[str] | None = None,
+        has_next: bool = False,
+        card_fingerprint: str | None = None,
+    ) -> None:
+        # Saved even when nothing changed, fetched_at drives the refreshes
+        if not (self.conditional_requests or self.incremental) or not result.body_hash:
+            return
 
-    async def _crawl_books_batch(
-        self, urls: list[str], crawl_id: str | None = None
-    ) -> AsyncGenerator[CrawledBookDto]:
-        batch_size = 10  # Process 10 books concurrently
-
-        for i in range(0, len(urls), batch_size):
-            batch = urls[i : i + batch_size]
-            total_batches = (len(urls) + batch_size - 1) // batch_size
-            logger.info(f"Processing batch {i // batch_size + 1}/{total_batches}")
-
-            # Crawl books in this batch concurrently
-            tasks = [self.crawl_book(url, crawl_id) for url in batch]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-
-            # Process results and yield successful ones
-            for url, result in zip(batch, results):
-                if isinstance(result, Exception):
-                    error_msg = f"Exception crawling {url}: {result}"
-                    logger.error(error_msg)
-                elif isinstance(result, CrawledBookDto):
-                    yield result
-                elif result is None:
-                    logger.warning(f"Failed to crawl {url}")
-
-            # Small delay between batches to be nice to the server
-            await asyncio.sleep(0.5)
-
-    async def _fetch_with_retry(self, url: str) -> str | None:
+        page = previous or CrawledPage(url=result.url, body_hash=result.body_hash)
+        page.etag = result.etag
+        page.last_modified = result.last_modified
+        page.body_hash = result.body_hash
+        if links is not None:
+            page.links = links
+            page.fingerprints = fingerprints or []
+            page.has_next = has_next
+        if card_fingerprint is not None:
+            page.card_fingerprint = card_fingerprint
+        page.fetched_at = datetime.now(UTC)
+        await self.crawled_page_repo.save(page)
+
+    async def _fetch_with_retry(
+        self,
+        url: str,
+        headers: dict[str, str] | None = None,
+        deferred_attempt: int | None = None,
+    ) -> FetchResult | None:
+        """
+        Fetch `url`, retrying transient failures with backoff.
+
+        The body is streamed, compressed when the server supports it (httpx
+        asks for gzip and deflate), hashed as it comes in and given up on
+        past `max_body_size` bytes. A 304 comes back without a body.
+
+        With `deferred_attempt`, the attempts already made from the retry
+        queue, there is a single attempt and a transient failure raises
+        TransientFetchError while attempts are left, for the queue to retry.
+        """
+        attempts = self.max_retries if deferred_attempt is None else 1
+        defer = deferred_attempt is not None and deferred_attempt + 1 < self.max_retries
         async with httpx.AsyncClient(timeout=self.timeout) as client:
-            for attempt in range(self.max_retries):
+            for attempt in range(attempts):
                 try:
-                    response = await client.get(url)
+                    host = httpx.URL(url).host
+                    if self.politeness:
+                        await self.politeness.acquire(host)
+                    async with self.concurrency.slot() as started:
+                        # Checked last, requests that queued for a slot while
+                        # the circuit opened are not sent
+                        if self.breaker:
+                            await self.breaker.allow(host)
+                        try:
+                            async with client.stream(
+                                "GET", url, headers=headers
+                            ) as response:
+                                body = (
+                                    await self._read_body(response)
+                                    if response.is_success
+                                    else None
+                                )
+                        except httpx.RequestError as e:
+                            if isinstance(e, httpx.TimeoutException):
+                                await self.concurrency.record(started, congested=True)
+                            if self.breaker:
+                                await self.breaker.record(host, started, failed=True)
+                            raise
+                        congested = (
+                            response.status_code == httpx.codes.TOO_MANY_REQUESTS
+                            or response.status_code >= 500
+                        )
+                        await self.concurrency.record(started, congested)
+                        if self.breaker:
+                            await self.breaker.record(host, started, congested)
+
+                    if response.status_code == httpx.codes.NOT_MODIFIED:
+                        return FetchResult(url=url)
                     response.raise_for_status()
-                    return response.text
+                    if body is None:
+                        # Over the size limit
+                        return None
+                    content, body_hash = body
+                    return FetchResult(
+                        url=url,
+                        body=content,
+                        etag=response.headers.get("ETag"),
+                        last_modified=response.headers.get("Last-Modified"),
+                        body_hash=body_hash,
+                    )
 
                 except httpx.HTTPStatusError as e:
-                    if e.response.status_code >= 500:
-                        # Server error - retry with backoff
-                        wait_time = self.retry_delay * (2**attempt)
+                    status_code = e.response.status_code
+                    if (
+                        status_code >= 500
+                        or status_code == httpx.codes.TOO_MANY_REQUESTS
+                    ):
+                        # Server error or rate limited - retry with backoff, or
+                        # when the server says so, hold every request back
+                        wait_time = float(self.retry_delay * (2**attempt))
+                        retry_after = parse_retry_after(
+                            e.response.headers.get("Retry-After")
+                        )
+                        if retry_after is not None:
+                            self.concurrency.pause(retry_after)
+                            wait_time = max(wait_time, retry_after)
+                        if defer:
+                            raise TransientFetchError(
+                                url, f"Server error {status_code}", retry_after
+                            ) from e
+                        if attempt + 1 == attempts:
+                            # No attempts left, nothing to wait for
+                            break
                         logger.warning(
-                            f"Server error {e.response.status_code} for {url}, "
+                            f"Server error {status_code} for {url}, "
                             f"retrying in {wait_time}s "
                             f"(attempt {attempt + 1}/{self.max_retries})"
                         )
@@ -152,6 +560,10 @@ class CrawlerService:
 
                 except (httpx.RequestError, httpx.TimeoutException) as e:
                     # Network error or timeout - retry with backoff
+                    if defer:
+                        raise TransientFetchError(url, f"Request error {e!r}") from e
+                    if attempt + 1 == attempts:
+                        break
                     wait_time = self.retry_delay * (2**attempt)
                     logger.warning(
                         f"Request error for {url}: {e}, "
@@ -160,9 +572,36 @@ class CrawlerService:
                     )
                     await asyncio.sleep(wait_time)
 
+                except CircuitOpenError:
+                    raise
+
                 except Exception as e:
                     logger.error(f"Unexpected error fetching {url}: {e}")
                     return None
 
         logger.error(f"Failed to fetch {url} after {self.max_retries} attempts")
         return None
+
+    async def _read_body(self, response: httpx.Response) -> tuple[bytes, str] | None:
+        """The decompressed body and its sha256, None when over the size limit."""
+        # Content-Length is of the compressed body, rules out the obvious ones
+        # before anything is downloaded
+        length = response.headers.get("Content-Length", "")
+        if length.isdigit() and int(length) > self.max_body_size:
+            logger.error(f"Response too large from {response.url}: {length} bytes")
+            return None
+
+        chunks = []
+        size = 0
+        digest = hashlib.sha256()
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+            if size > self.max_body_size:
+                logger.error(
+                    f"Response too large from {response.url}: "
+                    f"over {self.max_body_size} bytes"
+                )
+                return None
+            digest.update(chunk)
+            chunks.append(chunk)
+        return b"".join(chunks), digest.hexdigest()
@@ -1,48 +1,133 @@
+from contextlib import suppress
+from datetime import timedelta
 from typing import Any
+from uuid import uuid4
 
 from loguru import logger
 
+from filerskeepers.crawler.breaker import CircuitOpenError
+from filerskeepers.crawler.dtos import UnchangedBook
+from filerskeepers.crawler.lease import Lease, LeaseLostError
 from filerskeepers.crawler.models import CrawlMetadata, CrawlStatus
+from filerskeepers.queue.arq import Queue, enqueue_job
+from filerskeepers.queue.backpressure import QueueBackpressure
 from filerskeepers.queue.base import TaskContext, WorkerContext
 
 
 async def crawl_books_task(ctx: WorkerContext) -> dict[str, Any]:
     async with TaskContext(ctx) as task_ctx:
-        incomplete_crawl = (
-            await task_ctx.crawl_metadata_repo.get_latest_incomplete_today()
+        # One crawl at a time, whether from the cron, a rescan or a retry
+        lease = Lease(
+            task_ctx.redis_client, "crawl", owner=str(ctx.get("job_id") or uuid4().hex)
         )
+        if not await lease.acquire():
+            return await _report_running_crawl(task_ctx, lease)
+        try:
+            return await _crawl_books(task_ctx, lease)
+        finally:
+            await lease.release()
 
-        if incomplete_crawl:
-            start_page = incomplete_crawl.last_page_crawled + 1
-            logger.info(
-                f"Resuming incomplete crawl from page {start_page} "
-                f"(last crawled: {incomplete_crawl.last_page_crawled})"
-            )
-            metadata = incomplete_crawl
-        else:
-            start_page = 1
-            logger.info("Starting new crawl from page 1")
-            metadata = CrawlMetadata(
-                url=task_ctx.crawler_service.BASE_URL,
-                status=CrawlStatus.IN_PROGRESS,
-            )
-            await task_ctx.crawl_metadata_repo.create(metadata)
 
-        try:
-            books_found = metadata.books_crawled
-            enqueued_count = 0
-            errors: list[str] = list(metadata.error_messages)
-            last_page = metadata.last_page_crawled
-
-            # Use crawler service to fetch books (generator with resumable support)
-            async for book_dto, page_num in task_ctx.crawler_service.crawl_all_books(
-                start_page, crawl_id=str(metadata.id)
-            ):
+async def _report_running_crawl(task_ctx: TaskContext, lease: Lease) -> dict[str, Any]:
+    holder = await lease.holder()
+    running = await task_ctx.crawl_metadata_repo.get_latest_incomplete_today()
+    logger.info(
+        f"A crawl is already running (lease token "
+        f"{holder.token if holder else None}), not starting another"
+    )
+    return {
+        "status": "already_running",
+        "lease_token": holder.token if holder else None,
+        "owner": holder.owner if holder else None,
+        "crawl_id": str(running.id) if running else None,
+        "last_page": running.last_page_crawled if running else None,
+    }
+
+
+async def _save(task_ctx: TaskContext, metadata: CrawlMetadata, lease: Lease) -> None:
+    # Fenced, a crawl that lost its lease must not overwrite its successor's
+    assert lease.token is not None
+    if not await task_ctx.crawl_metadata_repo.update_fenced(metadata, lease.token):
+        raise LeaseLostError(lease.name, lease.token)
+
+
+async def _record_unchanged(
+    task_ctx: TaskContext, unchanged_books: list[UnchangedBook], errors: list[str]
+) -> None:
+    if not unchanged_books:
+        return
+    try:
+        await task_ctx.book_service.record_unchanged_books(unchanged_books)
+    except Exception as e:
+        error_msg = f"Failed to record {len(unchanged_books)} unchanged books: {e}"
+        logger.error(error_msg)
+        errors.append(error_msg)
+    unchanged_books.clear()
+
+
+async def _crawl_books(task_ctx: TaskContext, lease: Lease) -> dict[str, Any]:
+    assert lease.token is not None
+    incomplete_crawl = await task_ctx.crawl_metadata_repo.get_latest_incomplete_today()
+    # Taken over with our token, writes of the crawl that held it before are
+    # fenced off from now on
+    if incomplete_crawl and not await task_ctx.crawl_metadata_repo.update_fenced(
+        incomplete_crawl, lease.token
+    ):
+        # Only when Redis lost the token counter, a newer crawl would hold the lease
+        logger.warning(
+            f"Incomplete crawl {incomplete_crawl.id} was written with a newer "
+            f"lease token than {lease.token}, starting a new crawl"
+        )
+        incomplete_crawl = None
+
+    if incomplete_crawl:
+        start_page = incomplete_crawl.last_page_crawled + 1
+        logger.info(
+            f"Resuming incomplete crawl from page {start_page} "
+            f"(last crawled: {incomplete_crawl.last_page_crawled})"
+        )
+        metadata = incomplete_crawl
+    else:
+        start_page = 1
+        logger.info("Starting new crawl from page 1")
+        metadata = CrawlMetadata(
+            url=task_ctx.crawler_service.BASE_URL,
+            status=CrawlStatus.IN_PROGRESS,
+            lease_token=lease.token,
+        )
+        await task_ctx.crawl_metadata_repo.create(metadata)
+
+    try:
+        books_found = metadata.books_crawled
+        books_unchanged = metadata.books_unchanged
+        enqueued_count = 0
+        unchanged_books: list[UnchangedBook] = []
+        errors: list[str] = list(metadata.error_messages)
+        last_page = metadata.last_page_crawled
+        # Keeps the crawl from running ahead of the book processors
+        backpressure = QueueBackpressure(task_ctx.arq_redis)
+        backpressure_pauses = metadata.backpressure_pauses
+        backpressure_seconds = metadata.backpressure_seconds
+
+        # Use crawler service to fetch books (generator with resumable support)
+        async for book_dto, page_num in task_ctx.crawler_service.crawl_all_books(
+            start_page, crawl_id=str(metadata.id)
+        ):
+            lease.check()
+            if isinstance(book_dto, UnchangedBook):
+                # Unchanged since the last crawl, only its price is recorded
+                books_unchanged += 1
+                unchanged_books.append(book_dto)
+            else:
                 books_found += 1
                 try:
+                    await backpressure.wait()
                     # Enqueue processing task with the DTO as dict
-                    await task_ctx.arq_redis.enqueue_job(
-                        "process_crawled_book", book_dto.model_dump()
+                    await enqueue_job(
+                        task_ctx.arq_redis,
+                        "process_crawled_book",
+                        book_dto.model_dump(),
+                        queue=Queue.INGEST,
                     )
                     enqueued_count += 1
                 except Exception as e:
@@ -50,50 +135,109 @@ async def crawl_books_task(ctx: WorkerContext) -> dict[str, Any]:
                     logger.error(error_msg)
                     errors.append(error_msg)
 
-                # Update checkpoint if we've moved to a new page
-                if page_num > last_page:
-                    last_page = page_num
-                    metadata.last_page_crawled = last_page
-                    metadata.books_crawled = books_found
-                    metadata.errors_count = len(errors)
-                    metadata.error_messages = errors[:100]
-                    await task_ctx.crawl_metadata_repo.update(metadata)
-                    logger.info(f"Checkpoint: Completed page {last_page}")
-
-            # Mark crawl as complete
-            if not errors:
-                metadata.status = CrawlStatus.SUCCESS
-            elif books_found > 0:
-                metadata.status = CrawlStatus.PARTIAL
-            else:
-                metadata.status = CrawlStatus.FAILED
-
-            status = metadata.status
-            metadata.is_complete = True
-            metadata.books_crawled = books_found
-            metadata.errors_count = len(errors)
-            metadata.error_messages = errors[:100]
-            await task_ctx.crawl_metadata_repo.update(metadata)
-
-            logger.info(
-                f"Crawl completed: {books_found} books found, "
-                f"{enqueued_count} enqueued for processing, "
-                f"{len(errors)} errors, last page: {last_page}"
-            )
-
-            return {
-                "status": "completed",
-                "crawl_status": status,
-                "books_found": books_found,
-                "books_enqueued": enqueued_count,
-                "errors_count": len(errors),
-                "last_page": last_page,
-                "resumed": incomplete_crawl is not None,
-            }
-
-        except Exception as e:
-            logger.error(f"Error in scheduled book crawl: {e}")
+            # Update checkpoint if we've moved to a new page
+            if page_num > last_page:
+                await _record_unchanged(task_ctx, unchanged_books, errors)
+                last_page = page_num
+                metadata.last_page_crawled = last_page
+                metadata.books_crawled = books_found
+                metadata.books_unchanged = books_unchanged
+                metadata.concurrency = task_ctx.crawler_service.concurrency.window
+                metadata.backpressure_pauses = backpressure_pauses + backpressure.pauses
+                metadata.backpressure_seconds = (
+                    backpressure_seconds + backpressure.paused_seconds
+                )
+                metadata.errors_count = len(errors)
+                metadata.error_messages = errors[:100]
+                await _save(task_ctx, metadata, lease)
+                logger.info(f"Checkpoint: Completed page {last_page}")
+
+        await _record_unchanged(task_ctx, unchanged_books, errors)
+
+        # Mark crawl as complete
+        if not errors:
+            metadata.status = CrawlStatus.SUCCESS
+        elif books_found + books_unchanged > 0:
+            metadata.status = CrawlStatus.PARTIAL
+        else:
             metadata.status = CrawlStatus.FAILED
-            metadata.error_messages.append(f"Fatal error: {str(e)}")
-            await task_ctx.crawl_metadata_repo.update(metadata)
-            return {"status": "failed", "error": str(e)}
+
+        status = metadata.status
+        metadata.is_complete = True
+        metadata.books_crawled = books_found
+        metadata.books_unchanged = books_unchanged
+        metadata.concurrency = task_ctx.crawler_service.concurrency.window
+        metadata.backpressure_pauses = backpressure_pauses + backpressure.pauses
+        metadata.backpressure_seconds = (
+            backpressure_seconds + backpressure.paused_seconds
+        )
+        metadata.errors_count = len(errors)
+        metadata.error_messages = errors[:100]
+        await _save(task_ctx, metadata, lease)
+
+        logger.info(
+            f"Crawl completed: {books_found} books found, "
+            f"{books_unchanged} unchanged, "
+            f"{enqueued_count} enqueued for processing, "
+            f"{len(errors)} errors, last page: {last_page}"
+        )
+
+        return {
+            "status": "completed",
+            "crawl_status": status,
+            "books_found": books_found,
+            "books_enqueued": enqueued_count,
+            "books_unchanged": books_unchanged,
+            "concurrency": metadata.concurrency,
+            "backpressure_pauses": metadata.backpressure_pauses,
+            "backpressure_seconds": metadata.backpressure_seconds,
+            "errors_count": len(errors),
+            "last_page": last_page,
+            "resumed": incomplete_crawl is not None,
+        }
+
+    except CircuitOpenError as e:
+        # The site is failing, park the crawl where it got to and resume it
+        # once the circuit may have closed, the book pages it did not get
+        # to are waiting in the retry queue
+        logger.warning(f"Crawl parked after page {last_page}: {e}")
+        metadata.status = CrawlStatus.PARTIAL
+        metadata.books_crawled = books_found
+        metadata.books_unchanged = books_unchanged
+        metadata.concurrency = task_ctx.crawler_service.concurrency.window
+        metadata.backpressure_pauses = backpressure_pauses + backpressure.pauses
+        metadata.backpressure_seconds = (
+            backpressure_seconds + backpressure.paused_seconds
+        )
+        metadata.errors_count = len(errors)
+        metadata.error_messages = errors[:100]
+        await _save(task_ctx, metadata, lease)
+        await enqueue_job(
+            task_ctx.arq_redis,
+            "crawl_books_task",
+            queue=Queue.CRAWL,
+            _defer_by=timedelta(seconds=e.retry_in),
+        )
+
+        return {
+            "status": "parked",
+            "crawl_status": metadata.status,
+            "books_found": books_found,
+            "books_enqueued": enqueued_count,
+            "books_unchanged": books_unchanged,
+            "last_page": last_page,
+            "resume_in": e.retry_in,
+        }
+
+    except LeaseLostError as e:
+        # Another crawl took over, the crawl's state is now its to write
+        logger.warning(f"Crawl stopped after page {last_page}: {e}")
+        return {"status": "superseded", "last_page": last_page, "error": str(e)}
+
+    except Exception as e:
+        logger.error(f"Error in scheduled book crawl: {e}")
+        metadata.status = CrawlStatus.FAILED
+        metadata.error_messages.append(f"Fatal error: {str(e)}")
+        with suppress(LeaseLostError):
+            await _save(task_ctx, metadata, lease)
+        return {"status": "failed", "error": str(e)}
@@ -1,23 +1,43 @@
 from typing import Any
 
 from beanie import init_beanie
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import AsyncMongoClient
 
 from filerskeepers.application.settings import Settings
 from filerskeepers.auth.models import User
-from filerskeepers.books.models import Book, ChangeLog
-from filerskeepers.crawler.models import CrawlMetadata, FailedParse
+from filerskeepers.books.models import (
+    Book,
+    ChangeLog,
+    ChangeLogSegment,
+    PriceObservation,
+)
+from filerskeepers.crawler.models import CrawledPage, CrawlMetadata, FailedParse
+from filerskeepers.reports.models import ChangeReport
 
 
-async def init_mongo(settings: Settings) -> AsyncIOMotorClient[Any]:
-    client: AsyncIOMotorClient[Any] = AsyncIOMotorClient(settings.MONGODB_URL)
+async def init_mongo(settings: Settings) -> AsyncMongoClient[Any]:
+    # NOTE: beanie 2 is built on the pymongo async API (aggregations await
+    # pymongo's cursors), so this must not be a motor client
+    client: AsyncMongoClient[Any] = AsyncMongoClient(
+        settings.MONGODB_URL, maxPoolSize=settings.MONGODB_MAX_POOL_SIZE
+    )
     database = client.get_database(settings.MONGODB_DATABASE)
 
     # Initialize Beanie with document models
     # After this, User.find(), User.insert(), etc. work directly
     await init_beanie(
-        database=database,  # type: ignore[arg-type]
-        document_models=[User, Book, ChangeLog, CrawlMetadata, FailedParse],
+        database=database,
+        document_models=[
+            User,
+            Book,
+            ChangeLog,
+            ChangeLogSegment,
+            PriceObservation,
+            CrawlMetadata,
+            CrawledPage,
+            FailedParse,
+            ChangeReport,
+        ],
     )
 
     return client
@@ -7,12 +7,16 @@ _REDIS_POOL: redis.ConnectionPool | None = None
 
 
 def get_redis_pool(
-    settings: Settings, max_connections: int = 10
+    settings: Settings, max_connections: int | None = None
 ) -> redis.ConnectionPool:
     global _REDIS_POOL
     if _REDIS_POOL is None:
-        _REDIS_POOL = redis.ConnectionPool.from_url(
-            settings.REDIS_URL, max_connections=max_connections
+        # Blocking, so concurrent jobs wait for a connection instead of
+        # failing with "Too many connections"
+        _REDIS_POOL = redis.BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=max_connections or settings.REDIS_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT,
         )
     return _REDIS_POOL
 
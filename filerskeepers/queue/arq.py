@@ -1,7 +1,11 @@
+from datetime import UTC, datetime, timedelta
+from enum import IntEnum, StrEnum
+from typing import Any
 from urllib.parse import urlparse
 
 from arq import ArqRedis, create_pool
 from arq.connections import RedisSettings
+from arq.jobs import Job
 
 from filerskeepers.application.settings import Settings
 
@@ -9,6 +13,32 @@ from filerskeepers.application.settings import Settings
 _ARQ_REDIS: ArqRedis | None = None
 
 
+class Queue(StrEnum):
+    """The arq queues, each one served by its own pool of workers."""
+
+    CRAWL = "arq:crawl"
+    INGEST = "arq:ingest"
+    REPORTS = "arq:reports"
+
+
+class Priority(IntEnum):
+    """
+    Order of jobs within a queue.
+
+    arq runs the jobs of a queue by their score, the time they were enqueued
+    for, so a job of higher priority is scored PRIORITY_STEP earlier per level
+    and overtakes the jobs enqueued less than that before it.
+    """
+
+    NORMAL = 0
+    HIGH = 1
+
+
+PRIORITY_STEP = timedelta(hours=1)
+# arq's default expiry, which an earlier score would otherwise shorten
+JOB_EXPIRES = timedelta(days=1)
+
+
 def get_arq_vars(redis_url: str) -> tuple[str, int, int]:
     if not redis_url:
         raise ValueError("Redis URL cannot be empty")
@@ -45,3 +75,18 @@ async def get_arq_redis(settings: Settings) -> ArqRedis:
         except Exception as e:
             raise ConnectionError(f"Failed to connect to Redis: {str(e)}")
     return _ARQ_REDIS
+
+
+async def enqueue_job(
+    arq_redis: ArqRedis,
+    function: str,
+    *args: Any,
+    queue: Queue,
+    priority: Priority = Priority.NORMAL,
+    **kwargs: Any,
+) -> Job | None:
+    """Enqueue `function` on `queue`, ahead of the jobs of lower priority."""
+    if priority:
+        kwargs["_defer_until"] = datetime.now(UTC) - priority * PRIORITY_STEP
+        kwargs.setdefault("_expires", JOB_EXPIRES)
+    return await arq_redis.enqueue_job(function, *args, _queue_name=queue, **kwargs)
@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+import redis.asyncio as redis
+from arq import ArqRedis
+from loguru import logger
+
+from filerskeepers.application.settings import settings
+from filerskeepers.queue.arq import Queue
+
+
+class QueueBackpressure:
+    """
+    Hold a producer back while an arq queue is too deep.
+
+    Once `high_water` jobs are waiting, wait() blocks until the workers have
+    brought the queue down to `low_water`, so the jobs in Redis, and the memory
+    they take, stay bounded however slow the workers are. While the queue
+    flows its depth is read at most every `interval` seconds, one ZCARD per
+    interval rather than per job. When Redis cannot be read the producer is
+    not held back, enqueueing would fail anyway.
+    """
+
+    def __init__(
+        self,
+        arq_redis: ArqRedis,
+        queue_name: str = Queue.INGEST,
+        high_water: int = settings.QUEUE_HIGH_WATER,
+        low_water: int = settings.QUEUE_LOW_WATER,
+        interval: float = 1.0,
+    ) -> None:
+        self.arq_redis = arq_redis
+        self.queue_name = queue_name
+        self.high_water = high_water
+        self.low_water = min(low_water, high_water)
+        self.interval = interval
+        self.pauses = 0
+        self.paused_seconds = 0.0
+        self._checked_at = 0.0
+
+    async def wait(self) -> None:
+        """Return once the queue has room for more jobs."""
+        now = time.monotonic()
+        if now - self._checked_at < self.interval:
+            return
+        self._checked_at = now
+
+        depth = await self._depth()
+        if depth < self.high_water:
+            return
+
+        self.pauses += 1
+        logger.info(
+            f"{depth} jobs waiting in {self.queue_name}, pausing until "
+            f"{self.low_water} are left"
+        )
+        while depth > self.low_water:
+            await asyncio.sleep(self.interval)
+            depth = await self._depth()
+        self._checked_at = time.monotonic()
+        paused = self._checked_at - now
+        self.paused_seconds += paused
+        logger.info(f"Resuming after {paused:.1f}s, {depth} jobs waiting")
+
+    async def _depth(self) -> int:
+        try:
+            return await self.arq_redis.zcard(self.queue_name)
+        except redis.RedisError as e:
+            logger.warning(f"Failed to read the depth of {self.queue_name}: {e}")
+            return 0
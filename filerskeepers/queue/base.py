@@ -6,10 +6,24 @@ from arq import ArqRedis
 from loguru import logger
 
 from filerskeepers.application.settings import Settings, settings
-from filerskeepers.books.repositories import BookRepository, ChangeLogRepository
+from filerskeepers.books.archive import ChangeLogArchive
+from filerskeepers.books.cache import BookCache
+from filerskeepers.books.feed import ChangeFeed
+from filerskeepers.books.repositories import (
+    BookRepository,
+    ChangeLogRepository,
+    ChangeLogSegmentRepository,
+    PriceObservationRepository,
+)
 from filerskeepers.books.services import BookService
+from filerskeepers.crawler.breaker import CircuitBreaker
+from filerskeepers.crawler.politeness import HostTokenBucket
 from filerskeepers.crawler.repositories import CrawlMetadataRepository
+from filerskeepers.crawler.retries import RetryQueue
 from filerskeepers.crawler.services import CrawlerService
+from filerskeepers.db.redis import get_redis_connection
+from filerskeepers.reports.repositories import ChangeReportRepository
+from filerskeepers.reports.services import ReportService
 
 
 WorkerContext = dict[str, Any]
@@ -32,15 +46,39 @@ class TaskContext:
 
             self.redis_pool = self._worker_ctx["redis_pool"]
             assert self.redis_pool is not None, "Failed to initialize redis pool"
+            self.redis_client = get_redis_connection(self.redis_pool)
 
             self.book_repo = BookRepository()
             self.change_log_repo = ChangeLogRepository()
+            self.change_log_segment_repo = ChangeLogSegmentRepository()
+            self.price_observation_repo = PriceObservationRepository()
             self.crawl_metadata_repo = CrawlMetadataRepository()
+            self.report_repo = ChangeReportRepository()
 
-            self.crawler_service = CrawlerService()
+            self.book_cache = BookCache(redis_client=self.redis_client)
+            self.change_feed = ChangeFeed(redis_client=self.redis_client)
+            self.change_log_archive = ChangeLogArchive(
+                change_log_repo=self.change_log_repo,
+                segment_repo=self.change_log_segment_repo,
+            )
+
+            self.crawler_service = CrawlerService(
+                politeness=HostTokenBucket(redis_client=self.redis_client),
+                retry_queue=RetryQueue(redis_client=self.redis_client),
+                breaker=CircuitBreaker(redis_client=self.redis_client),
+            )
             self.book_service = BookService(
                 book_repo=self.book_repo,
                 change_log_repo=self.change_log_repo,
+                price_history_repo=self.price_observation_repo,
+                cache=self.book_cache,
+                archive=self.change_log_archive,
+                feed=self.change_feed,
+            )
+            self.report_service = ReportService(
+                change_log_repo=self.change_log_repo,
+                report_repo=self.report_repo,
+                archive=self.change_log_archive,
             )
 
             return self
@@ -54,9 +92,6 @@ class TaskContext:
         exc_val: BaseException | None,
         exc_tb: TracebackType | None,
     ) -> None:
-        try:
-            # NOTE: cleanup resources if needed
-            pass
-        finally:
-            if self.redis_pool:
-                await self.redis_pool.disconnect()
+        # The Redis pool is the worker's, shared by every job running in it
+        # (a crawl's lease heartbeat included) and closed on its shutdown
+        pass
@@ -0,0 +1,173 @@
+"""
+Run a pool of arq worker processes for one queue.
+
+An arq worker is a single process on a single event loop, so one worker only
+ever keeps one core busy parsing and validating. The launcher starts one
+worker per core (or `--processes`), restarts a worker that crashes, backing
+off while it keeps crashing, and on SIGTERM or SIGINT lets every worker stop
+taking jobs and finish the running ones within WORKER_DRAIN_TIMEOUT seconds.
+
+Every process opens its own Mongo and Redis pools, sized by
+MONGODB_MAX_POOL_SIZE and REDIS_MAX_CONNECTIONS.
+
+    $ uv run filerskeepers worker ingest
+    $ uv run filerskeepers worker crawl --processes 2
+"""
+
+import argparse
+import logging.config
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing.context import SpawnProcess
+from types import FrameType
+
+from arq.logs import default_log_config
+from arq.worker import run_worker
+from loguru import logger
+
+from filerskeepers.application.logging import setup_logging
+from filerskeepers.application.settings import settings
+from filerskeepers.queue.arq import Queue
+from filerskeepers.queue.workers import WORKER_SETTINGS
+
+
+def _run_worker(queue: Queue, drain_timeout: int) -> None:
+    setup_logging()
+    logging.config.dictConfig(default_log_config(verbose=True))
+    # The settings classes leave signals alone for `arq --watch`, here each
+    # worker drains on its own signal
+    run_worker(
+        WORKER_SETTINGS[queue], handle_signals=True, job_completion_wait=drain_timeout
+    )
+
+
+class WorkerLauncher:
+    """Keeps `processes` workers of `queue` running until told to stop."""
+
+    # A worker that dies sooner than this after starting is crash looping
+    MIN_UPTIME = 10.0
+    MAX_RESTART_DELAY = 60.0
+    # Left to a draining worker past the drain timeout to close its connections
+    DRAIN_GRACE = 10.0
+
+    def __init__(
+        self,
+        queue: Queue,
+        processes: int,
+        drain_timeout: int = settings.WORKER_DRAIN_TIMEOUT,
+    ) -> None:
+        self.queue = queue
+        self.processes = processes
+        self.drain_timeout = drain_timeout
+        # Spawned, forking would copy whatever the parent has imported and opened
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: list[SpawnProcess | None] = [None] * processes
+        self._started_at = [0.0] * processes
+        self._restart_at = [0.0] * processes
+        self._crashes = [0] * processes
+        self._stopping = False
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        logger.info(f"Starting {self.processes} workers for {self.queue}")
+
+        while not self._stopping:
+            for slot in range(self.processes):
+                self._supervise(slot)
+            time.sleep(0.5)
+
+        self._drain()
+
+    def _supervise(self, slot: int) -> None:
+        worker = self._workers[slot]
+        if worker is not None and worker.is_alive():
+            return
+
+        now = time.monotonic()
+        if worker is not None:
+            worker.join()
+            self._workers[slot] = None
+            delay = self._restart_delay(slot, now - self._started_at[slot])
+            self._restart_at[slot] = now + delay
+            logger.error(
+                f"Worker {worker.pid} exited with {worker.exitcode}, "
+                f"restarting in {delay:.0f}s"
+            )
+
+        if now < self._restart_at[slot]:
+            return
+        worker = self._context.Process(
+            target=_run_worker,
+            args=(self.queue, self.drain_timeout),
+            name=f"{self.queue}-{slot}",
+        )
+        worker.start()
+        self._workers[slot] = worker
+        self._started_at[slot] = now
+        logger.info(f"Started worker {worker.pid} for {self.queue}")
+
+    def _restart_delay(self, slot: int, uptime: float) -> float:
+        # Doubles for every crash in a row, from 1s up to MAX_RESTART_DELAY
+        if uptime < self.MIN_UPTIME:
+            self._crashes[slot] += 1
+        else:
+            self._crashes[slot] = 1
+        return min(2.0 ** (self._crashes[slot] - 1), self.MAX_RESTART_DELAY)
+
+    def _stop(self, signum: int, frame: FrameType | None) -> None:
+        if self._stopping:
+            return
+        logger.info(
+            f"Received {signal.Signals(signum).name}, draining the workers "
+            f"for up to {self.drain_timeout}s"
+        )
+        self._stopping = True
+
+    def _drain(self) -> None:
+        workers = [worker for worker in self._workers if worker is not None]
+        for worker in workers:
+            if worker.is_alive() and worker.pid is not None:
+                os.kill(worker.pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + self.drain_timeout + self.DRAIN_GRACE
+        for worker in workers:
+            worker.join(max(deadline - time.monotonic(), 0))
+            if worker.is_alive():
+                logger.warning(f"Worker {worker.pid} did not stop, killing it")
+                worker.kill()
+                worker.join()
+        logger.info(f"Stopped the workers for {self.queue}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="filerskeepers",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker = commands.add_parser("worker", help="Run the workers of a queue")
+    worker.add_argument("queue", choices=[queue.name.lower() for queue in Queue])
+    worker.add_argument(
+        "--processes",
+        type=int,
+        default=os.process_cpu_count() or 1,
+        help="Worker processes to run, one per core by default",
+    )
+    worker.add_argument(
+        "--drain-timeout", type=int, default=settings.WORKER_DRAIN_TIMEOUT
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    launcher = WorkerLauncher(
+        Queue[args.queue.upper()], args.processes, drain_timeout=args.drain_timeout
+    )
+    launcher.run()
+
+
+if __name__ == "__main__":
+    main()
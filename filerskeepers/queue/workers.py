@@ -5,12 +5,13 @@ from arq.cron import cron
 from loguru import logger
 
 from filerskeepers.application.settings import settings
-from filerskeepers.books.tasks import process_crawled_book
+from filerskeepers.books.tasks import archive_change_logs_task, process_crawled_book
 from filerskeepers.crawler.tasks import crawl_books_task
 from filerskeepers.db.mongo import init_mongo
 from filerskeepers.db.redis import get_redis_pool
-from filerskeepers.queue.arq import get_arq_vars
+from filerskeepers.queue.arq import Queue, get_arq_vars
 from filerskeepers.queue.base import TaskContext, WorkerContext
+from filerskeepers.reports.tasks import generate_change_reports_task
 
 
 async def startup(ctx: WorkerContext) -> None:
@@ -29,7 +30,7 @@ async def shutdown(ctx: WorkerContext) -> None:
     try:
         await ctx["redis_pool"].aclose()
         if "mongo_client" in ctx:
-            ctx["mongo_client"].close()
+            await ctx["mongo_client"].close()
     except Exception as e:
         logger.error(f"Failed to close repositories: {str(e)}")
 
@@ -39,21 +40,62 @@ async def example_task(ctx: WorkerContext) -> dict[str, Any]:
         return {"status": "completed"}
 
 
-class WorkerSettings:
-    _host, _port, _db = get_arq_vars(settings.REDIS_URL)
+_host, _port, _db = get_arq_vars(settings.REDIS_URL)
+
+
+# One pool of workers per queue, so a crawl running for an hour never holds
+# a slot the book processing needs and each pool is scaled on its own. arq
+# only reads the attributes defined on the class itself, hence no base class
+class CrawlWorkerSettings:
     redis_settings: RedisSettings = RedisSettings(host=_host, port=_port, database=_db)
+    queue_name = Queue.CRAWL
     on_startup = startup
     on_shutdown = shutdown
-    functions = [
-        example_task,
-        crawl_books_task,
-        process_crawled_book,
-    ]
+    functions = [crawl_books_task]
     cron_jobs = [
         cron(crawl_books_task, hour=2, minute=0),  # Daily crawl at 2:00 AM
     ]
     verbose = True
-    max_jobs = 10
-    job_timeout = 300
+    max_jobs = settings.QUEUE_CRAWL_MAX_JOBS
+    job_timeout = settings.QUEUE_CRAWL_JOB_TIMEOUT
+    handle_signals = False
+    log_results = True
+
+
+class IngestWorkerSettings:
+    redis_settings: RedisSettings = RedisSettings(host=_host, port=_port, database=_db)
+    queue_name = Queue.INGEST
+    on_startup = startup
+    on_shutdown = shutdown
+    functions = [example_task, process_crawled_book]
+    verbose = True
+    max_jobs = settings.QUEUE_INGEST_MAX_JOBS
+    job_timeout = settings.QUEUE_INGEST_JOB_TIMEOUT
     handle_signals = False
     log_results = True
+
+
+class ReportsWorkerSettings:
+    redis_settings: RedisSettings = RedisSettings(host=_host, port=_port, database=_db)
+    queue_name = Queue.REPORTS
+    on_startup = startup
+    on_shutdown = shutdown
+    functions = [generate_change_reports_task, archive_change_logs_task]
+    cron_jobs = [
+        # Reports for the previous day, once no more changes can land in it
+        cron(generate_change_reports_task, hour=0, minute=15),
+        # Move change logs past the hot retention to the archive
+        cron(archive_change_logs_task, hour=1, minute=0),
+    ]
+    verbose = True
+    max_jobs = settings.QUEUE_REPORTS_MAX_JOBS
+    job_timeout = settings.QUEUE_REPORTS_JOB_TIMEOUT
+    handle_signals = False
+    log_results = True
+
+
+WORKER_SETTINGS: dict[Queue, type] = {
+    Queue.CRAWL: CrawlWorkerSettings,
+    Queue.INGEST: IngestWorkerSettings,
+    Queue.REPORTS: ReportsWorkerSettings,
+}
@@ -0,0 +1 @@
+"""This is a domain module - for change reports"""
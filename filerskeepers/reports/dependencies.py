@@ -0,0 +1,28 @@
+from typing import Annotated
+
+from fastapi import Depends
+
+from filerskeepers.books.archive import ChangeLogArchive
+from filerskeepers.books.dependencies import (
+    get_change_log_archive,
+    get_change_log_repository,
+)
+from filerskeepers.books.repositories import ChangeLogRepository
+from filerskeepers.reports.repositories import ChangeReportRepository
+from filerskeepers.reports.services import ReportService
+
+
+def get_change_report_repository() -> ChangeReportRepository:
+    return ChangeReportRepository()
+
+
+def get_report_service(
+    change_log_repo: Annotated[ChangeLogRepository, Depends(get_change_log_repository)],
+    report_repo: Annotated[
+        ChangeReportRepository, Depends(get_change_report_repository)
+    ],
+    archive: Annotated[ChangeLogArchive, Depends(get_change_log_archive)],
+) -> ReportService:
+    return ReportService(
+        change_log_repo=change_log_repo, report_repo=report_repo, archive=archive
+    )
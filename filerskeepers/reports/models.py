@@ -0,0 +1,65 @@
+from datetime import UTC, datetime, timedelta
+from typing import Literal
+
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel, Field
+from pymongo import ASCENDING, IndexModel
+
+
+ReportFormat = Literal["json", "csv", "ndjson", "summary"]
+
+# Change logs are timestamped when they are written, so once this long has
+# passed after a range ends nothing can be added to it any more
+FINALISATION_DELAY = timedelta(minutes=5)
+
+
+def as_utc(value: datetime) -> datetime:
+    # Mongo hands back naive datetimes, query parameters may be either
+    return value.replace(tzinfo=UTC) if value.tzinfo is None else value
+
+
+def is_final(generated_at: datetime, end_date: datetime) -> bool:
+    """Whether a report generated at `generated_at` can no longer change."""
+    return as_utc(generated_at) >= as_utc(end_date) + FINALISATION_DELAY
+
+
+class ChangeReport(Document):
+    start_date: datetime  # inclusive
+    end_date: datetime  # exclusive
+    format: ReportFormat
+    content: bytes  # gzip compressed report body
+    etag: str
+    total_changes: int = 0
+    generated_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+
+    class Settings:
+        name = "change_reports"
+        use_state_management = True
+        indexes = [
+            IndexModel(
+                [
+                    ("format", ASCENDING),
+                    ("start_date", ASCENDING),
+                    ("end_date", ASCENDING),
+                ],
+                unique=True,
+            ),
+        ]
+
+    def is_final(self) -> bool:
+        return is_final(self.generated_at, self.end_date)
+
+
+class ChangeReportInfo(BaseModel):
+    """A ChangeReport without its content, for deciding what to read."""
+
+    id: PydanticObjectId = Field(alias="_id")
+    start_date: datetime
+    end_date: datetime
+    format: ReportFormat
+    etag: str
+    total_changes: int
+    generated_at: datetime
+
+    def is_final(self) -> bool:
+        return is_final(self.generated_at, self.end_date)
@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import Any
+
+from beanie import PydanticObjectId
+from beanie.operators import In
+
+from filerskeepers.reports.models import ChangeReport, ChangeReportInfo, ReportFormat
+
+
+class ChangeReportRepository:
+    async def save(self, report: ChangeReport) -> ChangeReport:
+        # Regenerating a report replaces the one stored for the same range
+        existing = await ChangeReport.find_one(
+            ChangeReport.format == report.format,
+            ChangeReport.start_date == report.start_date,
+            ChangeReport.end_date == report.end_date,
+        )
+        if existing:
+            report.id = existing.id
+        await report.save()
+        return report
+
+    async def find(
+        self, format_type: ReportFormat, start_date: datetime, end_date: datetime
+    ) -> ChangeReport | None:
+        return await ChangeReport.find_one(
+            ChangeReport.format == format_type,
+            ChangeReport.start_date == start_date,
+            ChangeReport.end_date == end_date,
+        )
+
+    async def find_infos(
+        self, start_dates: list[datetime], format_type: ReportFormat | None = None
+    ) -> list[ChangeReportInfo]:
+        filters: list[Any] = [In(ChangeReport.start_date, start_dates)]
+        if format_type:
+            filters.append(ChangeReport.format == format_type)
+
+        return await ChangeReport.find(
+            *filters, projection_model=ChangeReportInfo
+        ).to_list()
+
+    async def get_content(self, report_id: PydanticObjectId) -> bytes | None:
+        report = await ChangeReport.get(report_id)
+        return report.content if report else None
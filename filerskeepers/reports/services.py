@@ -0,0 +1,604 @@
+import csv
+import hashlib
+import json
+import math
+import zlib
+from collections import Counter
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime, timedelta
+from io import StringIO
+from typing import Any
+
+from loguru import logger
+
+from filerskeepers.application.settings import settings
+from filerskeepers.books.archive import ChangeLogArchive
+from filerskeepers.books.models import change_entry_id
+from filerskeepers.books.repositories import ChangeLogRepository
+from filerskeepers.reports.models import (
+    ChangeReport,
+    ChangeReportInfo,
+    ReportFormat,
+    as_utc,
+)
+from filerskeepers.reports.repositories import ChangeReportRepository
+
+
+DAY = timedelta(days=1)
+REPORT_FORMATS: tuple[ReportFormat, ...] = ("json", "csv", "ndjson", "summary")
+# Stay clear of Mongo's 16MB document limit, bigger days are served live
+MAX_REPORT_BYTES = 15 * 1024 * 1024
+# ndjson partitions are the row source for stitching ad-hoc ranges together
+PARTITION_FORMAT: ReportFormat = "ndjson"
+
+
+def floor_day(value: datetime) -> datetime:
+    return as_utc(value).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def ceil_day(value: datetime) -> datetime:
+    day = floor_day(value)
+    return day if day == as_utc(value) else day + DAY
+
+
+class ReportService:
+    def __init__(
+        self,
+        change_log_repo: ChangeLogRepository,
+        report_repo: ChangeReportRepository,
+        archive: ChangeLogArchive | None = None,
+    ) -> None:
+        self.change_log_repo = change_log_repo
+        self.report_repo = report_repo
+        self.archive = archive
+
+    async def get_precomputed_report(
+        self,
+        start_date: datetime | None,
+        end_date: datetime | None,
+        format_type: ReportFormat,
+    ) -> ChangeReport | None:
+        """Return the stored report for exactly this range, if it is final."""
+        if start_date is None or end_date is None:
+            return None
+
+        report = await self.report_repo.find(
+            format_type, as_utc(start_date), as_utc(end_date)
+        )
+        return report if report and report.is_final() else None
+
+    async def generate_change_report(
+        self,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+        format_type: ReportFormat = "json",
+    ) -> str:
+        """
+        Generate a change report for a specific date range.
+
+        Builds the whole report in memory, the API streams it instead via
+        stream_change_report.
+
+        Args:
+            start_date: Start of the date range (default: 24 hours ago)
+            end_date: End of the date range (default: now)
+            format_type: Output format - 'json', 'csv', 'ndjson' or 'summary'
+
+        Returns:
+            String content of the report in the specified format
+        """
+        return "".join(
+            [
+                chunk
+                async for chunk in self.stream_change_report(
+                    start_date, end_date, format_type
+                )
+            ]
+        )
+
+    async def stream_change_report(
+        self,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+        format_type: ReportFormat = "json",
+        batch_size: int = settings.REPORT_BATCH_SIZE,
+    ) -> AsyncIterator[str]:
+        """
+        Stream a change report for a specific date range in chunks.
+
+        Whole days inside the range are read from their precomputed partitions,
+        only the remainder at either end is queried from the change logs, or
+        their archive for days past the hot retention. Memory use does not grow
+        with the size of the range.
+        """
+        start_date, end_date = self._date_range(start_date, end_date)
+        logger.info(
+            f"Streaming {format_type.upper()} report from {start_date} to {end_date}"
+        )
+
+        rows = self._stitched_rows(start_date, end_date, batch_size)
+        async for chunk in self._render(
+            format_type, rows, start_date, end_date, True, batch_size
+        ):
+            yield chunk
+
+    async def check_archive(
+        self, start_date: datetime | None = None, end_date: datetime | None = None
+    ) -> None:
+        """
+        Raise SegmentMissingError if the archived part of a report's range is
+        unavailable, for the API to fail before it starts streaming.
+        """
+        start_date, end_date = self._date_range(start_date, end_date)
+        boundary = await self._archive_boundary(start_date)
+        if boundary is not None and self.archive is not None:
+            await self.archive.check_available(start_date, min(end_date, boundary))
+
+    @staticmethod
+    def _date_range(
+        start_date: datetime | None, end_date: datetime | None
+    ) -> tuple[datetime, datetime]:
+        # Default to the last 24 hours
+        if end_date is None:
+            end_date = datetime.now(UTC)
+        if start_date is None:
+            start_date = end_date - timedelta(days=1)
+        return as_utc(start_date), as_utc(end_date)
+
+    async def materialise_day(self, day: datetime) -> list[ChangeReport]:
+        """Generate and store every report format for one UTC day."""
+        start_date = floor_day(day)
+        end_date = start_date + DAY
+        reports = []
+
+        for format_type in REPORT_FORMATS:
+            total = 0
+
+            async def counted(rows: AsyncIterator[str]) -> AsyncIterator[str]:
+                nonlocal total
+                async for row in rows:
+                    total += 1
+                    yield row
+
+            # Partitions are always built from the change logs themselves
+            rows = counted(self._live_rows(start_date, end_date, False))
+            chunks = self._render(format_type, rows, start_date, end_date, False)
+
+            compressor = zlib.compressobj(wbits=31)  # gzip container
+            digest = hashlib.sha256()
+            compressed = []
+            async for chunk in chunks:
+                encoded = chunk.encode()
+                digest.update(encoded)
+                compressed.append(compressor.compress(encoded))
+            compressed.append(compressor.flush())
+            content = b"".join(compressed)
+
+            if len(content) > MAX_REPORT_BYTES:
+                logger.warning(
+                    f"{format_type.upper()} report for {start_date.date()} is "
+                    f"{len(content)} bytes compressed, leaving it to be served live"
+                )
+                continue
+
+            if format_type == "summary":
+                total = json.loads(zlib.decompress(content, wbits=31))["total_changes"]
+
+            reports.append(
+                await self.report_repo.save(
+                    ChangeReport(
+                        start_date=start_date,
+                        end_date=end_date,
+                        format=format_type,
+                        content=content,
+                        etag=f'"{digest.hexdigest()[:32]}"',
+                        total_changes=total,
+                    )
+                )
+            )
+
+        logger.info(f"Materialised {len(reports)} reports for {start_date.date()}")
+        return reports
+
+    async def materialise_missing_days(
+        self, days: int = settings.REPORT_BACKFILL_DAYS
+    ) -> list[datetime]:
+        """Materialise the completed days of the last `days` lacking final reports."""
+        today = floor_day(datetime.now(UTC))
+        candidates = [today - DAY * offset for offset in range(1, days + 1)]
+
+        infos = await self.report_repo.find_infos(candidates)
+        final = {
+            (floor_day(info.start_date), info.format)
+            for info in infos
+            if info.is_final()
+        }
+
+        materialised = []
+        for day in candidates:
+            if all((day, format_type) in final for format_type in REPORT_FORMATS):
+                continue
+            await self.materialise_day(day)
+            materialised.append(day)
+        return materialised
+
+    async def _stitched_rows(
+        self, start_date: datetime, end_date: datetime, batch_size: int
+    ) -> AsyncIterator[str]:
+        # Whole days covered by the range, newest first to match the report order
+        days = []
+        day = floor_day(end_date) - DAY
+        while day >= ceil_day(start_date):
+            days.append(day)
+            day -= DAY
+
+        partitions: dict[datetime, ChangeReportInfo] = {}
+        if days:
+            infos = await self.report_repo.find_infos(days, PARTITION_FORMAT)
+            partitions = {
+                floor_day(info.start_date): info for info in infos if info.is_final()
+            }
+
+        # Walk down from the end of the range, querying live whatever lies
+        # between the partitions that are available
+        live_end, end_inclusive = end_date, True
+        for day in days:
+            partition = partitions.get(day)
+            if partition is None:
+                continue
+
+            content = await self.report_repo.get_content(partition.id)
+            if content is None:
+                # Removed since we looked, the next live query covers the day
+                continue
+
+            if live_end > day + DAY or end_inclusive:
+                async for row in self._live_rows(
+                    day + DAY, live_end, end_inclusive, batch_size
+                ):
+                    yield row
+            async for row in self._partition_rows(content):
+                yield row
+            live_end, end_inclusive = day, False
+
+        async for row in self._live_rows(
+            start_date, live_end, end_inclusive, batch_size
+        ):
+            yield row
+
+    async def _live_rows(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        end_inclusive: bool,
+        batch_size: int = settings.REPORT_BATCH_SIZE,
+    ) -> AsyncIterator[str]:
+        async for change in self._changes(
+            start_date, end_date, end_inclusive, batch_size
+        ):
+            yield json.dumps(self._report_row(change))
+
+    async def _changes(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        end_inclusive: bool,
+        batch_size: int = settings.REPORT_BATCH_SIZE,
+    ) -> AsyncIterator[dict[str, Any]]:
+        boundary = await self._archive_boundary(start_date)
+        if boundary is None or self.archive is None:
+            async for change in self.change_log_repo.stream_range(
+                start_date, end_date, end_inclusive=end_inclusive, batch_size=batch_size
+            ):
+                yield change
+            return
+
+        # Newest first: Mongo down to the boundary, then the archive below it
+        if end_date >= boundary:
+            async for change in self.change_log_repo.stream_range(
+                boundary, end_date, end_inclusive=end_inclusive, batch_size=batch_size
+            ):
+                yield change
+            end_date, end_inclusive = boundary, False
+
+        async for change in self.archive.stream_range(
+            start_date, end_date, end_inclusive=end_inclusive
+        ):
+            yield change
+
+    async def _archive_boundary(self, start_date: datetime) -> datetime | None:
+        """The archive boundary, if the range starts before it."""
+        if self.archive is None:
+            return None
+        boundary = await self.archive.boundary()
+        return boundary if boundary is not None and start_date < boundary else None
+
+    async def _partition_rows(self, content: bytes) -> AsyncIterator[str]:
+        # Decompress in slices so only the compressed partition is held whole
+        decompressor = zlib.decompressobj(wbits=31)
+        pending = b""
+        for offset in range(0, len(content), 64 * 1024):
+            pending += decompressor.decompress(content[offset : offset + 64 * 1024])
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                yield line.decode()
+        pending += decompressor.flush()
+        if pending:
+            yield pending.decode()
+
+    async def _render(
+        self,
+        format_type: ReportFormat,
+        rows: AsyncIterator[str],
+        start_date: datetime,
+        end_date: datetime,
+        end_inclusive: bool,
+        batch_size: int = settings.REPORT_BATCH_SIZE,
+    ) -> AsyncIterator[str]:
+        if format_type == "json":
+            chunks = self._stream_json_report(rows, start_date, end_date, batch_size)
+        elif format_type == "ndjson":
+            chunks = self._stream_ndjson_report(rows, batch_size)
+        elif format_type == "summary":
+            chunks = self._stream_summary_report(start_date, end_date, end_inclusive)
+        else:
+            chunks = self._stream_csv_report(rows, batch_size)
+
+        async for chunk in chunks:
+            yield chunk
+
+    @staticmethod
+    def _report_row(change: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "id": change_entry_id(change["_id"], change.get("change_index")),
+            "book_id": change.get("book_id"),
+            "book_name": change.get("book_name"),
+            "change_type": change.get("change_type"),
+            "field_changed": change.get("field_changed"),
+            "old_value": change.get("old_value"),
+            "new_value": change.get("new_value"),
+            "timestamp": change["timestamp"].isoformat(),
+        }
+
+    async def _stream_json_report(
+        self,
+        rows: AsyncIterator[str],
+        start_date: datetime,
+        end_date: datetime,
+        batch_size: int,
+    ) -> AsyncIterator[str]:
+        """Stream a JSON report from change logs."""
+        # The metadata goes after the changes so total_changes can be counted
+        # while streaming rather than with a separate query up front
+        yield '{\n  "changes": ['
+        total = 0
+        buffer: list[str] = []
+        async for row in rows:
+            separator = "," if total else ""
+            buffer.append(f"{separator}\n    {row}")
+            total += 1
+            if len(buffer) >= batch_size:
+                yield "".join(buffer)
+                buffer.clear()
+
+        metadata = {
+            "generated_at": datetime.now(UTC).isoformat(),
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "total_changes": total,
+        }
+        buffer.append(f'\n  ],\n  "report_metadata": {json.dumps(metadata)}\n}}\n')
+        yield "".join(buffer)
+
+    async def _stream_ndjson_report(
+        self, rows: AsyncIterator[str], batch_size: int
+    ) -> AsyncIterator[str]:
+        """Stream a newline delimited JSON report, one change per line."""
+        buffer: list[str] = []
+        async for row in rows:
+            buffer.append(row + "\n")
+            if len(buffer) >= batch_size:
+                yield "".join(buffer)
+                buffer.clear()
+
+        if buffer:
+            yield "".join(buffer)
+
+    async def _stream_csv_report(
+        self, rows: AsyncIterator[str], batch_size: int
+    ) -> AsyncIterator[str]:
+        """Stream a CSV report from change logs."""
+        output = StringIO()
+        writer = csv.writer(output)
+
+        # Write header
+        writer.writerow(
+            [
+                "ID",
+                "Book ID",
+                "Book Name",
+                "Change Type",
+                "Field Changed",
+                "Old Value",
+                "New Value",
+                "Timestamp",
+            ]
+        )
+
+        # Write data rows, flushing the buffer once per batch
+        count = 0
+        async for row in rows:
+            change = json.loads(row)
+            writer.writerow(
+                [
+                    change["id"],
+                    change["book_id"],
+                    change["book_name"],
+                    change["change_type"],
+                    change["field_changed"] or "",
+                    change["old_value"] or "",
+                    change["new_value"] or "",
+                    change["timestamp"],
+                ]
+            )
+            count += 1
+            if count % batch_size == 0:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+
+        yield output.getvalue()
+
+    async def _stream_summary_report(
+        self, start_date: datetime, end_date: datetime, end_inclusive: bool
+    ) -> AsyncIterator[str]:
+        """Aggregate the range in Mongo and emit a single JSON document."""
+        if await self._archive_boundary(start_date):
+            # Mongo cannot aggregate over the archive, walk the rows instead
+            summary = await self._summarise_changes(
+                self._changes(start_date, end_date, end_inclusive)
+            )
+        else:
+            summary = await self.change_log_repo.summarise_range(
+                start_date, end_date, end_inclusive=end_inclusive
+            )
+        report = {
+            "report_metadata": {
+                "generated_at": datetime.now(UTC).isoformat(),
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat(),
+            },
+            **summary,
+        }
+        yield json.dumps(report, indent=2)
+
+    async def _summarise_changes(
+        self, changes: AsyncIterator[dict[str, Any]], top_books: int = 10
+    ) -> dict[str, Any]:
+        """
+        The summary of ChangeLogRepository.summarise_range, built in Python.
+
+        Only running totals are kept, per change type, day and book, so
+        memory does not grow with the number of changes.
+        """
+        by_change_type: Counter[str] = Counter()
+        by_day: Counter[str] = Counter()
+        books: dict[str, dict[str, Any]] = {}
+        deltas = {
+            "count": 0,
+            "sum": 0.0,
+            "sum_absolute": 0.0,
+            "sum_squares": 0.0,
+            "min": math.inf,
+            "max": -math.inf,
+            "increases": 0,
+            "decreases": 0,
+        }
+
+        async for change in changes:
+            change_type = change["change_type"]
+            by_change_type[change_type] += 1
+            by_day[as_utc(change["timestamp"]).strftime("%Y-%m-%d")] += 1
+
+            book = books.setdefault(
+                change["book_id"],
+                {
+                    "book_name": change["book_name"],
+                    "by_change_type": Counter(),
+                    "price_delta_sum": 0.0,
+                    "price_delta_count": 0,
+                },
+            )
+            book["by_change_type"][change_type] += 1
+
+            # Only the tax inclusive price, excl. tax would double count
+            if change.get("field_changed") != "price_incl_tax":
+                continue
+            old_price = _parse_price(change.get("old_value"))
+            new_price = _parse_price(change.get("new_value"))
+            if old_price is None or new_price is None:
+                continue
+
+            delta = new_price - old_price
+            book["price_delta_sum"] += delta
+            book["price_delta_count"] += 1
+            deltas["count"] += 1
+            deltas["sum"] += delta
+            deltas["sum_absolute"] += abs(delta)
+            deltas["sum_squares"] += delta * delta
+            deltas["min"] = min(deltas["min"], delta)
+            deltas["max"] = max(deltas["max"], delta)
+            deltas["increases"] += delta > 0
+            deltas["decreases"] += delta < 0
+
+        categories = await self.change_log_repo.book_categories(list(books))
+
+        by_category: dict[str, dict[str, Any]] = {}
+        category_deltas: dict[str, tuple[float, int]] = {}
+        for book_id, book in books.items():
+            name = categories.get(book_id, "Unknown")
+            category = by_category.setdefault(
+                name, {"total": 0, "by_change_type": {}, "average_price_delta": None}
+            )
+            category["total"] += book["by_change_type"].total()
+            for change_type, count in book["by_change_type"].items():
+                category["by_change_type"][change_type] = (
+                    category["by_change_type"].get(change_type, 0) + count
+                )
+            delta_sum, delta_count = category_deltas.get(name, (0.0, 0))
+            category_deltas[name] = (
+                delta_sum + book["price_delta_sum"],
+                delta_count + book["price_delta_count"],
+            )
+        for name, (delta_sum, delta_count) in category_deltas.items():
+            if delta_count:
+                by_category[name]["average_price_delta"] = round(
+                    delta_sum / delta_count, 2
+                )
+
+        price_deltas: dict[str, Any] = {"count": 0}
+        if count := deltas["count"]:
+            average = deltas["sum"] / count
+            price_deltas = {
+                "count": count,
+                "increases": deltas["increases"],
+                "decreases": deltas["decreases"],
+                "average": round(average, 2),
+                "average_absolute": round(deltas["sum_absolute"] / count, 2),
+                "std_dev": round(
+                    math.sqrt(max(deltas["sum_squares"] / count - average**2, 0.0)),
+                    2,
+                ),
+                "min": round(deltas["min"], 2),
+                "max": round(deltas["max"], 2),
+            }
+
+        volatile = sorted(
+            books.items(),
+            key=lambda item: (-item[1]["by_change_type"].total(), item[0]),
+        )[:top_books]
+        return {
+            "total_changes": by_change_type.total(),
+            "by_change_type": dict(by_change_type),
+            "by_day": dict(sorted(by_day.items())),
+            "by_category": by_category,
+            "price_deltas": price_deltas,
+            "most_volatile_books": [
+                {
+                    "book_id": book_id,
+                    "book_name": book["book_name"],
+                    "category": categories.get(book_id, "Unknown"),
+                    "changes": book["by_change_type"].total(),
+                    "price_changes": book["price_delta_count"],
+                }
+                for book_id, book in volatile
+            ],
+        }
+
+
+def _parse_price(value: str | None) -> float | None:
+    # Change logs store prices as display strings, e.g. "£51.77"
+    try:
+        return float(value.lstrip("£")) if value is not None else None
+    except ValueError:
+        return None
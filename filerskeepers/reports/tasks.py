@@ -0,0 +1,22 @@
+from typing import Any
+
+from loguru import logger
+
+from filerskeepers.queue.base import TaskContext, WorkerContext
+
+
+async def generate_change_reports_task(ctx: WorkerContext) -> dict[str, Any]:
+    async with TaskContext(ctx) as task_ctx:
+        try:
+            days = await task_ctx.report_service.materialise_missing_days(
+                task_ctx.settings.REPORT_BACKFILL_DAYS
+            )
+            logger.info(f"Generated change reports for {len(days)} days")
+
+            return {
+                "status": "completed",
+                "days_generated": [day.date().isoformat() for day in days],
+            }
+        except Exception as e:
+            logger.error(f"Error in generate_change_reports_task: {e}")
+            return {"status": "failed", "error": str(e)}
@@ -0,0 +1,338 @@
+"""
+Seed a synthetic catalog and record query plans and latency for every filter
+combination the list endpoints support.
+
+Runs against a separate `<MONGODB_DATABASE>_benchmark` database. Results are
+written as JSON; pass a previous results file as `--baseline` to fail (exit 1)
+when a query falls back to a collection scan or examines noticeably more
+documents than it used to.
+
+    $ uv run python -m filerskeepers.scripts.benchmark_indexes --books 50000
+    $ uv run python -m filerskeepers.scripts.benchmark_indexes --skip-seed \\
+        --baseline bench/indexes.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import statistics
+import sys
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Literal
+
+from beanie import Document
+from loguru import logger
+
+from filerskeepers.application.settings import settings
+from filerskeepers.books.models import Book, ChangeLog, ChangeType, FieldChange
+from filerskeepers.books.repositories import (
+    BOOK_SORT_FIELDS,
+    BookRepository,
+    ChangeLogRepository,
+)
+from filerskeepers.db.mongo import init_mongo
+
+
+CATEGORIES = [f"Category {i}" for i in range(50)]
+CHANGE_TYPES: list[ChangeType] = [
+    "new_book",
+    "price_change",
+    "availability_change",
+    "other",
+]
+SortBy = Literal["rating", "price", "reviews"] | None
+PAGE_SIZE = 20
+SEED_BATCH = 5000
+
+
+async def _seed(books: int, changes: int) -> None:
+    await Book.delete_all()
+    await ChangeLog.delete_all()
+    rng = random.Random(42)
+    now = datetime.now(UTC)
+
+    for start in range(0, books, SEED_BATCH):
+        await Book.insert_many(
+            [
+                Book(
+                    name=f"Book {i}",
+                    category=rng.choice(CATEGORIES),
+                    price_excl_tax=round(rng.uniform(10, 60), 2),
+                    price_incl_tax=round(rng.uniform(10, 60), 2),
+                    availability=rng.choice(["In stock", "Out of stock"]),
+                    num_reviews=rng.randint(0, 50),
+                    image_url=f"http://example.com/{i}.jpg",
+                    rating=rng.randint(1, 5),
+                    source_url=f"http://example.com/book/{i}",
+                    content_hash=f"hash-{i}",
+                    created_at=now - timedelta(minutes=i),
+                )
+                for i in range(start, min(start + SEED_BATCH, books))
+            ]
+        )
+    logger.info(f"Seeded {books} books")
+
+    for start in range(0, changes, SEED_BATCH):
+        await ChangeLog.insert_many(
+            [
+                _seed_change_log(rng, books, now - timedelta(seconds=i * 30), i)
+                for i in range(start, min(start + SEED_BATCH, changes))
+            ]
+        )
+    logger.info(f"Seeded {changes} change logs")
+
+
+def _seed_change_log(
+    rng: random.Random, books: int, timestamp: datetime, i: int
+) -> ChangeLog:
+    # Half per field documents, half compact ones holding a few changes
+    book_id = f"book-{rng.randrange(books)}"
+    if i % 2:
+        return ChangeLog(
+            book_id=book_id,
+            book_name="Seeded Book",
+            change_type=rng.choice(CHANGE_TYPES),
+            field_changed="price_incl_tax",
+            old_value="£10.00",
+            new_value="£12.00",
+            timestamp=timestamp,
+        )
+    changes = [
+        FieldChange(
+            field=f"field_{n}",
+            change_type=rng.choice(CHANGE_TYPES),
+            old_value="old",
+            new_value="new",
+        )
+        for n in range(rng.randint(1, 3))
+    ]
+    return ChangeLog(
+        book_id=book_id,
+        book_name="Seeded Book",
+        change_type=changes[0].change_type,
+        changes=changes,
+        timestamp=timestamp,
+    )
+
+
+def _summarise_plan(explain: dict[str, Any]) -> dict[str, Any]:
+    # Pipelines the query layer cannot run whole report their plan in the
+    # $cursor stage
+    if "stages" in explain:
+        explain = explain["stages"][0]["$cursor"]
+    planner = explain["queryPlanner"]["winningPlan"]
+    plan = planner.get("queryPlan", planner)  # SBE nests the classic plan
+    stages: list[str] = []
+    indexes: list[str] = []
+
+    nodes = [plan]
+    while nodes:
+        node = nodes.pop()
+        stages.append(node.get("stage", "?"))
+        if "indexName" in node:
+            indexes.append(node["indexName"])
+        nodes.extend(node.get("inputStages", []))
+        if "inputStage" in node:
+            nodes.append(node["inputStage"])
+
+    stats = explain["executionStats"]
+    return {
+        "stages": stages,
+        "indexes": indexes,
+        "collscan": "COLLSCAN" in stages,
+        "in_memory_sort": "SORT" in stages,
+        "keys_examined": stats["totalKeysExamined"],
+        "docs_examined": stats["totalDocsExamined"],
+        "returned": stats["nReturned"],
+    }
+
+
+async def _explain_page(
+    model: type[Document], filters: list[Any], sort: tuple[str, Any]
+) -> dict[str, Any]:
+    field, direction = sort
+    filter_query = model.find(*filters).get_filter_query()
+    cursor = (
+        model.get_pymongo_collection()
+        .find(filter_query)
+        .sort([(field, int(direction)), ("_id", int(direction))])
+        .limit(PAGE_SIZE + 1)
+    )
+    return _summarise_plan(await cursor.explain())
+
+
+async def _explain_pipeline(
+    model: type[Document], pipeline: list[dict[str, Any]]
+) -> dict[str, Any]:
+    collection = model.get_pymongo_collection()
+    explain = await collection.database.command(
+        {
+            "explain": {
+                "aggregate": collection.name,
+                "pipeline": pipeline,
+                "cursor": {},
+            },
+            "verbosity": "executionStats",
+        }
+    )
+    return _summarise_plan(explain)
+
+
+async def _time_call(repeat: int, call: Any) -> dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        started = perf_counter()
+        await call()
+        samples.append((perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "max_ms": round(samples[-1], 3),
+    }
+
+
+async def _run(repeat: int) -> list[dict[str, Any]]:
+    book_repo = BookRepository()
+    change_log_repo = ChangeLogRepository()
+    results = []
+
+    sort_options: list[SortBy] = [None, "rating", "price", "reviews"]
+    for category, price, rating, sort_by in itertools.product(
+        [None, CATEGORIES[7]], [None, (20.0, 30.0)], [None, 3], sort_options
+    ):
+        params: dict[str, Any] = {
+            "category": category,
+            "min_price": price[0] if price else None,
+            "max_price": price[1] if price else None,
+            "rating": rating,
+        }
+        filters = book_repo.build_filters(**params)
+
+        async def list_books(
+            params: dict[str, Any] = params, sort_by: SortBy = sort_by
+        ) -> None:
+            await book_repo.list_books(**params, sort_by=sort_by, limit=PAGE_SIZE + 1)
+
+        results.append(
+            {
+                "endpoint": "books",
+                "query": {**params, "sort_by": sort_by},
+                "plan": await _explain_page(Book, filters, BOOK_SORT_FIELDS[sort_by]),
+                "latency": await _time_call(repeat, list_books),
+            }
+        )
+
+    for book_id, change_type in itertools.product(
+        [None, "book-7"], [None, "price_change"]
+    ):
+        # The pipeline list_changes runs for the first page
+        pipeline = (
+            ChangeLog.find(
+                *change_log_repo.build_filters(book_id=book_id, change_type=change_type)
+            )
+            .aggregate(
+                change_log_repo.build_page_pipeline(
+                    change_type=change_type, limit=PAGE_SIZE + 1
+                )
+            )
+            .get_aggregation_pipeline()
+        )
+
+        async def list_changes(
+            book_id: str | None = book_id, change_type: str | None = change_type
+        ) -> None:
+            await change_log_repo.list_changes(
+                book_id=book_id, change_type=change_type, limit=PAGE_SIZE + 1
+            )
+
+        results.append(
+            {
+                "endpoint": "changes",
+                "query": {"book_id": book_id, "change_type": change_type},
+                "plan": await _explain_pipeline(ChangeLog, pipeline),
+                "latency": await _time_call(repeat, list_changes),
+            }
+        )
+
+    return results
+
+
+def _find_regressions(
+    results: list[dict[str, Any]], baseline: list[dict[str, Any]], tolerance: float
+) -> list[str]:
+    previous = {
+        json.dumps([r["endpoint"], r["query"]], sort_keys=True): r for r in baseline
+    }
+    regressions = []
+    for result in results:
+        key = json.dumps([result["endpoint"], result["query"]], sort_keys=True)
+        before = previous.get(key)
+        if before is None:
+            continue
+
+        plan, old_plan = result["plan"], before["plan"]
+        if plan["collscan"] and not old_plan["collscan"]:
+            regressions.append(f"{key}: now uses a collection scan")
+        if plan["docs_examined"] > max(old_plan["docs_examined"], 1) * tolerance:
+            regressions.append(
+                f"{key}: docs examined {old_plan['docs_examined']} -> "
+                f"{plan['docs_examined']}"
+            )
+    return regressions
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=50_000)
+    parser.add_argument("--changes", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--skip-seed", action="store_true")
+    parser.add_argument("--output", type=Path, default=Path("bench/indexes.json"))
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=2.0,
+        help="Allowed growth factor of documents examined versus the baseline",
+    )
+    args = parser.parse_args()
+
+    benchmark_settings = settings.model_copy(
+        update={"MONGODB_DATABASE": f"{settings.MONGODB_DATABASE}_benchmark"}
+    )
+    client = await init_mongo(benchmark_settings)
+    try:
+        if not args.skip_seed:
+            await _seed(args.books, args.changes)
+        results = await _run(args.repeat)
+    finally:
+        await client.close()
+
+    for result in results:
+        plan = result["plan"]
+        print(
+            f"{result['endpoint']:<8} {json.dumps(result['query']):<100} "
+            f"{'COLLSCAN' if plan['collscan'] else ','.join(plan['indexes']):<40} "
+            f"docs={plan['docs_examined']:<7} keys={plan['keys_examined']:<7} "
+            f"p50={result['latency']['p50_ms']}ms"
+        )
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2, default=str))
+    logger.info(f"Wrote results to {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = _find_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            logger.error(f"Index regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
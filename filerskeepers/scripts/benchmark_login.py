@@ -0,0 +1,127 @@
+"""
+Measure API latency while a burst of logins is being verified.
+
+The probe requests hit `/ping/v1/noauth` in-process (no Mongo or Redis needed)
+while `--logins` password checks run concurrently, first inline on the event
+loop (the old behaviour) and then through the PasswordHasher thread pool.
+
+    $ uv run python -m filerskeepers.scripts.benchmark_login --logins 50
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+from collections.abc import Awaitable, Callable
+from time import perf_counter
+
+from httpx import ASGITransport, AsyncClient
+from loguru import logger
+
+from filerskeepers.application.app import get_app
+from filerskeepers.application.settings import settings
+from filerskeepers.auth.hashing import PasswordHasher
+from filerskeepers.auth.models import User
+
+
+PASSWORD = "benchmark-password"
+
+
+def _percentile(samples: list[float], percentile: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(percentile / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+async def _probe(client: AsyncClient, stop: asyncio.Event) -> list[float]:
+    # Latency is measured from when each probe was *scheduled* to be sent, so
+    # time spent waiting for a blocked event loop is counted as well
+    interval = 0.01
+    latencies: list[float] = []
+    next_at = perf_counter()
+    while not stop.is_set():
+        next_at += interval
+        await asyncio.sleep(max(0.0, next_at - perf_counter()))
+        response = await client.get("/ping/v1/noauth")
+        response.raise_for_status()
+        latencies.append((perf_counter() - next_at) * 1000)
+    return latencies
+
+
+async def _run_burst(
+    client: AsyncClient,
+    verify: Callable[[], Awaitable[bool]],
+    logins: int,
+) -> tuple[list[float], float]:
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe(client, stop))
+    # Let the probe establish a baseline before the burst starts
+    await asyncio.sleep(0.1)
+
+    started = perf_counter()
+    results = await asyncio.gather(*(verify() for _ in range(logins)))
+    elapsed = perf_counter() - started
+
+    stop.set()
+    latencies = await probe
+    failed = results.count(False)
+    if failed:
+        print(
+            f"{failed} of {logins} password verifications failed during the burst",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    return latencies, elapsed
+
+
+def _report(label: str, latencies: list[float], elapsed: float, logins: int) -> None:
+    print(
+        f"{label:<10} probes={len(latencies):<5} "
+        f"p50={statistics.median(latencies):8.2f}ms "
+        f"p99={_percentile(latencies, 99):8.2f}ms "
+        f"max={max(latencies):8.2f}ms "
+        f"logins/s={logins / elapsed:7.1f}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=settings.PASSWORD_HASH_ROUNDS)
+    parser.add_argument(
+        "--workers", type=int, default=settings.PASSWORD_HASH_MAX_WORKERS
+    )
+    args = parser.parse_args()
+
+    # Keep per-request debug logs from drowning the results
+    logger.remove()
+
+    hasher = PasswordHasher(rounds=args.rounds, max_workers=args.workers)
+    user = User.model_construct(hashed_password=await hasher.hash_password(PASSWORD))
+
+    # The sleep(0) stands in for the user lookup each login awaits first
+    async def verify_inline() -> bool:
+        await asyncio.sleep(0)
+        return user.verify_password(PASSWORD)
+
+    async def verify_offloaded() -> bool:
+        await asyncio.sleep(0)
+        return await hasher.verify_password(user, PASSWORD)
+
+    print(
+        f"Login burst: {args.logins} logins, bcrypt rounds={args.rounds}, "
+        f"hasher workers={args.workers}"
+    )
+    app = get_app(use_lifespan=False)
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://benchmark"
+    ) as client:
+        latencies, elapsed = await _run_burst(client, verify_inline, args.logins)
+        _report("before", latencies, elapsed, args.logins)
+
+        latencies, elapsed = await _run_burst(client, verify_offloaded, args.logins)
+        _report("after", latencies, elapsed, args.logins)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
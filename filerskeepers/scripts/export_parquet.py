@@ -0,0 +1,117 @@
+"""
+Export books and change logs to Parquet files.
+
+With `--incremental` the watermark of the last successful export of each
+dataset is kept in `<output-dir>/watermarks.json`, and every run only exports
+what changed since then, into a new file per run.
+
+    $ uv run python -m filerskeepers.scripts.export_parquet --output-dir exports
+    $ uv run python -m filerskeepers.scripts.export_parquet --incremental
+    $ uv run python -m filerskeepers.scripts.export_parquet \\
+        --dataset change_logs --since 2025-01-01T00:00:00Z
+"""
+
+import argparse
+import asyncio
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import get_args
+
+from loguru import logger
+
+from filerskeepers.application.settings import settings
+from filerskeepers.books.archive import ChangeLogArchive
+from filerskeepers.books.exports import ExportDataset, ExportService
+from filerskeepers.books.repositories import (
+    BookRepository,
+    ChangeLogRepository,
+    ChangeLogSegmentRepository,
+)
+from filerskeepers.db.mongo import init_mongo
+
+
+WATERMARKS_FILE = "watermarks.json"
+
+
+def _load_watermarks(output_dir: Path) -> dict[str, datetime]:
+    path = output_dir / WATERMARKS_FILE
+    if not path.exists():
+        return {}
+    return {
+        dataset: datetime.fromisoformat(value)
+        for dataset, value in json.loads(path.read_text()).items()
+    }
+
+
+def _save_watermarks(output_dir: Path, watermarks: dict[str, datetime]) -> None:
+    path = output_dir / WATERMARKS_FILE
+    # Write then rename, a crash must not leave a half written state file
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(
+        json.dumps({key: value.isoformat() for key, value in watermarks.items()})
+    )
+    tmp_path.replace(path)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--dataset",
+        choices=get_args(ExportDataset),
+        action="append",
+        help="Dataset to export, may be repeated (default: all)",
+    )
+    parser.add_argument("--output-dir", type=Path, default=Path("exports"))
+    parser.add_argument(
+        "--since",
+        type=datetime.fromisoformat,
+        default=None,
+        help="Only export records changed after this ISO timestamp",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=f"Continue from the watermarks in <output-dir>/{WATERMARKS_FILE}",
+    )
+    parser.add_argument("--chunk-size", type=int, default=settings.EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    datasets: list[ExportDataset] = args.dataset or list(get_args(ExportDataset))
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    watermarks = _load_watermarks(args.output_dir) if args.incremental else {}
+
+    client = await init_mongo(settings)
+    try:
+        export_service = ExportService(
+            book_repo=BookRepository(),
+            change_log_repo=ChangeLogRepository(),
+            archive=ChangeLogArchive(
+                change_log_repo=ChangeLogRepository(),
+                segment_repo=ChangeLogSegmentRepository(),
+            ),
+            chunk_size=args.chunk_size,
+        )
+        for dataset in datasets:
+            since = args.since or watermarks.get(dataset)
+            suffix = since.strftime("%Y%m%dT%H%M%S") if since else "full"
+            path = args.output_dir / f"{dataset}_{suffix}.parquet"
+
+            result = await export_service.export(dataset, path, since=since)
+            final_path = path.with_name(
+                f"{dataset}_{suffix}_{result.until.strftime('%Y%m%dT%H%M%S')}.parquet"
+            )
+            path.replace(final_path)
+            print(f"{dataset:<12} rows={result.rows:<8} {final_path}")
+
+            if args.incremental:
+                watermarks[dataset] = result.until
+                _save_watermarks(args.output_dir, watermarks)
+    finally:
+        await client.close()
+
+    logger.info("Export finished")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,26 +1,105 @@
+"""
+Crawl every book on this machine, without arq.
+
+The crawl runs as a pipeline: book pages are fetched, parsed in a process
+pool and stored in batches, each stage with its own workers and a bounded
+queue in front of it. Throughput per stage is logged at the end. The crawl
+checkpoints into CrawlMetadata like the worker's, and an incomplete crawl of
+the last 24 hours is resumed.
+
+Without `--redis` nothing but MongoDB is needed, which suits backfills. With
+it the crawl shares the politeness budget, retry queue and circuit breaker
+of the workers, invalidates the API cache and publishes the changes, and
+does not start while a crawl of the workers is running.
+
+    $ uv run python -m filerskeepers.scripts.run_crawl
+    $ uv run python -m filerskeepers.scripts.run_crawl --redis --parse-workers 8
+"""
+
+import argparse
 import asyncio
+import os
+from contextlib import suppress
 
 from loguru import logger
 
 from filerskeepers.application.settings import settings
-from filerskeepers.books.repositories import BookRepository, ChangeLogRepository
+from filerskeepers.books.cache import BookCache
+from filerskeepers.books.feed import ChangeFeed
+from filerskeepers.books.repositories import (
+    BookRepository,
+    ChangeLogRepository,
+    PriceObservationRepository,
+)
 from filerskeepers.books.services import BookService
+from filerskeepers.crawler.breaker import CircuitBreaker, CircuitOpenError
+from filerskeepers.crawler.lease import Lease, LeaseLostError
 from filerskeepers.crawler.models import CrawlMetadata, CrawlStatus
+from filerskeepers.crawler.pipeline import CrawlPipeline
+from filerskeepers.crawler.politeness import HostTokenBucket
 from filerskeepers.crawler.repositories import CrawlMetadataRepository
+from filerskeepers.crawler.retries import RetryQueue
 from filerskeepers.crawler.services import CrawlerService
 from filerskeepers.db.mongo import init_mongo
+from filerskeepers.db.redis import get_redis_connection, get_redis_pool
 
 
 async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--redis",
+        action="store_true",
+        help="Share the workers' Redis budget, retries, breaker, cache and feed",
+    )
+    parser.add_argument(
+        "--parse-workers", type=int, default=settings.PIPELINE_PARSE_WORKERS
+    )
+    parser.add_argument(
+        "--persist-workers", type=int, default=settings.PIPELINE_PERSIST_WORKERS
+    )
+    parser.add_argument("--batch-size", type=int, default=settings.PIPELINE_BATCH_SIZE)
+    parser.add_argument("--queue-size", type=int, default=settings.PIPELINE_QUEUE_SIZE)
+    args = parser.parse_args()
+
     logger.info("Initializing database connection...")
-    await init_mongo(settings)
+    client = await init_mongo(settings)
 
     logger.info("Initializing dependencies...")
     crawl_metadata_repo = CrawlMetadataRepository()
-    crawler_service = CrawlerService()
+    lease = None
+    if args.redis:
+        redis_client = get_redis_connection(get_redis_pool(settings))
+        # Not alongside a crawl of the workers
+        lease = Lease(redis_client, "crawl", owner=f"run_crawl:{os.getpid()}")
+        if not await lease.acquire():
+            logger.warning(f"A crawl is already running: {await lease.holder()}")
+            await client.close()
+            return
+        crawler_service = CrawlerService(
+            politeness=HostTokenBucket(redis_client=redis_client),
+            retry_queue=RetryQueue(redis_client=redis_client),
+            breaker=CircuitBreaker(redis_client=redis_client),
+        )
+        cache, feed = BookCache(redis_client), ChangeFeed(redis_client)
+    else:
+        crawler_service = CrawlerService()
+        cache, feed = None, None
     book_service = BookService(
         book_repo=BookRepository(),
         change_log_repo=ChangeLogRepository(),
+        price_history_repo=PriceObservationRepository(),
+        cache=cache,
+        feed=feed,
+    )
+    pipeline = CrawlPipeline(
+        crawler_service,
+        book_service,
+        parse_workers=args.parse_workers,
+        persist_workers=args.persist_workers,
+        batch_size=args.batch_size,
+        queue_size=args.queue_size,
     )
 
     # Check for incomplete crawl
@@ -32,80 +111,100 @@ async def main() -> None:
             f"(last crawled: {incomplete_crawl.last_page_crawled})"
         )
         metadata = incomplete_crawl
+        if lease and lease.token:
+            # Taken over, fencing off the crawl that held it before
+            await crawl_metadata_repo.update_fenced(metadata, lease.token)
     else:
         start_page = 1
         logger.info("Starting new crawl from page 1")
         metadata = CrawlMetadata(
             url=crawler_service.BASE_URL,
             status=CrawlStatus.IN_PROGRESS,
+            lease_token=lease.token if lease else None,
         )
         await crawl_metadata_repo.create(metadata)
 
-    logger.info(f"Starting crawl from {crawler_service.BASE_URL}")
     books_crawled = metadata.books_crawled
-    books_processed = 0
-    errors: list[str] = list(metadata.error_messages)
-    last_page = metadata.last_page_crawled
+    books_unchanged = metadata.books_unchanged
+    errors_count = metadata.errors_count
+
+    def update_counts() -> None:
+        counts = pipeline.counts
+        metadata.books_crawled = (
+            books_crawled + counts["created"] + counts["updated"] + counts["unchanged"]
+        )
+        metadata.books_unchanged = books_unchanged + counts["skipped"]
+        metadata.concurrency = crawler_service.concurrency.window
+        metadata.errors_count = errors_count + counts["error"]
+
+    async def save() -> None:
+        if lease is None or lease.token is None:
+            await crawl_metadata_repo.update(metadata)
+        elif not await crawl_metadata_repo.update_fenced(metadata, lease.token):
+            # A crawl of the workers took over after our lease expired
+            raise LeaseLostError(lease.name, lease.token)
+
+    async def checkpoint(page: int) -> None:
+        if lease:
+            lease.check()
+        metadata.last_page_crawled = page
+        update_counts()
+        await save()
+        logger.info(f"Checkpoint: Completed page {page}")
 
+    logger.info(f"Starting crawl from {crawler_service.BASE_URL}")
     try:
-        async for book_dto, page_num in crawler_service.crawl_all_books(
-            start_page=start_page, crawl_id=str(metadata.id)
-        ):
-            books_crawled += 1
-            logger.info(
-                f"[Page {page_num}] Crawled book #{books_crawled}: {book_dto.name}"
-            )
-
-            # Process the book immediately
-            try:
-                result = await book_service.process_crawled_book(book_dto)
-                books_processed += 1
-                status = result.get("status")
-                logger.info(f"Processed book '{book_dto.name}': status={status}")
-            except Exception as e:
-                error_msg = f"Failed to process book '{book_dto.name}': {e}"
-                logger.error(error_msg)
-                errors.append(error_msg)
-
-            # Update checkpoint if we've moved to a new page
-            if page_num > last_page:
-                last_page = page_num
-                metadata.last_page_crawled = last_page
-                metadata.books_crawled = books_crawled
-                metadata.errors_count = len(errors)
-                metadata.error_messages = errors[:100]
-                await crawl_metadata_repo.update(metadata)
-                logger.info(f"Checkpoint: Completed page {last_page}")
+        counts = await pipeline.run(
+            start_page=start_page, crawl_id=str(metadata.id), checkpoint=checkpoint
+        )
 
         # Mark crawl as complete
-        if not errors:
+        update_counts()
+        if not metadata.errors_count:
             metadata.status = CrawlStatus.SUCCESS
-        elif books_crawled > 0:
+        elif metadata.books_crawled + metadata.books_unchanged > 0:
             metadata.status = CrawlStatus.PARTIAL
         else:
             metadata.status = CrawlStatus.FAILED
 
         metadata.is_complete = True
-        metadata.books_crawled = books_crawled
-        metadata.errors_count = len(errors)
-        metadata.error_messages = errors[:100]
-        await crawl_metadata_repo.update(metadata)
+        await save()
 
         logger.info(
-            f"Crawl completed successfully. "
-            f"Total books crawled: {books_crawled}, "
-            f"processed: {books_processed}, "
-            f"errors: {len(errors)}, "
+            f"Crawl completed. "
+            f"Created: {counts.get('created', 0)}, "
+            f"updated: {counts.get('updated', 0)}, "
+            f"unchanged: {counts.get('unchanged', 0)}, "
+            f"not modified: {counts.get('skipped', 0)}, "
+            f"errors: {counts.get('error', 0)}, "
             f"status: {metadata.status}"
         )
 
+    except CircuitOpenError as e:
+        # Parked, the next run resumes after the last page stored
+        logger.warning(f"Crawl parked after page {metadata.last_page_crawled}: {e}")
+        update_counts()
+        metadata.status = CrawlStatus.PARTIAL
+        with suppress(LeaseLostError):
+            await save()
+
+    except LeaseLostError as e:
+        # A crawl of the workers took over, the crawl's state is now its to write
+        logger.warning(f"Crawl superseded after page {metadata.last_page_crawled}: {e}")
+
     except Exception as e:
         logger.error(f"Error during crawl: {e}")
         metadata.status = CrawlStatus.FAILED
         metadata.error_messages.append(f"Fatal error: {str(e)}")
-        await crawl_metadata_repo.update(metadata)
+        with suppress(LeaseLostError):
+            await save()
         raise
 
+    finally:
+        if lease:
+            await lease.release()
+        await client.close()
+
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -4,14 +4,17 @@ from arq import ArqRedis
 from arq.jobs import Job
 
 from filerskeepers.application.settings import settings
-from filerskeepers.queue.arq import get_arq_redis
+from filerskeepers.queue.arq import Priority, Queue, enqueue_job, get_arq_redis
 
 
 async def start_crawl() -> None:
     arq_redis: ArqRedis = await get_arq_redis(settings)
 
     try:
-        job = await arq_redis.enqueue_job("crawl_books_task")
+        # Ahead of the daily crawl, should it be waiting for a worker
+        job = await enqueue_job(
+            arq_redis, "crawl_books_task", queue=Queue.CRAWL, priority=Priority.HIGH
+        )
         assert isinstance(job, Job)
         print()
         print("✓ Crawl task enqueued successfully")
@@ -1,28 +1,89 @@
+import gzip
+import json
+import re
+from collections.abc import AsyncIterator
+from contextlib import aclosing
 from datetime import datetime
+from pathlib import Path
+from tempfile import NamedTemporaryFile
 from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    status,
+)
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
 
 from filerskeepers.auth.dependencies import get_current_user
 from filerskeepers.auth.models import User
-from filerskeepers.books.dependencies import get_book_service
+from filerskeepers.books.dependencies import (
+    get_book_service,
+    get_change_feed_broadcaster,
+    get_export_service,
+)
 from filerskeepers.books.dtos import (
     BookListResponse,
     BookResponse,
     ChangeLogListResponse,
+    PriceHistoryResponse,
 )
+from filerskeepers.books.exports import ExportDataset, ExportService
+from filerskeepers.books.feed import ChangeFeedBroadcaster
+from filerskeepers.books.repositories import HistoryInterval
 from filerskeepers.books.services import BookService
+from filerskeepers.reports.dependencies import get_report_service
+from filerskeepers.reports.models import ReportFormat
+from filerskeepers.reports.services import ReportService
 
 
 books_router = APIRouter(dependencies=[Depends(get_current_user)])
 
+REPORT_MEDIA_TYPES = {
+    "json": "application/json",
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "summary": "application/json",
+}
+
+STREAM_ID_PATTERN = re.compile(r"^\d+-\d+$")
+
+
+def _accepts_gzip(accept_encoding: str | None) -> bool:
+    """
+    Whether gzip has a q-value above 0 in Accept-Encoding, set on gzip itself
+    or else on `*`. Unlisted codings are not acceptable.
+    """
+    weights: dict[str, float] = {}
+    for coding in (accept_encoding or "").split(","):
+        name, *params = (part.strip() for part in coding.split(";"))
+        weight = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if name:
+            weights[name.lower()] = weight
+    return weights.get("gzip", weights.get("*", 0.0)) > 0
+
 
 @books_router.get(
     "",
     response_model=BookListResponse,
     status_code=status.HTTP_200_OK,
     summary="List books",
-    description="Get a paginated list of books with optional filtering and sorting",
+    description=(
+        "Get a paginated list of books with optional filtering and sorting. "
+        "Pass next_cursor back as cursor for constant cost deep pagination"
+    ),
 )
 async def list_books(
     book_service: Annotated[BookService, Depends(get_book_service)],
@@ -42,9 +103,17 @@ async def list_books(
     ] = None,
     page: Annotated[int, Query(description="Page number", ge=1)] = 1,
     page_size: Annotated[int, Query(description="Page size", ge=1, le=100)] = 10,
+    cursor: Annotated[
+        str | None,
+        Query(description="Cursor from a previous next_cursor, overrides page"),
+    ] = None,
+    include_total: Annotated[
+        bool, Query(description="Set to false to skip counting the total")
+    ] = True,
     current_user: User = Depends(get_current_user),
-) -> BookListResponse:
-    return await book_service.list_books(
+) -> Response:
+    # Return the (possibly cached) serialised response as-is
+    payload = await book_service.list_books_payload(
         category=category,
         min_price=min_price,
         max_price=max_price,
@@ -52,28 +121,10 @@ async def list_books(
         sort_by=sort_by,
         page=page,
         page_size=page_size,
+        cursor=cursor,
+        include_total=include_total,
     )
-
-
-@books_router.get(
-    "/{book_id}",
-    response_model=BookResponse,
-    status_code=status.HTTP_200_OK,
-    summary="Get book by ID",
-    description="Get full details of a specific book",
-)
-async def get_book(
-    book_id: str,
-    book_service: Annotated[BookService, Depends(get_book_service)],
-    current_user: User = Depends(get_current_user),
-) -> BookResponse:
-    book = await book_service.get_book(book_id)
-    if not book:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Book with ID {book_id} not found",
-        )
-    return book
+    return Response(content=payload, media_type="application/json")
 
 
 @books_router.get(
@@ -81,14 +132,18 @@ async def get_book(
     status_code=status.HTTP_200_OK,
     summary="Generate change report",
     description=(
-        "Generate a downloadable change report in JSON or CSV format for a "
-        "specific date range (default: last 24 hours)"
+        "Download a change report in JSON, CSV, NDJSON or summary format for a "
+        "specific date range (default: last 24 hours). The summary is aggregated "
+        "in the database: counts per change type, category and day, price delta "
+        "statistics and the most volatile books. Whole UTC days are served from "
+        "precomputed reports with an ETag"
     ),
 )
 async def generate_change_report(
-    book_service: Annotated[BookService, Depends(get_book_service)],
+    report_service: Annotated[ReportService, Depends(get_report_service)],
     format_type: Annotated[
-        Literal["json", "csv"], Query(alias="format", description="Report format")
+        ReportFormat,
+        Query(alias="format", description="Report format"),
     ] = "json",
     start_date: Annotated[
         datetime | None,
@@ -97,26 +152,48 @@ async def generate_change_report(
     end_date: Annotated[
         datetime | None, Query(description="End date (ISO format, default: now)")
     ] = None,
+    if_none_match: Annotated[str | None, Header()] = None,
+    accept_encoding: Annotated[str | None, Header()] = None,
     current_user: User = Depends(get_current_user),
 ) -> Response:
-    report_content = await book_service.generate_change_report(
-        start_date=start_date,
-        end_date=end_date,
-        format_type=format_type,
+    # Set appropriate content type and filename
+    media_type = REPORT_MEDIA_TYPES[format_type]
+    extension = "json" if format_type == "summary" else format_type
+    filename = f"change_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+
+    report = await report_service.get_precomputed_report(
+        start_date, end_date, format_type
     )
+    if report is not None:
+        headers["ETag"] = report.etag
+        if if_none_match and report.etag in [
+            tag.strip() for tag in if_none_match.split(",")
+        ]:
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED,
+                headers={"ETag": report.etag},
+            )
 
-    # Set appropriate content type and filename
-    if format_type == "json":
-        media_type = "application/json"
-        filename = f"change_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    else:
-        media_type = "text/csv"
-        filename = f"change_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-
-    return Response(
-        content=report_content,
+        # Stored gzipped, only decompressed for clients that cannot take it
+        headers["Vary"] = "Accept-Encoding"
+        if _accepts_gzip(accept_encoding):
+            headers["Content-Encoding"] = "gzip"
+            return Response(report.content, media_type=media_type, headers=headers)
+        return Response(
+            gzip.decompress(report.content), media_type=media_type, headers=headers
+        )
+
+    # Checked up front, a stream cannot change its status once it started
+    await report_service.check_archive(start_date, end_date)
+    return StreamingResponse(
+        report_service.stream_change_report(
+            start_date=start_date,
+            end_date=end_date,
+            format_type=format_type,
+        ),
         media_type=media_type,
-        headers={"Content-Disposition": f"attachment; filename={filename}"},
+        headers=headers,
     )
 
 
@@ -125,7 +202,11 @@ async def generate_change_report(
     response_model=ChangeLogListResponse,
     status_code=status.HTTP_200_OK,
     summary="List changes",
-    description=("Get paginated list of recent changes"),
+    description=(
+        "Get paginated list of recent changes. Changes older than the hot "
+        "retention are archived and only listed when start_date reaches back "
+        "to them"
+    ),
 )
 async def list_changes(
     book_service: Annotated[BookService, Depends(get_book_service)],
@@ -134,13 +215,181 @@ async def list_changes(
         Literal["new_book", "price_change", "availability_change", "other"] | None,
         Query(description="Filter by change type"),
     ] = None,
+    start_date: Annotated[
+        datetime | None,
+        Query(description="Only changes at or after this time (ISO format)"),
+    ] = None,
+    end_date: Annotated[
+        datetime | None,
+        Query(description="Only changes at or before this time (ISO format)"),
+    ] = None,
     page: Annotated[int, Query(description="Page number", ge=1)] = 1,
     page_size: Annotated[int, Query(description="Page size", ge=1, le=100)] = 10,
+    cursor: Annotated[
+        str | None,
+        Query(description="Cursor from a previous next_cursor, overrides page"),
+    ] = None,
+    include_total: Annotated[
+        bool, Query(description="Set to false to skip counting the total")
+    ] = True,
     current_user: User = Depends(get_current_user),
 ) -> ChangeLogListResponse:
     return await book_service.list_changes(
         book_id=book_id,
         change_type=change_type,
+        start_date=start_date,
+        end_date=end_date,
         page=page,
         page_size=page_size,
+        cursor=cursor,
+        include_total=include_total,
     )
+
+
+@books_router.get(
+    "/changes/stream",
+    status_code=status.HTTP_200_OK,
+    summary="Stream changes",
+    description=(
+        "Server-Sent Events stream of changes as they are logged, one `change` "
+        "event per change with the ChangeLogResponse as data. Reconnecting "
+        "clients send the Last-Event-ID header to receive what they missed"
+    ),
+    response_class=StreamingResponse,
+)
+async def stream_changes(
+    broadcaster: Annotated[ChangeFeedBroadcaster, Depends(get_change_feed_broadcaster)],
+    book_id: Annotated[str | None, Query(description="Filter by book ID")] = None,
+    change_type: Annotated[
+        Literal["new_book", "price_change", "availability_change", "other"] | None,
+        Query(description="Filter by change type"),
+    ] = None,
+    last_event_id: Annotated[
+        str | None, Header(description="ID of the last event received")
+    ] = None,
+    current_user: User = Depends(get_current_user),
+) -> StreamingResponse:
+    if last_event_id is not None and not STREAM_ID_PATTERN.match(last_event_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid Last-Event-ID",
+        )
+
+    async def events() -> AsyncIterator[str]:
+        async with aclosing(
+            broadcaster.subscribe(
+                last_event_id=last_event_id, change_type=change_type, book_id=book_id
+            )
+        ) as subscription:
+            async for event in subscription:
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                event_id, change = event
+                yield f"id: {event_id}\nevent: change\ndata: {json.dumps(change)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@books_router.get(
+    "/export",
+    status_code=status.HTTP_200_OK,
+    summary="Export as Parquet",
+    description=(
+        "Download books (without HTML snapshots) or change logs as a zstd "
+        "compressed Parquet file. Pass the X-Export-Until header of a previous "
+        "export as since to only get what changed after it"
+    ),
+)
+async def export_parquet(
+    export_service: Annotated[ExportService, Depends(get_export_service)],
+    dataset: Annotated[ExportDataset, Query(description="Dataset to export")],
+    since: Annotated[
+        datetime | None,
+        Query(description="Only records changed after this time (ISO format)"),
+    ] = None,
+    current_user: User = Depends(get_current_user),
+) -> FileResponse:
+    # Written to disk first, Parquet needs its footer before it can be read
+    with NamedTemporaryFile(suffix=".parquet", delete=False) as tmp_file:
+        path = Path(tmp_file.name)
+    try:
+        result = await export_service.export(dataset, path, since=since)
+    except Exception:
+        path.unlink(missing_ok=True)
+        raise
+
+    filename = f"{dataset}_{result.until.strftime('%Y%m%d_%H%M%S')}.parquet"
+    return FileResponse(
+        path,
+        media_type="application/vnd.apache.parquet",
+        filename=filename,
+        headers={
+            "X-Export-Rows": str(result.rows),
+            "X-Export-Until": result.until.isoformat(),
+        },
+        background=BackgroundTask(path.unlink, missing_ok=True),
+    )
+
+
+@books_router.get(
+    "/{book_id}/history",
+    response_model=PriceHistoryResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Get price history",
+    description=(
+        "Get a book's price and availability as observed by each crawl, "
+        "downsampled to one point per day, week or month (min, max and last "
+        "price), or every observation with interval=raw"
+    ),
+)
+async def get_price_history(
+    book_id: str,
+    book_service: Annotated[BookService, Depends(get_book_service)],
+    interval: Annotated[
+        HistoryInterval, Query(description="Length of each point")
+    ] = "day",
+    start_date: Annotated[
+        datetime | None,
+        Query(description="Start date (ISO format, default: a year before end)"),
+    ] = None,
+    end_date: Annotated[
+        datetime | None,
+        Query(description="End date (ISO format, default: now)"),
+    ] = None,
+    current_user: User = Depends(get_current_user),
+) -> PriceHistoryResponse:
+    history = await book_service.get_price_history(
+        book_id, interval=interval, start_date=start_date, end_date=end_date
+    )
+    if not history:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Book with ID {book_id} not found",
+        )
+    return history
+
+
+@books_router.get(
+    "/{book_id}",
+    response_model=BookResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Get book by ID",
+    description="Get full details of a specific book",
+)
+async def get_book(
+    book_id: str,
+    book_service: Annotated[BookService, Depends(get_book_service)],
+    current_user: User = Depends(get_current_user),
+) -> BookResponse:
+    book = await book_service.get_book(book_id)
+    if not book:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Book with ID {book_id} not found",
+        )
+    return book
@@ -2,6 +2,8 @@ import pytest
 from fastapi import HTTPException
 
 from filerskeepers.auth.dtos import LoginRequest, RegisterRequest
+from filerskeepers.auth.hashing import PasswordHasher
+from filerskeepers.auth.repositories import UserRepository
 from filerskeepers.auth.services import AuthService
 from tests.base import TestBase
 
@@ -11,9 +13,11 @@ class TestAuthService(TestBase):
     async def setup(
         self,
         auth_service: AuthService,
+        user_repository: UserRepository,
         cleanup: None,
     ) -> None:
         self.auth_service = auth_service
+        self.user_repo = user_repository
 
     @pytest.mark.anyio
     async def test_register_success(self) -> None:
@@ -32,6 +36,30 @@ class TestAuthService(TestBase):
         assert response.id is not None
         assert response.created_at is not None
 
+    @pytest.mark.anyio
+    async def test_register_hashes_with_configured_rounds(self) -> None:
+        # Given
+        auth_service = AuthService(
+            user_repository=self.user_repo,
+            hasher=PasswordHasher(rounds=4, max_workers=1),
+        )
+        request = RegisterRequest(
+            email="rounds@example.com",
+            password="securepassword123",
+        )
+
+        # When
+        await auth_service.register(request)
+        response = await auth_service.login(
+            LoginRequest(email="rounds@example.com", password="securepassword123")
+        )
+
+        # Then
+        user = await self.user_repo.find_by_email("rounds@example.com")
+        assert user is not None
+        assert user.hashed_password.startswith("$2b$04$")
+        assert response.message == "Login successful"
+
     @pytest.mark.anyio
     async def test_register_duplicate_email(self) -> None:
         # Given
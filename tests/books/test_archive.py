@@ -0,0 +1,158 @@
+import json
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from filerskeepers.books.archive import (
+    ArchiveNotDurableError,
+    ChangeLogArchive,
+    SegmentMissingError,
+)
+from filerskeepers.books.models import ChangeLog
+from filerskeepers.books.repositories import (
+    BookRepository,
+    ChangeLogRepository,
+    ChangeLogSegmentRepository,
+    PriceObservationRepository,
+)
+from filerskeepers.books.services import BookService
+from filerskeepers.reports.repositories import ChangeReportRepository
+from filerskeepers.reports.services import ReportService
+from tests.base import TestBase
+
+
+class TestChangeLogArchive(TestBase):
+    @pytest.fixture(autouse=True)
+    async def setup(
+        self,
+        book_repository: BookRepository,
+        change_log_repository: ChangeLogRepository,
+        change_log_segment_repository: ChangeLogSegmentRepository,
+        price_observation_repository: PriceObservationRepository,
+        change_report_repository: ChangeReportRepository,
+        change_log_archive: ChangeLogArchive,
+        cleanup: None,
+    ) -> None:
+        self.change_log_repo = change_log_repository
+        self.segment_repo = change_log_segment_repository
+        self.archive = change_log_archive
+        self.book_service = BookService(
+            book_repo=book_repository,
+            change_log_repo=change_log_repository,
+            price_history_repo=price_observation_repository,
+            archive=change_log_archive,
+        )
+        self.report_service = ReportService(
+            change_log_repo=change_log_repository,
+            report_repo=change_report_repository,
+            archive=change_log_archive,
+        )
+        self.now = datetime.now(UTC)
+
+    async def _create_change(self, name: str, days_ago: int) -> None:
+        await ChangeLog(
+            book_id=f"id-{name}",
+            book_name=name,
+            change_type="price_change",
+            field_changed="price_incl_tax",
+            old_value="£10.00",
+            new_value="£12.00",
+            timestamp=self.now - timedelta(days=days_ago),
+        ).insert()
+
+    @pytest.mark.anyio
+    async def test_archive_expired_moves_old_days_to_segments(self) -> None:
+        # Given - hot retention is 30 days
+        await self._create_change("Old", days_ago=45)
+        await self._create_change("Older", days_ago=46)
+        await self._create_change("Recent", days_ago=2)
+
+        # When
+        segments = await self.archive.archive_expired()
+        again = await self.archive.archive_expired()
+
+        # Then
+        assert len(segments) == 2
+        assert again == []
+        assert all(Path(segment.path).exists() for segment in segments)
+        assert [change.book_name for change in await ChangeLog.find().to_list()] == [
+            "Recent"
+        ]
+        assert await self.archive.boundary() == max(
+            segment.end_date for segment in segments
+        ).replace(tzinfo=UTC)
+
+    @pytest.mark.anyio
+    async def test_list_changes_and_reports_federate_into_the_archive(self) -> None:
+        # Given
+        for name, days_ago in [("Old", 45), ("Older", 46), ("Recent", 2)]:
+            await self._create_change(name, days_ago)
+        await self.archive.archive_expired()
+        start_date = self.now - timedelta(days=60)
+
+        # When - a page boundary falls between the hot tier and the archive
+        first = await self.book_service.list_changes(start_date=start_date, page_size=2)
+        second = await self.book_service.list_changes(
+            start_date=start_date, page_size=2, cursor=first.next_cursor
+        )
+        hot_only = await self.book_service.list_changes()
+        ndjson = await self.report_service.generate_change_report(
+            start_date=start_date, end_date=self.now, format_type="ndjson"
+        )
+        summary = json.loads(
+            await self.report_service.generate_change_report(
+                start_date=start_date, end_date=self.now, format_type="summary"
+            )
+        )
+
+        # Then
+        assert first.total == 3
+        assert [change.book_name for change in first.changes + second.changes] == [
+            "Recent",
+            "Old",
+            "Older",
+        ]
+        assert second.next_cursor is None
+        assert hot_only.total == 1
+        assert [json.loads(line)["book_name"] for line in ndjson.splitlines()] == [
+            "Recent",
+            "Old",
+            "Older",
+        ]
+        assert summary["total_changes"] == 3
+        assert summary["price_deltas"]["count"] == 3
+        assert summary["by_category"]["Unknown"]["total"] == 3
+
+    @pytest.mark.anyio
+    async def test_archive_refuses_a_relative_directory(self) -> None:
+        # Given
+        await self._create_change("Old", days_ago=45)
+        archive = ChangeLogArchive(
+            change_log_repo=self.change_log_repo,
+            segment_repo=self.segment_repo,
+            directory=Path("archive/change_logs"),
+            hot_days=30,
+        )
+
+        # When / Then - nothing is deleted from Mongo
+        with pytest.raises(ArchiveNotDurableError):
+            await archive.archive_expired()
+        assert await ChangeLog.count() == 1
+        assert await self.archive.boundary() is None
+
+    @pytest.mark.anyio
+    async def test_missing_segment_is_reported_not_read(self) -> None:
+        # Given - an archived day whose file is gone
+        await self._create_change("Old", days_ago=45)
+        [segment] = await self.archive.archive_expired()
+        Path(segment.path).unlink()
+        start_date = self.now - timedelta(days=60)
+
+        # When / Then
+        with pytest.raises(SegmentMissingError):
+            await self.book_service.list_changes(start_date=start_date)
+        with pytest.raises(SegmentMissingError):
+            await self.report_service.check_archive(start_date, self.now)
+        with pytest.raises(SegmentMissingError):
+            await self.archive.archive_day(segment.start_date)
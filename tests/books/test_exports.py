@@ -0,0 +1,106 @@
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+import pyarrow.parquet as pq
+import pytest
+
+from filerskeepers.books.archive import ChangeLogArchive
+from filerskeepers.books.exports import ExportService
+from filerskeepers.books.models import Book, ChangeLog
+from filerskeepers.books.repositories import BookRepository, ChangeLogRepository
+from tests.base import TestBase
+
+
+class TestExportService(TestBase):
+    @pytest.fixture(autouse=True)
+    async def setup(
+        self,
+        book_repository: BookRepository,
+        change_log_repository: ChangeLogRepository,
+        change_log_archive: ChangeLogArchive,
+        cleanup: None,
+    ) -> None:
+        self.book_repo = book_repository
+        self.change_log_repo = change_log_repository
+        self.archive = change_log_archive
+        self.service = ExportService(
+            book_repo=book_repository,
+            change_log_repo=change_log_repository,
+            archive=change_log_archive,
+            chunk_size=2,
+        )
+
+    @pytest.mark.anyio
+    async def test_export_books_is_incremental_and_typed(self, tmp_path: Path) -> None:
+        # Given
+        now = datetime.now(UTC)
+        for i, hours_ago in enumerate([5, 4, 3, 2]):
+            await Book(
+                name=f"Book {i}",
+                category="Fiction",
+                price_excl_tax=10.0 + i,
+                price_incl_tax=12.0 + i,
+                availability="In stock",
+                rating=4,
+                image_url=f"http://example.com/{i}.jpg",
+                source_url=f"http://example.com/book{i}",
+                html_snapshot="<html>large</html>",
+                content_hash=f"hash_{i}",
+                updated_at=now - timedelta(hours=hours_ago),
+            ).insert()
+
+        # When
+        full = await self.service.export("books", tmp_path / "full.parquet")
+        incremental = await self.service.export(
+            "books",
+            tmp_path / "incremental.parquet",
+            since=now - timedelta(hours=3, minutes=30),
+        )
+
+        # Then
+        table = pq.read_table(tmp_path / "full.parquet")
+        assert full.rows == 4
+        assert pq.ParquetFile(tmp_path / "full.parquet").metadata.num_row_groups == 2
+        assert "html_snapshot" not in table.column_names
+        assert str(table.schema.field("price_incl_tax").type) == "double"
+        assert table.column("name").to_pylist() == [f"Book {i}" for i in range(4)]
+        assert incremental.rows == 2
+        assert pq.read_table(tmp_path / "incremental.parquet").column(
+            "name"
+        ).to_pylist() == ["Book 2", "Book 3"]
+
+    @pytest.mark.anyio
+    async def test_export_change_logs_includes_archived_days(
+        self, tmp_path: Path
+    ) -> None:
+        # Given - hot retention is 30 days, two days of changes archived
+        now = datetime.now(UTC)
+        for name, days_ago in [("Older", 46), ("Old", 45), ("Recent", 2)]:
+            await ChangeLog(
+                book_id=f"id-{name}",
+                book_name=name,
+                change_type="price_change",
+                field_changed="price_incl_tax",
+                old_value="£10.00",
+                new_value="£12.00",
+                timestamp=now - timedelta(days=days_ago),
+            ).insert()
+        assert len(await self.archive.archive_expired()) == 2
+
+        # When
+        full = await self.service.export("change_logs", tmp_path / "full.parquet")
+        incremental = await self.service.export(
+            "change_logs",
+            tmp_path / "incremental.parquet",
+            since=now - timedelta(days=45, hours=12),
+        )
+
+        # Then - oldest first, across the archive boundary
+        assert full.rows == 3
+        assert pq.read_table(tmp_path / "full.parquet").column(
+            "book_name"
+        ).to_pylist() == ["Older", "Old", "Recent"]
+        assert incremental.rows == 2
+        assert pq.read_table(tmp_path / "incremental.parquet").column(
+            "book_name"
+        ).to_pylist() == ["Old", "Recent"]
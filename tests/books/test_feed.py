@@ -0,0 +1,85 @@
+import asyncio
+from collections.abc import AsyncGenerator
+
+import pytest
+import redis.asyncio as redis
+
+from filerskeepers.books.feed import ChangeFeed, ChangeFeedBroadcaster, FeedEvent
+from filerskeepers.books.repositories import (
+    BookRepository,
+    ChangeLogRepository,
+    PriceObservationRepository,
+)
+from filerskeepers.books.services import BookService
+from filerskeepers.crawler.dtos import CrawledBookDto
+from tests.base import TestBase
+
+
+class TestChangeFeed(TestBase):
+    @pytest.fixture(autouse=True)
+    async def setup(
+        self,
+        book_repository: BookRepository,
+        change_log_repository: ChangeLogRepository,
+        price_observation_repository: PriceObservationRepository,
+        redis_connection: redis.Redis,
+        cleanup: None,
+    ) -> None:
+        self.service = BookService(
+            book_repo=book_repository,
+            change_log_repo=change_log_repository,
+            price_history_repo=price_observation_repository,
+            feed=ChangeFeed(redis_client=redis_connection),
+        )
+        self.broadcaster = ChangeFeedBroadcaster(
+            redis_client=redis_connection, heartbeat=0.1, block_ms=100
+        )
+        self.crawled = CrawledBookDto(
+            name="Streamed Book",
+            category="Fiction",
+            price_excl_tax=10.0,
+            price_incl_tax=12.0,
+            availability="In stock",
+            rating=4,
+            source_url="http://example.com/streamed",
+            content_hash="streamed_hash",
+        )
+
+    @staticmethod
+    async def _next_change(subscription: AsyncGenerator[FeedEvent | None]) -> FeedEvent:
+        # Skips heartbeats
+        while True:
+            event = await asyncio.wait_for(anext(subscription), 5)
+            if event is not None:
+                return event
+
+    @pytest.mark.anyio
+    async def test_subscribers_resume_from_last_event_id_with_filters(self) -> None:
+        # Given - a book created before anyone subscribed
+        await self.service.process_crawled_book(self.crawled)
+        subscription = self.broadcaster.subscribe(
+            last_event_id="0-0", change_type="price_change"
+        )
+        everything = self.broadcaster.subscribe(last_event_id="0-0")
+
+        # When - it is repriced while both are listening
+        created_id, created = await self._next_change(everything)
+        await self.service.process_crawled_book(
+            self.crawled.model_copy(
+                update={"price_incl_tax": 13.0, "content_hash": "streamed_hash_2"}
+            )
+        )
+        price_id, price = await self._next_change(subscription)
+        resumed = self.broadcaster.subscribe(last_event_id=created_id)
+        _, replayed = await self._next_change(resumed)
+
+        # Then
+        assert created["change_type"] == "new_book"
+        assert price["change_type"] == "price_change"
+        assert price["new_value"] == "£13.00"
+        assert (await self._next_change(everything))[0] == price_id
+        assert replayed == price
+
+        for generator in (subscription, everything, resumed):
+            await generator.aclose()
+        await self.broadcaster.close()
@@ -1,8 +1,18 @@
 import pytest
+import redis.asyncio as redis
+from beanie import PydanticObjectId
+from pymongo.errors import AutoReconnect
 
-from filerskeepers.books.models import Book
-from filerskeepers.books.repositories import BookRepository, ChangeLogRepository
+from filerskeepers.books.cache import BookCache
+from filerskeepers.books.dtos import BookListResponse
+from filerskeepers.books.models import Book, ChangeLog
+from filerskeepers.books.repositories import (
+    BookRepository,
+    ChangeLogRepository,
+    PriceObservationRepository,
+)
 from filerskeepers.books.services import BookService
+from filerskeepers.crawler.dtos import CrawledBookDto, UnchangedBook
 from tests.base import TestBase
 
 
@@ -12,12 +22,16 @@ class TestBookService(TestBase):
         self,
         book_repository: BookRepository,
         change_log_repository: ChangeLogRepository,
+        price_observation_repository: PriceObservationRepository,
         book_service: BookService,
+        redis_connection: redis.Redis,
         cleanup: None,
     ) -> None:
         self.book_repo = book_repository
         self.change_log_repo = change_log_repository
+        self.price_history_repo = price_observation_repository
         self.service = book_service
+        self.redis = redis_connection
 
     @pytest.mark.anyio
     async def test_get_book_returns_book_when_exists(self) -> None:
@@ -153,6 +167,80 @@ class TestBookService(TestBase):
         assert result.total == 1
         assert result.books[0].name == "Expensive Book"
 
+    @pytest.mark.anyio
+    async def test_list_books_cursor_walks_all_books_once(self) -> None:
+        # Given - 7 books where several share the same price
+        books = [
+            Book(
+                name=f"Book {i}",
+                category="Fiction",
+                price_excl_tax=10.0,
+                price_incl_tax=12.0 + i // 3,
+                availability="In stock",
+                rating=4,
+                image_url=f"http://example.com/image{i}.jpg",
+                source_url=f"http://example.com/book{i}",
+                content_hash=f"hash_{i}",
+            )
+            for i in range(7)
+        ]
+        await self.book_repo.bulk_create(books)
+
+        # When - follow next_cursor until exhausted
+        seen: list[str] = []
+        prices: list[float] = []
+        result = await self.service.list_books(sort_by="price", page_size=3)
+        while True:
+            seen.extend(book.id for book in result.books)
+            prices.extend(book.price_incl_tax for book in result.books)
+            if result.next_cursor is None:
+                break
+            result = await self.service.list_books(
+                sort_by="price", page_size=3, cursor=result.next_cursor
+            )
+
+        # Then
+        assert len(seen) == 7
+        assert len(set(seen)) == 7
+        assert prices == sorted(prices)
+
+    @pytest.mark.anyio
+    async def test_list_books_totals_match_across_strategies(self) -> None:
+        # Given
+        books = [
+            Book(
+                name=f"Book {i}",
+                category="Fiction" if i % 2 else "Mystery",
+                price_excl_tax=10.0,
+                price_incl_tax=12.0 + i,
+                availability="In stock",
+                rating=4,
+                image_url=f"http://example.com/image{i}.jpg",
+                source_url=f"http://example.com/book{i}",
+                content_hash=f"hash_{i}",
+            )
+            for i in range(6)
+        ]
+        await self.book_repo.bulk_create(books)
+
+        # When
+        concurrent = await self.book_repo.list_books(
+            category="Fiction", sort_by="price", limit=2, total_strategy="concurrent"
+        )
+        facet = await self.book_repo.list_books(
+            category="Fiction", sort_by="price", limit=2, total_strategy="facet"
+        )
+        without_total = await self.service.list_books(
+            category="Fiction", include_total=False
+        )
+
+        # Then
+        assert concurrent[1] == facet[1] == 3
+        assert [b.id for b in concurrent[0]] == [b.id for b in facet[0]]
+        assert without_total.total is None
+        assert without_total.total_pages is None
+        assert len(without_total.books) == 3
+
     @pytest.mark.anyio
     async def test_list_changes_returns_recent_changes(self) -> None:
         # Given - create a book and a change log
@@ -184,3 +272,304 @@ class TestBookService(TestBase):
         assert len(result.changes) == 1
         assert result.changes[0].change_type == "new_book"
         assert result.changes[0].book_name == "Test Book"
+
+    @pytest.mark.anyio
+    async def test_write_fails_when_the_catalog_generation_cannot_be_bumped(
+        self,
+    ) -> None:
+        # Given - a cache whose Redis cannot be reached
+        unreachable = redis.Redis(host="localhost", port=1)
+        service = BookService(
+            book_repo=self.book_repo,
+            change_log_repo=self.change_log_repo,
+            price_history_repo=self.price_history_repo,
+            cache=BookCache(redis_client=unreachable),
+        )
+
+        # When
+        result = await service.process_crawled_book(
+            CrawledBookDto(
+                name="Crawled Book",
+                category="Fiction",
+                price_excl_tax=10.0,
+                price_incl_tax=12.0,
+                availability="In stock",
+                rating=4,
+                source_url="http://example.com/crawled",
+                content_hash="crawled_hash",
+            )
+        )
+        payload = await service.list_books_payload(category="Fiction")
+        await unreachable.aclose()
+
+        # Then - reported as failed, and read straight from Mongo
+        assert result["status"] == "error"
+        assert BookListResponse.model_validate_json(payload).total == 1
+
+    @pytest.mark.anyio
+    async def test_list_books_payload_is_cached_until_catalog_changes(self) -> None:
+        # Given
+        service = BookService(
+            book_repo=self.book_repo,
+            change_log_repo=self.change_log_repo,
+            price_history_repo=self.price_history_repo,
+            cache=BookCache(redis_client=self.redis),
+        )
+        await self.book_repo.create(
+            Book(
+                name="Cached Book",
+                category="Fiction",
+                price_excl_tax=10.0,
+                price_incl_tax=12.0,
+                availability="In stock",
+                rating=4,
+                image_url="http://example.com/cached.jpg",
+                source_url="http://example.com/cached",
+                content_hash="cached_hash",
+            )
+        )
+        first = await service.list_books_payload(category="Fiction")
+
+        # When - a book written behind the service's back is not visible...
+        await self.book_repo.create(
+            Book(
+                name="Hidden Book",
+                category="Fiction",
+                price_excl_tax=10.0,
+                price_incl_tax=12.0,
+                availability="In stock",
+                rating=4,
+                image_url="http://example.com/hidden.jpg",
+                source_url="http://example.com/hidden",
+                content_hash="hidden_hash",
+            )
+        )
+        cached = await service.list_books_payload(category="Fiction")
+
+        # ...until a crawl creates a book and bumps the catalog generation
+        await service.process_crawled_book(
+            CrawledBookDto(
+                name="Crawled Book",
+                category="Fiction",
+                price_excl_tax=10.0,
+                price_incl_tax=12.0,
+                availability="In stock",
+                rating=4,
+                source_url="http://example.com/crawled",
+                content_hash="crawled_hash",
+            )
+        )
+        refreshed = await service.list_books_payload(category="Fiction")
+
+        # Then
+        assert cached == first
+        assert BookListResponse.model_validate_json(cached).total == 1
+        assert BookListResponse.model_validate_json(refreshed).total == 3
+
+    @pytest.mark.anyio
+    async def test_compact_change_logs_are_listed_as_flattened_changes(self) -> None:
+        # Given - a repricing that also changes availability, stored compactly
+        service = BookService(
+            book_repo=self.book_repo,
+            change_log_repo=self.change_log_repo,
+            price_history_repo=self.price_history_repo,
+            change_log_format="compact",
+        )
+        crawled = CrawledBookDto(
+            name="Compact Book",
+            category="Fiction",
+            price_excl_tax=10.0,
+            price_incl_tax=12.0,
+            availability="In stock",
+            rating=4,
+            source_url="http://example.com/compact",
+            content_hash="compact_hash",
+        )
+        await service.process_crawled_book(crawled)
+        await service.process_crawled_book(
+            crawled.model_copy(
+                update={
+                    "price_excl_tax": 11.0,
+                    "price_incl_tax": 13.0,
+                    "availability": "Out of stock",
+                    "content_hash": "compact_hash_2",
+                }
+            )
+        )
+
+        # When - page through two changes at a time, splitting the compact document
+        pages = [await service.list_changes(page_size=2)]
+        while pages[-1].next_cursor is not None:
+            pages.append(
+                await service.list_changes(page_size=2, cursor=pages[-1].next_cursor)
+            )
+        availability = await service.list_changes(change_type="availability_change")
+
+        # Then - two documents, served as four changes
+        changes = [change for page in pages for change in page.changes]
+        assert await ChangeLog.count() == 2
+        assert pages[0].total == 4
+        assert [change.field_changed for change in changes] == [
+            "price_incl_tax",
+            "price_excl_tax",
+            "availability",
+            None,
+        ]
+        assert changes[-1].change_type == "new_book"
+        assert len({change.id for change in changes}) == 4
+        assert availability.total == 1
+        assert availability.changes[0].new_value == "Out of stock"
+
+    @pytest.mark.anyio
+    async def test_process_crawled_books_matches_one_by_one_processing(self) -> None:
+        # Given - one book already stored, then a batch with it repriced, a
+        # new book, and the new book crawled twice
+        stored = CrawledBookDto(
+            name="Stored Book",
+            category="Fiction",
+            price_excl_tax=10.0,
+            price_incl_tax=12.0,
+            availability="In stock",
+            rating=4,
+            source_url="http://example.com/stored",
+            content_hash="stored_hash",
+        )
+        await self.service.process_crawled_book(stored)
+        new = stored.model_copy(
+            update={
+                "name": "New Book",
+                "source_url": "http://example.com/new",
+                "content_hash": "new_hash",
+            }
+        )
+
+        # When
+        counts = await self.service.process_crawled_books(
+            [
+                stored.model_copy(
+                    update={"price_incl_tax": 13.0, "content_hash": "stored_hash_2"}
+                ),
+                new,
+                new,
+            ]
+        )
+
+        # Then
+        assert counts == {"created": 1, "updated": 1, "unchanged": 0, "error": 0}
+        assert await Book.count() == 2
+        assert {
+            change.change_type for change in (await self.service.list_changes()).changes
+        } == {"new_book", "price_change"}
+        assert await ChangeLog.find(ChangeLog.change_type == "new_book").count() == 2
+        new_book = await self.book_repo.find_by_url("http://example.com/new")
+        assert new_book is not None
+        history = await self.service.get_price_history(str(new_book.id))
+        assert history is not None
+        assert sum(point.observations for point in history.points) == 1
+
+    @pytest.mark.anyio
+    async def test_process_crawled_books_falls_back_only_for_books_not_inserted(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        # Given - the first new book's id is taken by the time it is inserted
+        first, second = (
+            CrawledBookDto(
+                name=f"Book {i}",
+                category="Fiction",
+                price_excl_tax=10.0,
+                price_incl_tax=12.0,
+                availability="In stock",
+                rating=4,
+                source_url=f"http://example.com/book-{i}",
+                content_hash=f"hash_{i}",
+            )
+            for i in range(2)
+        )
+        bulk_create = self.book_repo.bulk_create
+
+        async def bulk_create_with_conflict(books: list[Book]) -> list[Book]:
+            books[0].id = PydanticObjectId()
+            await self.book_repo.create(books[0].model_copy())
+            return await bulk_create(books)
+
+        monkeypatch.setattr(self.book_repo, "bulk_create", bulk_create_with_conflict)
+
+        # When
+        counts = await self.service.process_crawled_books([first, second])
+
+        # Then - the second book went in with its change log, the first one
+        # was processed on its own and found as stored
+        assert counts == {"created": 1, "updated": 0, "unchanged": 1, "error": 0}
+        assert await Book.count() == 2
+        new_books = await ChangeLog.find(ChangeLog.change_type == "new_book").to_list()
+        assert [change.book_name for change in new_books] == ["Book 1"]
+
+    @pytest.mark.anyio
+    async def test_process_crawled_books_keeps_books_inserted_before_a_failure(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        # Given - the connection drops after the first book went in
+        first, second = (
+            CrawledBookDto(
+                name=f"Book {i}",
+                category="Fiction",
+                price_excl_tax=10.0,
+                price_incl_tax=12.0,
+                availability="In stock",
+                rating=4,
+                source_url=f"http://example.com/book-{i}",
+                content_hash=f"hash_{i}",
+            )
+            for i in range(2)
+        )
+        bulk_create = self.book_repo.bulk_create
+
+        async def bulk_create_then_fail(books: list[Book]) -> list[Book]:
+            await bulk_create(books[:1])
+            books[1].id = PydanticObjectId()
+            raise AutoReconnect("connection closed")
+
+        monkeypatch.setattr(self.book_repo, "bulk_create", bulk_create_then_fail)
+
+        # When
+        counts = await self.service.process_crawled_books([first, second])
+
+        # Then - the first book is finished as created, not reprocessed as
+        # unchanged, and the second one is created on its own
+        assert counts == {"created": 2, "updated": 0, "unchanged": 0, "error": 0}
+        assert await Book.count() == 2
+        new_books = await ChangeLog.find(ChangeLog.change_type == "new_book").to_list()
+        assert sorted(change.book_name for change in new_books) == ["Book 0", "Book 1"]
+
+    @pytest.mark.anyio
+    async def test_books_skipped_as_unchanged_are_still_observed(self) -> None:
+        # Given - a stored book
+        result = await self.service.process_crawled_book(
+            CrawledBookDto(
+                name="Stored Book",
+                category="Fiction",
+                price_excl_tax=10.0,
+                price_incl_tax=12.0,
+                availability="In stock",
+                rating=4,
+                source_url="http://example.com/stored",
+                content_hash="stored_hash",
+                crawl_id="first",
+            )
+        )
+
+        # When - the next crawl skips it, and a book never stored
+        recorded = await self.service.record_unchanged_books(
+            [
+                UnchangedBook(url="http://example.com/stored", crawl_id="second"),
+                UnchangedBook(url="http://example.com/unknown", crawl_id="second"),
+            ]
+        )
+
+        # Then - one observation per crawl, at the stored price
+        assert recorded == 1
+        history = await self.service.get_price_history(
+            str(result["book_id"]), interval="raw"
+        )
+        assert history is not None
+        assert [point.last_price for point in history.points] == [12.0, 12.0]
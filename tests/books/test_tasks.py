@@ -110,6 +110,7 @@ class TestBooksTask(TestBase):
         changes, total = await self.change_log_repo.list_changes(
             book_id=str(book.id), limit=10
         )
+        assert total is not None
         assert total >= 2  # At least 2 price changes logged
 
     @pytest.mark.anyio
@@ -1,6 +1,7 @@
 import asyncio
 import logging
 from collections.abc import AsyncGenerator, Generator
+from pathlib import Path
 from typing import Any
 
 import pytest
@@ -8,7 +9,7 @@ import redis.asyncio as redis
 from arq.connections import ArqRedis, RedisSettings, create_pool
 from fastapi import FastAPI
 from httpx import ASGITransport, AsyncClient
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import AsyncMongoClient
 from testcontainers.mongodb import MongoDbContainer
 from testcontainers.redis import RedisContainer
 
@@ -16,7 +17,14 @@ from filerskeepers.application.app import get_app
 from filerskeepers.application.settings import Settings
 from filerskeepers.auth.repositories import UserRepository
 from filerskeepers.auth.services import AuthService
-from filerskeepers.books.repositories import BookRepository, ChangeLogRepository
+from filerskeepers.books.archive import ChangeLogArchive
+from filerskeepers.books.feed import ChangeFeedBroadcaster
+from filerskeepers.books.repositories import (
+    BookRepository,
+    ChangeLogRepository,
+    ChangeLogSegmentRepository,
+    PriceObservationRepository,
+)
 from filerskeepers.books.services import BookService
 from filerskeepers.crawler.repositories import CrawlMetadataRepository
 from filerskeepers.crawler.services import CrawlerService
@@ -24,6 +32,8 @@ from filerskeepers.db.mongo import init_mongo
 from filerskeepers.db.redis import get_redis_connection, get_redis_pool
 from filerskeepers.queue.arq import get_arq_redis
 from filerskeepers.queue.base import TaskContext, WorkerContext
+from filerskeepers.reports.repositories import ChangeReportRepository
+from filerskeepers.reports.services import ReportService
 
 
 # Suppress noisy logs during tests
@@ -116,10 +126,10 @@ def test_settings(
 @pytest.fixture(scope="session")
 async def mongo_client(
     test_settings: Settings,
-) -> AsyncGenerator[AsyncIOMotorClient[Any]]:
+) -> AsyncGenerator[AsyncMongoClient[Any]]:
     client = await init_mongo(test_settings)
     yield client
-    client.close()
+    await client.close()
 
 
 @pytest.fixture
@@ -132,13 +142,16 @@ async def override_dependencies(
     test_settings: Settings,
     redis_pool: redis.ConnectionPool,
     arq_redis: ArqRedis,
-    mongo_client: AsyncIOMotorClient[Any],
+    mongo_client: AsyncMongoClient[Any],
     fastapi_app: FastAPI,
 ) -> AsyncGenerator[None]:
     # Set up app state for middleware and dependencies
     fastapi_app.state.redis_pool = redis_pool
     fastapi_app.state.redis_client = get_redis_connection(redis_pool)
     fastapi_app.state.mongo_client = mongo_client
+    fastapi_app.state.change_feed_broadcaster = ChangeFeedBroadcaster(
+        fastapi_app.state.redis_client
+    )
 
     # Apply dependency overrides
     fastapi_app.dependency_overrides[get_redis_pool] = lambda: redis_pool
@@ -147,6 +160,7 @@ async def override_dependencies(
     yield
 
     # Clear overrides and state
+    await fastapi_app.state.change_feed_broadcaster.close()
     fastapi_app.dependency_overrides.pop(get_redis_pool, None)
     fastapi_app.dependency_overrides.pop(get_arq_redis, None)
     fastapi_app.dependency_overrides.clear()
@@ -203,6 +217,35 @@ def change_log_repository() -> ChangeLogRepository:
     return ChangeLogRepository()
 
 
+@pytest.fixture
+def price_observation_repository() -> PriceObservationRepository:
+    return PriceObservationRepository()
+
+
+@pytest.fixture
+def change_log_segment_repository() -> ChangeLogSegmentRepository:
+    return ChangeLogSegmentRepository()
+
+
+@pytest.fixture
+def change_log_archive(
+    change_log_repository: ChangeLogRepository,
+    change_log_segment_repository: ChangeLogSegmentRepository,
+    tmp_path: Path,
+) -> ChangeLogArchive:
+    return ChangeLogArchive(
+        change_log_repo=change_log_repository,
+        segment_repo=change_log_segment_repository,
+        directory=tmp_path / "archive",
+        hot_days=30,
+    )
+
+
+@pytest.fixture
+def change_report_repository() -> ChangeReportRepository:
+    return ChangeReportRepository()
+
+
 @pytest.fixture
 def crawl_metadata_repository() -> CrawlMetadataRepository:
     return CrawlMetadataRepository()
@@ -222,23 +265,39 @@ def crawler_service() -> CrawlerService:
 def book_service(
     book_repository: BookRepository,
     change_log_repository: ChangeLogRepository,
+    price_observation_repository: PriceObservationRepository,
 ) -> BookService:
     return BookService(
         book_repo=book_repository,
         change_log_repo=change_log_repository,
+        price_history_repo=price_observation_repository,
+    )
+
+
+@pytest.fixture
+def report_service(
+    change_log_repository: ChangeLogRepository,
+    change_report_repository: ChangeReportRepository,
+) -> ReportService:
+    return ReportService(
+        change_log_repo=change_log_repository,
+        report_repo=change_report_repository,
     )
 
 
 @pytest.fixture
 async def cleanup(
-    mongo_client: AsyncIOMotorClient[Any],
+    mongo_client: AsyncMongoClient[Any],
+    redis_connection: redis.Redis,
     test_settings: Settings,
 ) -> AsyncGenerator[None]:
     db = mongo_client[test_settings.MONGODB_DATABASE]
     for collection_name in await db.list_collection_names():
         await db[collection_name].delete_many({})
+    await redis_connection.flushdb()
 
     yield
 
     for collection_name in await db.list_collection_names():
         await db[collection_name].delete_many({})
+    await redis_connection.flushdb()
@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+import pytest
+import redis.asyncio as redis
+
+from filerskeepers.crawler.breaker import CircuitBreaker, CircuitOpenError
+from tests.base import TestBase
+
+
+HOST = "books.toscrape.com"
+
+
+class TestCircuitBreaker(TestBase):
+    @pytest.fixture(autouse=True)
+    async def setup(self, redis_connection: redis.Redis, cleanup: None) -> None:
+        self.redis = redis_connection
+
+    def _breaker(self) -> CircuitBreaker:
+        return CircuitBreaker(
+            self.redis,
+            window=60,
+            min_requests=4,
+            error_rate=0.5,
+            slow_call=1,
+            open_seconds=0.2,
+            probe_timeout=5,
+        )
+
+    @pytest.mark.anyio
+    async def test_opens_on_the_error_rate_across_processes(self) -> None:
+        # Given - two processes, between them one success, one slow response
+        # and two errors
+        first, second = self._breaker(), self._breaker()
+        await first.record(HOST, time.monotonic(), failed=False)
+        await second.record(HOST, time.monotonic() - 2, failed=False)
+        await first.record(HOST, time.monotonic(), failed=True)
+
+        # When
+        await second.allow(HOST)
+        await second.record(HOST, time.monotonic(), failed=True)
+
+        # Then - both fail fast
+        for breaker in (first, second):
+            with pytest.raises(CircuitOpenError):
+                await breaker.allow(HOST)
+
+    @pytest.mark.anyio
+    async def test_half_open_lets_one_probe_through(self) -> None:
+        # Given - an open circuit whose open period passed
+        breaker = self._breaker()
+        for _ in range(4):
+            await breaker.record(HOST, time.monotonic(), failed=True)
+        await asyncio.sleep(0.3)
+
+        # When - the probe goes through, the other requests are held back
+        await breaker.allow(HOST)
+        with pytest.raises(CircuitOpenError):
+            await breaker.allow(HOST)
+        await breaker.record(HOST, time.monotonic(), failed=False)
+
+        # Then - its success closed the circuit
+        await breaker.allow(HOST)
+        await breaker.allow(HOST)
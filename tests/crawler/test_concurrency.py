@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from filerskeepers.crawler.concurrency import AdaptiveConcurrency, parse_retry_after
+from tests.base import TestBase
+
+
+class TestAdaptiveConcurrency(TestBase):
+    @pytest.mark.anyio
+    async def test_window_grows_additively_and_is_cut_once_per_burst(self) -> None:
+        # Given
+        concurrency = AdaptiveConcurrency(
+            initial=4, minimum=1, maximum=8, latency_target=1.0
+        )
+
+        # When - a window's worth of fast responses...
+        for _ in range(4):
+            async with concurrency.slot() as started:
+                await concurrency.record(started, congested=False)
+        grown = concurrency.window
+
+        # ...then a burst of 5xx from requests that were all in flight together
+        starts = []
+        for _ in range(3):
+            async with concurrency.slot() as started:
+                starts.append(started)
+        for started in starts:
+            await concurrency.record(started, congested=True)
+
+        # Then
+        assert 4.9 < grown < 5.0
+        assert concurrency.window == pytest.approx(grown / 2)
+        assert concurrency.in_flight == 0
+
+    @pytest.mark.anyio
+    async def test_slots_are_bounded_by_the_window(self) -> None:
+        # Given
+        concurrency = AdaptiveConcurrency(
+            initial=2, minimum=1, maximum=2, latency_target=1.0
+        )
+        peak = 0
+
+        async def request() -> None:
+            nonlocal peak
+            async with concurrency.slot():
+                peak = max(peak, concurrency.in_flight)
+                await asyncio.sleep(0.01)
+
+        # When
+        await asyncio.gather(*(request() for _ in range(6)))
+
+        # Then
+        assert peak == 2
+
+    def test_parse_retry_after(self) -> None:
+        assert parse_retry_after("120") == 120.0
+        assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+        assert parse_retry_after("soon") is None
+        assert parse_retry_after(None) is None
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+import redis.asyncio as redis
+
+from filerskeepers.crawler.lease import Lease, LeaseLostError
+from tests.base import TestBase
+
+
+class TestLease(TestBase):
+    @pytest.fixture(autouse=True)
+    async def setup(self, redis_connection: redis.Redis, cleanup: None) -> None:
+        self.redis = redis_connection
+
+    @pytest.mark.anyio
+    async def test_only_one_holder_while_the_heartbeat_runs(self) -> None:
+        # Given
+        first = Lease(self.redis, "crawl", owner="first", ttl=0.3)
+        second = Lease(self.redis, "crawl", owner="second", ttl=0.3)
+        assert await first.acquire()
+
+        # When - longer than the ttl
+        await asyncio.sleep(0.6)
+
+        # Then
+        assert not await second.acquire()
+        holder = await second.holder()
+        assert holder is not None
+        assert holder.owner == "first"
+        assert holder.token == first.token
+        first.check()
+        await first.release()
+
+    @pytest.mark.anyio
+    async def test_expired_lease_is_taken_over_with_a_newer_token(self) -> None:
+        # Given - a holder that stalls, its heartbeat stops
+        first = Lease(self.redis, "crawl", owner="first", ttl=0.3)
+        assert await first.acquire()
+        assert first._heartbeat
+        first._heartbeat.cancel()
+        await asyncio.sleep(0.4)
+
+        # When
+        second = Lease(self.redis, "crawl", owner="second", ttl=0.3)
+        assert await second.acquire()
+
+        # Then - the first one finds out, and its release leaves the new lease
+        assert first.token and second.token
+        assert second.token > first.token
+        with pytest.raises(LeaseLostError):
+            first.check()
+        await first.release()
+        holder = await second.holder()
+        assert holder and holder.owner == "second"
+        await second.release()
+        assert await second.holder() is None
@@ -0,0 +1,88 @@
+import asyncio
+import gzip
+from collections.abc import Callable
+from typing import Any
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from filerskeepers.books.models import Book
+from filerskeepers.books.services import BookService
+from filerskeepers.crawler.pipeline import CrawlPipeline
+from filerskeepers.crawler.services import CrawlerService
+from tests.base import TestBase
+from tests.crawler.test_services import site
+
+
+class TestCrawlPipeline(TestBase):
+    @pytest.fixture(autouse=True)
+    async def setup(self, book_service: BookService, cleanup: None) -> None:
+        self.book_service = book_service
+        self.site = site([f"£{price}.00" for price in range(10, 30)])
+
+    def _handle(self, request: httpx.Request) -> httpx.Response:
+        body, _ = self.site[str(request.url)]
+        return httpx.Response(
+            200,
+            content=gzip.compress(body.encode()),
+            headers={"Content-Encoding": "gzip"},
+        )
+
+    def _mock_client(self) -> Callable[..., httpx.AsyncClient]:
+        transport = httpx.MockTransport(self._handle)
+        client = httpx.AsyncClient
+
+        def mock_client(**kwargs: Any) -> httpx.AsyncClient:
+            return client(transport=transport, **kwargs)
+
+        return mock_client
+
+    @pytest.mark.anyio
+    async def test_stages_store_every_book_and_checkpoint_the_page(self) -> None:
+        # Given - queues smaller than the page, so every stage waits on another
+        pipeline = CrawlPipeline(
+            CrawlerService(),
+            self.book_service,
+            parse_workers=2,
+            persist_workers=2,
+            batch_size=4,
+            queue_size=2,
+        )
+        checkpoints: list[int] = []
+
+        async def checkpoint(page: int) -> None:
+            checkpoints.append(page)
+
+        # When
+        with patch.object(httpx, "AsyncClient", self._mock_client()):
+            counts = await pipeline.run(checkpoint=checkpoint)
+
+        # Then
+        assert counts["created"] == 20
+        assert counts["error"] == 0
+        assert await Book.count() == 20
+        assert checkpoints == [1]
+        assert all(stats.items == 20 for stats in pipeline.stats.values())
+
+    @pytest.mark.anyio
+    async def test_a_failing_stage_stops_the_others(self) -> None:
+        # Given - parsing fails, with queues too small to hold the page
+        pipeline = CrawlPipeline(
+            CrawlerService(),
+            self.book_service,
+            parse_workers=1,
+            persist_workers=1,
+            queue_size=2,
+        )
+
+        # When / Then - the error comes out rather than the fetch blocking
+        with (
+            patch.object(httpx, "AsyncClient", self._mock_client()),
+            patch.object(
+                CrawlerService, "parse_book", side_effect=RuntimeError("parser died")
+            ),
+            pytest.raises(RuntimeError, match="parser died"),
+        ):
+            await asyncio.wait_for(pipeline.run(), timeout=10)
+        assert await Book.count() == 0
@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+import pytest
+import redis.asyncio as redis
+
+from filerskeepers.crawler.politeness import HostTokenBucket
+from tests.base import TestBase
+
+
+class TestHostTokenBucket(TestBase):
+    @pytest.fixture(autouse=True)
+    async def setup(self, redis_connection: redis.Redis, cleanup: None) -> None:
+        self.redis = redis_connection
+
+    @pytest.mark.anyio
+    async def test_budget_is_shared_between_processes(self) -> None:
+        # Given - two crawler processes, 20 requests/s with a burst of 5
+        buckets = [
+            HostTokenBucket(self.redis, rate=20, burst=5, batch_size=2)
+            for _ in range(2)
+        ]
+        started = time.monotonic()
+
+        # When - they send 26 requests between them
+        await asyncio.gather(
+            *(
+                bucket.acquire("books.toscrape.com")
+                for bucket in buckets
+                for _ in range(13)
+            )
+        )
+
+        # Then - 5 from the burst, the other 21 at 20 a second
+        assert time.monotonic() - started >= 0.9
+
+    @pytest.mark.anyio
+    async def test_falls_back_to_a_local_budget_without_redis(self) -> None:
+        # Given
+        bucket = HostTokenBucket(
+            redis.Redis(host="localhost", port=1), rate=50, burst=5
+        )
+
+        # When
+        await asyncio.wait_for(
+            asyncio.gather(*(bucket.acquire("books.toscrape.com") for _ in range(10))),
+            5,
+        )
+
+        # Then
+        assert bucket._fallback["books.toscrape.com"].tokens < 1
@@ -0,0 +1,46 @@
+import pytest
+import redis.asyncio as redis
+
+from filerskeepers.crawler.dtos import RetryItem
+from filerskeepers.crawler.retries import RetryQueue
+from tests.base import TestBase
+
+
+class TestRetryQueue(TestBase):
+    @pytest.fixture(autouse=True)
+    async def setup(self, redis_connection: redis.Redis, cleanup: None) -> None:
+        self.redis = redis_connection
+        self.retry_queue = RetryQueue(redis_connection, base_delay=1, max_delay=4)
+
+    @pytest.mark.anyio
+    async def test_backoff_is_jittered_and_capped(self) -> None:
+        # When
+        delays = [
+            await self.retry_queue.schedule(
+                RetryItem(url=f"/book-{attempt}", page=1, attempt=attempt)
+            )
+            for attempt in range(1, 6)
+        ]
+
+        # Then - half of 1, 2, 4 seconds fixed and half random, then capped
+        for delay, cap in zip(delays, [1, 2, 4, 4, 4]):
+            assert cap / 2 <= delay <= cap
+
+    @pytest.mark.anyio
+    async def test_only_due_retries_are_popped_and_only_once(self) -> None:
+        # Given - one retry due now, one in a minute
+        retry_queue = RetryQueue(self.redis, base_delay=0, max_delay=0)
+        item = RetryItem(url="/book-1", crawl_id="crawl", page=1, attempt=1)
+        await retry_queue.schedule(item)
+        await retry_queue.schedule(
+            item.model_copy(update={"url": "/book-2"}), retry_after=60
+        )
+
+        # When
+        first = await retry_queue.pop_due("crawl")
+        second = await retry_queue.pop_due("crawl")
+
+        # Then
+        assert first == [item]
+        assert second == []
+        assert 59 < (await retry_queue.next_due("crawl") or 0) <= 60
@@ -0,0 +1,262 @@
+import asyncio
+import gzip
+import hashlib
+import time
+from collections.abc import AsyncIterator
+from typing import Any
+from unittest.mock import patch
+
+import httpx
+import pytest
+import redis.asyncio as redis
+
+from filerskeepers.crawler.breaker import CircuitBreaker, CircuitOpenError
+from filerskeepers.crawler.dtos import CrawledBookDto, RetryItem
+from filerskeepers.crawler.models import CrawledPage
+from filerskeepers.crawler.retries import RetryQueue
+from filerskeepers.crawler.services import CrawlerService
+from tests.base import TestBase
+
+
+BASE_URL = CrawlerService.BASE_URL
+
+CARD_HTML = """
+<article class="product_pod">
+<h3><a href="book-{i}/index.html">{i}</a></h3>
+<p class="star-rating Three"></p>
+<p class="price_color">{price}</p>
+<p class="instock availability">In stock</p>
+</article>
+"""
+BOOK_HTML = """
+<h1>Book {i}</h1>
+<p class="star-rating Three"></p>
+<table class="table-striped">
+<tr><th>Price (excl. tax)</th><td>£10.00</td></tr>
+<tr><th>Price (incl. tax)</th><td>{price}</td></tr>
+</table>
+<p class="instock availability">In stock</p>
+"""
+
+
+def site(prices: list[str]) -> dict[str, tuple[str, str | None]]:
+    """URL -> (body, ETag) of a catalog page, book 2 has no validators."""
+    books = {
+        f"{BASE_URL}/catalogue/book-{i}/index.html": (
+            BOOK_HTML.format(i=i, price=price),
+            f'"book-{i}-{price.lstrip("£")}"' if i == 1 else None,
+        )
+        for i, price in enumerate(prices, start=1)
+    }
+    catalog = "".join(
+        CARD_HTML.format(i=i, price=price) for i, price in enumerate(prices, start=1)
+    )
+    etag = '"catalog-{}"'.format("-".join(price.lstrip("£") for price in prices))
+    return {f"{BASE_URL}/index.html": (catalog, etag)} | books
+
+
+async def chunked(data: bytes) -> AsyncIterator[bytes]:
+    """A streamed body, read in 64 kB chunks."""
+    for start in range(0, len(data), 65536):
+        yield data[start : start + 65536]
+
+
+class TestCrawlerService(TestBase):
+    @pytest.fixture(autouse=True)
+    async def setup(self, crawler_service: CrawlerService, cleanup: None) -> None:
+        self.crawler_service = crawler_service
+        self.site = site(["£12.00", "£12.00"])
+        self.responses: list[str] = []
+        self.failing: set[str] = set()
+
+    def _handle(self, request: httpx.Request) -> httpx.Response:
+        url = str(request.url)
+        if url in self.failing:
+            self.failing.remove(url)
+            response = httpx.Response(503)
+        else:
+            body, etag = self.site[url]
+            if etag and request.headers.get("If-None-Match") == etag:
+                response = httpx.Response(304)
+            else:
+                # Served compressed, as the site does
+                response = httpx.Response(
+                    200,
+                    content=gzip.compress(body.encode()),
+                    headers={"Content-Encoding": "gzip"}
+                    | ({"ETag": etag} if etag else {}),
+                )
+        self.responses.append(f"{response.status_code} {url.split('/')[-2]}")
+        return response
+
+    async def _crawl(self) -> list[str | None]:
+        transport = httpx.MockTransport(self._handle)
+        client = httpx.AsyncClient
+
+        def mock_client(**kwargs: Any) -> httpx.AsyncClient:
+            return client(transport=transport, **kwargs)
+
+        with patch.object(httpx, "AsyncClient", mock_client):
+            return [
+                book.name if isinstance(book, CrawledBookDto) else None
+                async for book, _ in self.crawler_service.crawl_all_books()
+            ]
+
+    @pytest.mark.anyio
+    async def test_unchanged_pages_are_revalidated_and_skipped(self) -> None:
+        # Given - a first crawl downloads and parses everything
+        self.crawler_service = CrawlerService(incremental=False)
+        first = await self._crawl()
+        first_responses, self.responses = self.responses, []
+
+        # When
+        second = await self._crawl()
+
+        # Then - 304s for pages with an ETag, an identical body for the other
+        assert first == ["Book 1", "Book 2"]
+        assert len(first_responses) == 3
+        assert second == [None, None]
+        assert sorted(self.responses) == [
+            "200 book-2",
+            "304 book-1",
+            "304 books.toscrape.com",
+        ]
+        assert await CrawledPage.count() == 3
+
+    @pytest.mark.anyio
+    async def test_incremental_crawl_only_fetches_books_whose_card_changed(
+        self,
+    ) -> None:
+        # Given
+        await self._crawl()
+        self.site = site(["£12.00", "£15.00"])
+        self.responses = []
+
+        # When
+        second = await self._crawl()
+        second_responses, self.responses = self.responses, []
+        third = await self._crawl()
+
+        # Then - book 1's card is unchanged, its page is not even requested
+        assert second == [None, "Book 2"]
+        assert second_responses == ["200 books.toscrape.com", "200 book-2"]
+        assert third == [None, None]
+        assert self.responses == ["304 books.toscrape.com"]
+
+    @pytest.mark.anyio
+    async def test_transient_failures_are_retried_from_the_queue(
+        self, redis_connection: redis.Redis
+    ) -> None:
+        # Given - book 1's page answers 503 once
+        self.crawler_service = CrawlerService(
+            retry_queue=RetryQueue(redis_connection, base_delay=0.1)
+        )
+        self.failing = {f"{BASE_URL}/catalogue/book-1/index.html"}
+
+        # When
+        books = await self._crawl()
+
+        # Then - book 2 is not held up, book 1 comes in from its retry
+        assert books == ["Book 2", "Book 1"]
+        assert self.responses[0] == "200 books.toscrape.com"
+        assert sorted(self.responses[1:3]) == ["200 book-2", "503 book-1"]
+        assert self.responses[3] == "200 book-1"
+
+    @pytest.mark.anyio
+    async def test_crawl_carries_on_when_the_retry_queue_is_down(
+        self, redis_connection: redis.Redis, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        # Given - two catalog pages, and a retry queue that cannot be read
+        retry_queue = RetryQueue(redis_connection)
+
+        async def pop_due(crawl_id: str | None) -> list[RetryItem]:
+            raise redis.ConnectionError("Redis is down")
+
+        monkeypatch.setattr(retry_queue, "pop_due", pop_due)
+        self.crawler_service = CrawlerService(retry_queue=retry_queue)
+        self.site |= {
+            f"{BASE_URL}/index.html": (
+                CARD_HTML.format(i=1, price="£12.00")
+                + '<li class="next"><a href="catalogue/page-2.html">next</a></li>',
+                None,
+            ),
+            f"{BASE_URL}/catalogue/page-2.html": (
+                CARD_HTML.format(i=2, price="£12.00"),
+                None,
+            ),
+        }
+
+        # When
+        books = await self._crawl()
+
+        # Then - the second page is still crawled
+        assert books == ["Book 1", "Book 2"]
+
+    @pytest.mark.anyio
+    async def test_last_attempt_gives_up_without_waiting(self) -> None:
+        # Given - a book page that keeps failing, on its last retry
+        self.crawler_service.max_retries = 3
+        self.crawler_service.retry_delay = 60
+        url = f"{BASE_URL}/catalogue/book-1/index.html"
+        self.failing = {url}
+        transport = httpx.MockTransport(self._handle)
+        client = httpx.AsyncClient
+
+        def mock_client(**kwargs: Any) -> httpx.AsyncClient:
+            return client(transport=transport, **kwargs)
+
+        # When
+        with patch.object(httpx, "AsyncClient", mock_client):
+            result = await asyncio.wait_for(
+                self.crawler_service._fetch_with_retry(url, deferred_attempt=2), 5
+            )
+
+        # Then - no backoff before giving up
+        assert result is None
+        assert self.responses == ["503 book-1"]
+
+    @pytest.mark.anyio
+    async def test_circuit_open_deferral_waits_out_the_open_window(
+        self, redis_connection: redis.Redis
+    ) -> None:
+        # Given - a circuit about to go half-open
+        retry_queue = RetryQueue(redis_connection, base_delay=1)
+        self.crawler_service = CrawlerService(
+            retry_queue=retry_queue,
+            breaker=CircuitBreaker(redis_connection, open_seconds=120),
+        )
+        item = RetryItem(url="/book-1", crawl_id="crawl", page=1, attempt=1)
+
+        # When
+        await self.crawler_service._defer(
+            item, CircuitOpenError("books.toscrape.com", 2)
+        )
+
+        # Then - queued for the whole window, with its attempts unchanged
+        [(retry, due)] = await redis_connection.zrange(
+            f"{RetryQueue.KEY_PREFIX}:crawl", 0, 0, withscores=True
+        )
+        assert RetryItem.model_validate_json(retry).attempt == 1
+        assert due - time.time() > 110
+
+    @pytest.mark.anyio
+    async def test_bodies_are_hashed_while_read_and_bounded(self) -> None:
+        # Given - a page, and a 10 MB gzip bomb of a few kilobytes
+        self.crawler_service.max_body_size = 1_000_000
+        page, bomb = (
+            httpx.Response(
+                200,
+                content=chunked(gzip.compress(body)),
+                headers={"Content-Encoding": "gzip"},
+                request=httpx.Request("GET", f"{BASE_URL}/index.html"),
+            )
+            for body in (b"<html></html>", bytes(10_000_000))
+        )
+
+        # When
+        body = await self.crawler_service._read_body(page)
+        bombed = await self.crawler_service._read_body(bomb)
+
+        # Then - the bomb is given up on without being inflated in full
+        assert body == (b"<html></html>", hashlib.sha256(b"<html></html>").hexdigest())
+        assert bombed is None
@@ -1,13 +1,19 @@
+import asyncio
 from collections.abc import AsyncGenerator
 from typing import Any
 from unittest.mock import patch
 
 import pytest
+import redis.asyncio as redis
 
+from filerskeepers.crawler.breaker import CircuitOpenError
 from filerskeepers.crawler.dtos import CrawledBookDto
+from filerskeepers.crawler.lease import Lease
+from filerskeepers.crawler.models import CrawlMetadata, CrawlStatus
 from filerskeepers.crawler.repositories import CrawlMetadataRepository
 from filerskeepers.crawler.services import CrawlerService
 from filerskeepers.crawler.tasks import crawl_books_task
+from filerskeepers.queue.arq import Queue
 from filerskeepers.queue.base import WorkerContext
 from tests.base import TestBase
 
@@ -27,6 +33,14 @@ async def async_book_generator_with_error(
     yield CrawledBookDto(**{}), start_page  # Never reached but needed for type
 
 
+async def async_book_generator_until_circuit_opens(
+    books: list[dict[str, Any]], start_page: int = 1
+) -> AsyncGenerator[tuple[CrawledBookDto, int]]:
+    async for book in async_book_generator(books, start_page):
+        yield book
+    raise CircuitOpenError("books.toscrape.com", 120)
+
+
 class TestCrawlerTasks(TestBase):
     @pytest.fixture(autouse=True)
     async def setup(
@@ -34,11 +48,13 @@ class TestCrawlerTasks(TestBase):
         worker_context: WorkerContext,
         crawl_metadata_repository: CrawlMetadataRepository,
         crawler_service: CrawlerService,
+        redis_connection: redis.Redis,
         cleanup: None,
     ) -> None:
         self.worker_ctx = worker_context
         self.crawl_metadata_repo = crawl_metadata_repository
         self.crawler_service = crawler_service
+        self.redis = redis_connection
 
     @pytest.mark.anyio
     async def test_crawl_books_task_successfully_enqueues_books(self) -> None:
@@ -90,6 +106,7 @@ class TestCrawlerTasks(TestBase):
             assert result["errors_count"] == 0
             assert result["last_page"] == 1
             assert "resumed" in result
+            assert await self.worker_ctx["redis"].zcard(Queue.INGEST) == 2
 
             # Verify crawl metadata was created
             # (metadata is saved in the database, task completed successfully)
@@ -165,3 +182,111 @@ class TestCrawlerTasks(TestBase):
             assert result["status"] == "failed"
             assert "error" in result
             assert "Database connection failed" in result["error"]
+
+    @pytest.mark.anyio
+    async def test_crawl_books_task_parks_the_crawl_when_the_circuit_opens(
+        self,
+    ) -> None:
+        # Given - the circuit opens after the first page
+        sample_book = {
+            "name": "Test Book 1",
+            "description": "A test book",
+            "category": "Fiction",
+            "price_excl_tax": 10.0,
+            "price_incl_tax": 12.0,
+            "availability": "In stock",
+            "num_reviews": 5,
+            "image_url": "http://example.com/image1.jpg",
+            "rating": 4,
+            "source_url": "http://example.com/book1",
+            "html_snapshot": "<html>test</html>",
+            "content_hash": "hash1",
+        }
+
+        with patch.object(
+            CrawlerService,
+            "crawl_all_books",
+            return_value=async_book_generator_until_circuit_opens([sample_book]),
+        ):
+            # When
+            result = await crawl_books_task(self.worker_ctx)
+
+        # Then - it is left to be resumed from page 2
+        assert result["status"] == "parked"
+        assert result["resume_in"] == 120
+        metadata = await self.crawl_metadata_repo.get_latest_incomplete_today()
+        assert metadata is not None
+        assert metadata.status == CrawlStatus.PARTIAL
+        assert metadata.last_page_crawled == 1
+        assert metadata.books_crawled == 1
+        assert await self.worker_ctx["redis"].zcard(Queue.CRAWL) == 1
+
+    @pytest.mark.anyio
+    async def test_crawl_books_task_reports_the_running_crawl(self) -> None:
+        # Given - a crawl running elsewhere
+        running = CrawlMetadata(
+            url=CrawlerService.BASE_URL, status=CrawlStatus.IN_PROGRESS
+        )
+        await self.crawl_metadata_repo.create(running)
+        lease = Lease(self.redis, "crawl", owner="daily")
+        assert await lease.acquire()
+
+        with patch.object(CrawlerService, "crawl_all_books") as crawl_all_books:
+            # When
+            result = await crawl_books_task(self.worker_ctx)
+        await lease.release()
+
+        # Then - nothing is crawled twice
+        crawl_all_books.assert_not_called()
+        assert result["status"] == "already_running"
+        assert result["owner"] == "daily"
+        assert result["lease_token"] == lease.token
+        assert result["crawl_id"] == str(running.id)
+
+    @pytest.mark.anyio
+    async def test_crawl_books_task_takes_over_an_abandoned_crawl(self) -> None:
+        # Given - a crawl whose worker died after page 3, its lease expired
+        abandoned = CrawlMetadata(
+            url=CrawlerService.BASE_URL,
+            status=CrawlStatus.IN_PROGRESS,
+            last_page_crawled=3,
+        )
+        await self.crawl_metadata_repo.create(abandoned)
+        stale = Lease(self.redis, "crawl", owner="dead", ttl=0.1)
+        assert await stale.acquire()
+        assert stale._heartbeat and stale.token
+        stale._heartbeat.cancel()
+        await self.crawl_metadata_repo.update_fenced(abandoned, stale.token)
+        await asyncio.sleep(0.2)
+
+        with patch.object(
+            CrawlerService,
+            "crawl_all_books",
+            return_value=async_book_generator([], start_page=4),
+        ):
+            # When
+            result = await crawl_books_task(self.worker_ctx)
+
+        # Then - it resumes, and the dead worker can no longer write
+        assert result["status"] == "completed"
+        assert result["resumed"] is True
+        assert not await self.crawl_metadata_repo.update_fenced(abandoned, stale.token)
+
+    @pytest.mark.anyio
+    async def test_crawl_books_task_leaves_the_worker_redis_pool_open(self) -> None:
+        # Given - a connection of the worker's pool in use by another job
+        redis_pool = self.worker_ctx["redis_pool"]
+        connection = await redis_pool.get_connection()
+        await connection.send_command("PING")
+        assert await connection.read_response() in (b"PONG", "PONG")
+        lease = Lease(self.redis, "crawl", owner="daily")
+        assert await lease.acquire()
+
+        # When
+        result = await crawl_books_task(self.worker_ctx)
+
+        # Then - the job ending did not close it
+        assert result["status"] == "already_running"
+        assert connection.is_connected
+        await redis_pool.release(connection)
+        await lease.release()
@@ -0,0 +1,39 @@
+import pytest
+from arq import ArqRedis
+
+from filerskeepers.queue.arq import Priority, Queue, enqueue_job
+from tests.base import TestBase
+
+
+class TestEnqueueJob(TestBase):
+    @pytest.fixture(autouse=True)
+    async def setup(self, arq_redis: ArqRedis, cleanup: None) -> None:
+        self.arq_redis = arq_redis
+
+    @pytest.mark.anyio
+    async def test_jobs_go_to_their_queue(self) -> None:
+        # When
+        await enqueue_job(self.arq_redis, "process_crawled_book", queue=Queue.INGEST)
+
+        # Then
+        assert await self.arq_redis.zcard(Queue.INGEST) == 1
+        assert await self.arq_redis.zcard(Queue.CRAWL) == 0
+
+    @pytest.mark.anyio
+    async def test_higher_priority_overtakes_the_queue(self) -> None:
+        # Given - the daily crawl waiting for a worker
+        daily = await enqueue_job(self.arq_redis, "crawl_books_task", queue=Queue.CRAWL)
+
+        # When - a rescan is requested
+        rescan = await enqueue_job(
+            self.arq_redis,
+            "crawl_books_task",
+            queue=Queue.CRAWL,
+            priority=Priority.HIGH,
+        )
+
+        # Then - the rescan runs first, and expires like any other job
+        assert daily and rescan
+        job_ids = await self.arq_redis.zrange(Queue.CRAWL, 0, -1)
+        assert [job_id.decode() for job_id in job_ids] == [rescan.job_id, daily.job_id]
+        assert await self.arq_redis.pttl(f"arq:job:{rescan.job_id}") > 23 * 3600 * 1000
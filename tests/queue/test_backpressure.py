@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from arq import ArqRedis
+
+from filerskeepers.queue.backpressure import QueueBackpressure
+from tests.base import TestBase
+
+
+QUEUE = "arq:test-backpressure"
+
+
+class TestQueueBackpressure(TestBase):
+    @pytest.fixture(autouse=True)
+    async def setup(self, arq_redis: ArqRedis, cleanup: None) -> None:
+        self.arq_redis = arq_redis
+
+    async def _fill(self, jobs: int) -> None:
+        await self.arq_redis.zadd(QUEUE, {f"job-{i}": i for i in range(jobs)})
+
+    async def _drain(self, keep: int) -> None:
+        # A worker taking the jobs off one at a time
+        while await self.arq_redis.zcard(QUEUE) > keep:
+            await self.arq_redis.zpopmin(QUEUE)
+            await asyncio.sleep(0.005)
+
+    @pytest.mark.anyio
+    async def test_below_high_water_does_not_wait(self) -> None:
+        # Given
+        await self._fill(9)
+        backpressure = QueueBackpressure(
+            self.arq_redis, QUEUE, high_water=10, low_water=2, interval=0.01
+        )
+
+        # When
+        await asyncio.wait_for(backpressure.wait(), timeout=1)
+
+        # Then
+        assert backpressure.pauses == 0
+        assert backpressure.paused_seconds == 0
+
+    @pytest.mark.anyio
+    async def test_pauses_until_low_water(self) -> None:
+        # Given - the queue over its high water mark
+        await self._fill(20)
+        backpressure = QueueBackpressure(
+            self.arq_redis, QUEUE, high_water=10, low_water=2, interval=0.01
+        )
+
+        # When - the workers catch up while the producer waits
+        waiter = asyncio.create_task(backpressure.wait())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        await self._drain(keep=5)
+        await asyncio.sleep(0.05)
+        assert not waiter.done()  # Still above low water
+        await self._drain(keep=2)
+        await asyncio.wait_for(waiter, timeout=1)
+
+        # Then
+        assert backpressure.pauses == 1
+        assert backpressure.paused_seconds > 0
+        assert await self.arq_redis.zcard(QUEUE) == 2
@@ -0,0 +1,110 @@
+import os
+import signal
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from filerskeepers.queue import launcher
+from filerskeepers.queue.arq import Queue
+from filerskeepers.queue.launcher import WorkerLauncher
+from tests.base import TestBase
+
+
+# Stand-ins for launcher._run_worker, module level for the spawned processes
+# to import them
+
+
+def crashing_worker(queue: Queue, drain_timeout: int) -> None:
+    raise SystemExit(1)
+
+
+def draining_worker(queue: Queue, drain_timeout: int) -> None:
+    # Stops on SIGTERM as an idle arq worker does
+    time.sleep(60)
+
+
+def stuck_worker(queue: Queue, drain_timeout: int) -> None:
+    # A job that never finishes, SIGTERM does nothing
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    Path(os.environ["STUCK_WORKER_READY"]).touch()
+    time.sleep(60)
+
+
+class TestWorkerLauncher(TestBase):
+    @pytest.fixture(autouse=True)
+    def setup(self, cleanup: None) -> None:
+        self.launcher = WorkerLauncher(Queue.INGEST, processes=2, drain_timeout=0)
+        self.launcher.DRAIN_GRACE = 1.0
+
+    def _start(self, slot: int, target: object) -> None:
+        with patch.object(launcher, "_run_worker", target):
+            self.launcher._supervise(slot)
+
+    def test_restart_delay_backs_off_while_crash_looping(self) -> None:
+        # When - slot 0 keeps dying right after starting
+        delays = [self.launcher._restart_delay(0, uptime=1.0) for _ in range(8)]
+
+        # Then - doubling up to the cap, slot 1 unaffected
+        assert delays == [1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 60.0, 60.0]
+        assert self.launcher._restart_delay(1, uptime=1.0) == 1.0
+
+    def test_restart_delay_resets_after_running_long_enough(self) -> None:
+        # Given
+        for _ in range(5):
+            self.launcher._restart_delay(0, uptime=1.0)
+
+        # When
+        delay = self.launcher._restart_delay(0, uptime=WorkerLauncher.MIN_UPTIME)
+
+        # Then
+        assert delay == 1.0
+        assert self.launcher._restart_delay(0, uptime=1.0) == 2.0
+
+    def test_crashed_worker_is_restarted_after_the_delay(self) -> None:
+        # Given - a worker that crashes as soon as it starts
+        self._start(0, crashing_worker)
+        worker = self.launcher._workers[0]
+        assert worker is not None
+        worker.join(30)
+
+        # When - seen dead, then again before and after the delay
+        self._start(0, crashing_worker)
+        delay = self.launcher._restart_at[0] - time.monotonic()
+        self._start(0, crashing_worker)
+        waiting = self.launcher._workers[0]
+        time.sleep(max(delay, 0))
+        self._start(0, crashing_worker)
+
+        # Then
+        assert worker.exitcode == 1
+        assert 0 < delay <= 1.0
+        assert waiting is None
+        restarted = self.launcher._workers[0]
+        assert restarted is not None and restarted is not worker
+        restarted.join(30)
+
+    def test_drain_kills_the_workers_that_do_not_stop(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        # Given - one worker that stops on SIGTERM, one that ignores it
+        ready = tmp_path / "ready"
+        monkeypatch.setenv("STUCK_WORKER_READY", str(ready))
+        self._start(0, draining_worker)
+        self._start(1, stuck_worker)
+        deadline = time.monotonic() + 30
+        while not ready.exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert ready.exists()
+        draining, stuck = self.launcher._workers
+
+        # When
+        started = time.monotonic()
+        self.launcher._drain()
+
+        # Then - the stuck one is killed once the drain timeout is up
+        assert draining is not None and stuck is not None
+        assert draining.exitcode == -signal.SIGTERM
+        assert stuck.exitcode == -signal.SIGKILL
+        assert time.monotonic() - started < 10
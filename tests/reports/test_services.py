@@ -0,0 +1,172 @@
+import json
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from filerskeepers.books.models import Book, ChangeLog
+from filerskeepers.books.repositories import ChangeLogRepository
+from filerskeepers.reports.repositories import ChangeReportRepository
+from filerskeepers.reports.services import ReportService
+from tests.base import TestBase
+
+
+class TestReportService(TestBase):
+    @pytest.fixture(autouse=True)
+    async def setup(
+        self,
+        change_log_repository: ChangeLogRepository,
+        change_report_repository: ChangeReportRepository,
+        report_service: ReportService,
+        cleanup: None,
+    ) -> None:
+        self.change_log_repo = change_log_repository
+        self.report_repo = change_report_repository
+        self.service = report_service
+        self.today = datetime.now(UTC).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+
+    async def _create_change(self, name: str, timestamp: datetime) -> None:
+        await ChangeLog(
+            book_id=f"id-{name}",
+            book_name=name,
+            change_type="price_change",
+            field_changed="price_incl_tax",
+            old_value="£10.00",
+            new_value="£12.00",
+            timestamp=timestamp,
+        ).insert()
+
+    @pytest.mark.anyio
+    async def test_stream_change_report_writes_every_change_in_batches(self) -> None:
+        # Given
+        for i in range(5):
+            await self.change_log_repo.create(
+                book_id=f"book-{i}",
+                book_name=f"Book {i}",
+                change_type="price_change",
+                field_changed="price_incl_tax",
+                old_value="£10.00",
+                new_value=f"£1{i}.50",
+            )
+
+        # When
+        json_chunks = [
+            chunk
+            async for chunk in self.service.stream_change_report(
+                format_type="json", batch_size=2
+            )
+        ]
+        csv_report = await self.service.generate_change_report(format_type="csv")
+
+        # Then
+        report = json.loads("".join(json_chunks))
+        assert len(json_chunks) > 2
+        assert report["report_metadata"]["total_changes"] == 5
+        assert [change["book_name"] for change in report["changes"]] == [
+            f"Book {i}" for i in reversed(range(5))
+        ]
+        assert len(csv_report.strip().splitlines()) == 6
+
+    @pytest.mark.anyio
+    async def test_materialise_missing_days_only_generates_missing_days(
+        self,
+    ) -> None:
+        # Given
+        await self._create_change("Yesterday", self.today - timedelta(hours=12))
+
+        # When
+        first = await self.service.materialise_missing_days(days=2)
+        second = await self.service.materialise_missing_days(days=2)
+
+        # Then
+        assert first == [self.today - timedelta(days=1), self.today - timedelta(days=2)]
+        assert second == []
+        report = await self.report_repo.find(
+            "summary", self.today - timedelta(days=1), self.today
+        )
+        assert report is not None
+        assert report.is_final()
+        assert report.total_changes == 1
+
+    @pytest.mark.anyio
+    async def test_stream_change_report_stitches_partitions_and_live_edges(
+        self,
+    ) -> None:
+        # Given - a change in each of two whole days, plus one on either edge
+        start = self.today - timedelta(days=3, hours=6)
+        await self._create_change("Edge start", start + timedelta(hours=1))
+        await self._create_change("Day 3", self.today - timedelta(days=3, hours=-12))
+        await self._create_change("Day 2", self.today - timedelta(days=2, hours=-12))
+        await self._create_change("Edge end", self.today - timedelta(hours=1))
+        await self.service.materialise_day(self.today - timedelta(days=3))
+        await self.service.materialise_day(self.today - timedelta(days=2))
+
+        # A change written behind the report's back into a materialised day
+        # is not read, proving the partition was used
+        await self._create_change("Hidden", self.today - timedelta(days=2, hours=-6))
+
+        # When
+        ndjson = await self.service.generate_change_report(
+            start_date=start, end_date=self.today, format_type="ndjson"
+        )
+
+        # Then - yesterday has no partition and is queried live
+        names = [json.loads(line)["book_name"] for line in ndjson.splitlines()]
+        assert names == ["Edge end", "Day 2", "Day 3", "Edge start"]
+
+    @pytest.mark.anyio
+    async def test_summary_report_aggregates_changes_by_category(self) -> None:
+        # Given
+        fiction = await Book(
+            name="Fiction Book",
+            category="Fiction",
+            price_excl_tax=10.0,
+            price_incl_tax=12.0,
+            availability="In stock",
+            rating=4,
+            image_url="http://example.com/fiction.jpg",
+            source_url="http://example.com/fiction",
+            content_hash="fiction_hash",
+        ).insert()
+        for old_value, new_value in [("£10.00", "£12.00"), ("£12.00", "£11.00")]:
+            await self.change_log_repo.create(
+                book_id=str(fiction.id),
+                book_name=fiction.name,
+                change_type="price_change",
+                field_changed="price_incl_tax",
+                old_value=old_value,
+                new_value=new_value,
+            )
+        await self.change_log_repo.create(
+            book_id="not-an-object-id",
+            book_name="Orphan",
+            change_type="availability_change",
+            field_changed="availability",
+            old_value="In stock",
+            new_value="Out of stock",
+        )
+
+        # When
+        summary = json.loads(
+            await self.service.generate_change_report(format_type="summary")
+        )
+
+        # Then
+        assert summary["total_changes"] == 3
+        assert summary["by_change_type"] == {
+            "price_change": 2,
+            "availability_change": 1,
+        }
+        assert sum(summary["by_day"].values()) == 3
+        assert summary["by_category"]["Fiction"]["by_change_type"] == {
+            "price_change": 2
+        }
+        assert summary["by_category"]["Fiction"]["average_price_delta"] == 0.5
+        assert summary["by_category"]["Unknown"]["total"] == 1
+        assert summary["price_deltas"]["count"] == 2
+        assert summary["price_deltas"]["increases"] == 1
+        assert summary["price_deltas"]["decreases"] == 1
+        assert summary["price_deltas"]["max"] == 2.0
+        assert summary["most_volatile_books"][0]["book_id"] == str(fiction.id)
+        assert summary["most_volatile_books"][0]["category"] == "Fiction"
@@ -1,3 +1,5 @@
+import json
+from datetime import UTC, datetime, timedelta
 from time import time
 
 import pytest
@@ -7,8 +9,9 @@ from httpx import AsyncClient
 from filerskeepers.application.settings import settings
 from filerskeepers.auth.models import User
 from filerskeepers.auth.repositories import UserRepository
-from filerskeepers.books.models import Book
-from filerskeepers.books.repositories import BookRepository
+from filerskeepers.books.models import Book, ChangeLog, PriceObservation
+from filerskeepers.books.repositories import BookRepository, ChangeLogRepository
+from filerskeepers.reports.services import ReportService
 from tests.base import TestBase
 
 
@@ -18,11 +21,15 @@ class TestBooksAPI(TestBase):
         self,
         user_repository: UserRepository,
         book_repository: BookRepository,
+        change_log_repository: ChangeLogRepository,
+        report_service: ReportService,
         redis_connection: redis.Redis,
         cleanup: None,
     ) -> None:
         self.user_repo = user_repository
         self.book_repo = book_repository
+        self.change_log_repo = change_log_repository
+        self.report_service = report_service
         self.redis = redis_connection
 
         # Create a test user and get API key
@@ -79,6 +86,201 @@ class TestBooksAPI(TestBase):
         assert data["books"][0]["name"] == "Test Book"
         assert data["page"] == 1
 
+    @pytest.mark.anyio
+    async def test_list_changes_returns_paginated_results(
+        self, client: AsyncClient
+    ) -> None:
+        # Given
+        for i in range(3):
+            await self.change_log_repo.create(
+                book_id=f"book-{i}",
+                book_name=f"Book {i}",
+                change_type="new_book",
+                new_value=f"Book {i}",
+            )
+
+        # When
+        response = await client.get(
+            "/books/v1/changes",
+            params={"page_size": 2},
+            headers={"X-API-Key": self.api_key},
+        )
+        next_response = await client.get(
+            "/books/v1/changes",
+            params={"page_size": 2, "cursor": response.json()["next_cursor"]},
+            headers={"X-API-Key": self.api_key},
+        )
+
+        # Then
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 3
+        assert len(data["changes"]) == 2
+        assert next_response.status_code == 200
+        next_data = next_response.json()
+        assert len(next_data["changes"]) == 1
+        assert next_data["next_cursor"] is None
+
+    @pytest.mark.anyio
+    async def test_change_report_streams_ndjson(self, client: AsyncClient) -> None:
+        # Given
+        for i in range(3):
+            await self.change_log_repo.create(
+                book_id=f"book-{i}",
+                book_name=f"Book {i}",
+                change_type="new_book",
+                new_value=f"Book {i}",
+            )
+
+        # When
+        response = await client.get(
+            "/books/v1/changes/report",
+            params={"format": "ndjson"},
+            headers={"X-API-Key": self.api_key},
+        )
+
+        # Then
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert "change_report_" in response.headers["content-disposition"]
+        lines = response.text.splitlines()
+        assert len(lines) == 3
+        assert {json.loads(line)["book_id"] for line in lines} == {
+            "book-0",
+            "book-1",
+            "book-2",
+        }
+
+    @pytest.mark.anyio
+    async def test_change_report_serves_precomputed_day_with_etag(
+        self, client: AsyncClient
+    ) -> None:
+        # Given
+        today = datetime.now(UTC).replace(hour=0, minute=0, second=0, microsecond=0)
+        yesterday = today - timedelta(days=1)
+        await ChangeLog(
+            book_id="book-1",
+            book_name="Book 1",
+            change_type="new_book",
+            timestamp=yesterday + timedelta(hours=3),
+        ).insert()
+        await self.report_service.materialise_day(yesterday)
+        params = {
+            "format": "csv",
+            "start_date": yesterday.isoformat(),
+            "end_date": today.isoformat(),
+        }
+
+        # When
+        response = await client.get(
+            "/books/v1/changes/report",
+            params=params,
+            headers={"X-API-Key": self.api_key},
+        )
+        cached_response = await client.get(
+            "/books/v1/changes/report",
+            params=params,
+            headers={
+                "X-API-Key": self.api_key,
+                "If-None-Match": response.headers["etag"],
+            },
+        )
+
+        # Then
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert len(response.text.strip().splitlines()) == 2
+        assert "Book 1" in response.text
+        assert cached_response.status_code == 304
+
+    @pytest.mark.anyio
+    async def test_change_report_is_decompressed_when_gzip_is_refused(
+        self, client: AsyncClient
+    ) -> None:
+        # Given
+        today = datetime.now(UTC).replace(hour=0, minute=0, second=0, microsecond=0)
+        yesterday = today - timedelta(days=1)
+        await ChangeLog(
+            book_id="book-1",
+            book_name="Book 1",
+            change_type="new_book",
+            timestamp=yesterday + timedelta(hours=3),
+        ).insert()
+        await self.report_service.materialise_day(yesterday)
+
+        # When - gzip is named, with a q-value of 0
+        response = await client.get(
+            "/books/v1/changes/report",
+            params={
+                "format": "csv",
+                "start_date": yesterday.isoformat(),
+                "end_date": today.isoformat(),
+            },
+            headers={"X-API-Key": self.api_key, "Accept-Encoding": "gzip;q=0"},
+        )
+
+        # Then
+        assert response.status_code == 200
+        assert "content-encoding" not in response.headers
+        assert "Book 1" in response.text
+
+    @pytest.mark.anyio
+    async def test_price_history_is_downsampled_per_day(
+        self, client: AsyncClient
+    ) -> None:
+        # Given - two crawls on one day and one on the next
+        book = await self.book_repo.create(
+            Book(
+                name="Charted Book",
+                category="Fiction",
+                price_excl_tax=10.0,
+                price_incl_tax=12.0,
+                availability="In stock",
+                rating=4,
+                image_url="http://example.com/charted.jpg",
+                source_url="http://example.com/charted",
+                content_hash="charted_hash",
+            )
+        )
+        day = datetime.now(UTC).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        ) - timedelta(days=2)
+        for hours, price, availability in [
+            (6, 12.0, "In stock"),
+            (18, 14.0, "In stock"),
+            (30, 13.0, "Out of stock"),
+        ]:
+            await PriceObservation(
+                book_id=str(book.id),
+                timestamp=day + timedelta(hours=hours),
+                price_incl_tax=price,
+                price_excl_tax=price - 2,
+                availability=availability,
+                in_stock=availability == "In stock",
+            ).insert()
+
+        # When
+        daily = await client.get(
+            f"/books/v1/{book.id}/history",
+            headers={"X-API-Key": self.api_key},
+        )
+        raw = await client.get(
+            f"/books/v1/{book.id}/history",
+            params={"interval": "raw"},
+            headers={"X-API-Key": self.api_key},
+        )
+
+        # Then
+        assert daily.status_code == 200
+        points = daily.json()["points"]
+        assert [
+            (point["min_price"], point["max_price"], point["last_price"])
+            for point in points
+        ] == [(12.0, 14.0, 14.0), (13.0, 13.0, 13.0)]
+        assert [point["observations"] for point in points] == [2, 1]
+        assert points[1]["in_stock"] is False
+        assert len(raw.json()["points"]) == 3
+
     @pytest.mark.anyio
     async def test_rate_limiting_exceeded(self, client: AsyncClient) -> None:
         # Given - Pre-populate Redis with rate limit data to exceed the limit